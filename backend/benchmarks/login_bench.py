@@ -0,0 +1,170 @@
+"""
+Banc de mesure des connexions (POST /token), serveur uvicorn local + SQLite temporaire.
+
+    python -m backend.benchmarks.login_bench --requests 200 --concurrency 20
+    python -m backend.benchmarks.login_bench --rounds 10 --workers 2 --output login.json
+    python -m backend.benchmarks.login_bench --legacy   # mots de passe en clair : 1ère connexion = migration bcrypt
+
+Pendant la rafale de connexions, une sonde appelle GET / en continu : sa
+latence montre si le hachage bloque la boucle d'événements (les autres routes).
+"""
+import os
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD = "Chantier-7h00!"
+
+
+def _percentile(values, p):
+    if not values: return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1)
+
+def _summary(latencies):
+    return {
+        "p50_ms": _percentile(latencies, 0.50), "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99), "max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+    }
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ==========================================
+# 1. SERVEUR & DONNÉES
+# ==========================================
+
+def start_server(port):
+    """API complète dans un thread (uvicorn), variables d'environnement déjà posées."""
+    import uvicorn
+    from backend.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started: time.sleep(0.05)
+    return server, thread
+
+def create_users(count, legacy):
+    import backend.main  # noqa: F401  (création des tables)
+    from backend import models
+    from backend.database import SessionLocal
+    from backend.services.passwords import pwd_context
+
+    stored = PASSWORD if legacy else pwd_context.hash(PASSWORD)  # Même hash pour tous : préparation rapide
+    db = SessionLocal()
+    try:
+        company = models.Company(name="Bench")
+        db.add(company); db.flush()
+        db.add_all([
+            models.User(email=f"user{i}@bench.test", hashed_password=stored, role="conducteur", company_id=company.id)
+            for i in range(count)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return [f"user{i}@bench.test" for i in range(count)]
+
+
+# ==========================================
+# 2. RAFALE DE CONNEXIONS
+# ==========================================
+
+def run_burst(base_url, emails, total, concurrency):
+    import requests
+
+    local = threading.local()
+    def login(i):
+        session = getattr(local, "session", None) or requests.Session()
+        local.session = session
+        start = time.perf_counter()
+        r = session.post(f"{base_url}/token", data={"username": emails[i % len(emails)], "password": PASSWORD})
+        return r.status_code, time.perf_counter() - start
+
+    probe_latencies, stop = [], threading.Event()
+    def probe():
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            session.get(f"{base_url}/")
+            probe_latencies.append(time.perf_counter() - start)
+            time.sleep(0.02)
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(login, range(total)))
+    wall = time.perf_counter() - start
+    stop.set(); prober.join()
+
+    statuses = {}
+    for status, _ in results: statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [latency for status, latency in results if status == 200]
+    return {
+        "requests": total, "concurrency": concurrency, "wall_s": round(wall, 3),
+        "logins_per_s": round(len(ok) / wall, 1), "statuses": statuses,
+        "login": _summary(ok), "probe": {"count": len(probe_latencies), **_summary(probe_latencies)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de mesure des connexions (bcrypt)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Nombre de connexions")
+    parser.add_argument("--concurrency", type=int, default=20, help="Connexions simultanées")
+    parser.add_argument("--rounds", type=int, help="Coût bcrypt (PASSWORD_BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, help="Threads de hachage (PASSWORD_HASH_WORKERS)")
+    parser.add_argument("--queue", type=int, help="Calculs en attente avant 503 (PASSWORD_HASH_QUEUE)")
+    parser.add_argument("--legacy", action="store_true", help="Mots de passe stockés en clair (migration à la connexion)")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    # Lu à l'import des services : à poser avant d'importer l'application
+    db_path = os.path.join(tempfile.mkdtemp(prefix="conformeo_login_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    for key, value in (("PASSWORD_BCRYPT_ROUNDS", args.rounds), ("PASSWORD_HASH_WORKERS", args.workers), ("PASSWORD_HASH_QUEUE", args.queue)):
+        if value is not None: os.environ[key] = str(value)
+    for key in ("PDF_RENDER_PROCESSES", "EMAIL_OUTBOX_EMBEDDED", "PDF_JOB_EMBEDDED", "DASHBOARD_RECONCILE_SECONDS"):
+        os.environ.setdefault(key, "0")
+    os.environ.setdefault("SQL_PROFILING", "0")
+
+    emails = create_users(args.users, args.legacy)
+    port = _free_port()
+    server, thread = start_server(port)
+    try:
+        result = run_burst(f"http://127.0.0.1:{port}", emails, args.requests, args.concurrency)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    from backend.services import passwords
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "legacy": args.legacy,
+            "bcrypt_rounds": passwords.PASSWORD_BCRYPT_ROUNDS, "hash_workers": passwords.PASSWORD_HASH_WORKERS,
+            "hash_queue": passwords.PASSWORD_HASH_QUEUE,
+        },
+        "result": result,
+    }
+    print(f"🔑 {result['logins_per_s']} connexions/s  ({result['statuses']})  "
+          f"connexion p50 {result['login']['p50_ms']} ms / p95 {result['login']['p95_ms']} ms  |  "
+          f"GET / pendant la rafale : p95 {result['probe']['p95_ms']} ms, max {result['probe']['max_ms']} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"📝 Résultats : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Banc de mesure des générateurs PDF (services/pdf.py), 100% hors ligne.
+
+    python -m backend.benchmarks.pdf_bench --sizes 10,500,5000 --output bench.json
+    python -m backend.benchmarks.pdf_bench --http --generators journal,duerp
+    python -m backend.benchmarks.pdf_bench --compare avant.json apres.json
+
+Chaque cas (générateur x taille) tourne dans un processus neuf : temps, pic RSS,
+pic tracemalloc, taille du PDF et nombre de pages sont enregistrés en JSON.
+Les photos sont tirées parmi quelques fixtures : les images identiques étant
+dédupliquées dans le PDF, la taille de sortie du journal est un minorant.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+import tracemalloc
+from io import BytesIO
+from datetime import datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+DEFAULT_SIZES = (10, 500, 5000)
+MAX_PHOTOS_PER_RAPPORT = 6
+
+# ==========================================
+# 1. FIXTURES IMAGES (Générées localement, une fois)
+# ==========================================
+# Mélange réaliste : photos de téléphone (grandes), photos déjà réduites,
+# un logo PNG avec transparence et une signature.
+
+PHOTO_FIXTURES = [("photo_4000x3000.jpg", (4000, 3000)), ("photo_1600x1200.jpg", (1600, 1200)), ("photo_800x600.jpg", (800, 600))]
+LOGO_FIXTURE = "logo.png"
+SIGNATURE_FIXTURE = "signature.png"
+
+
+def build_fixtures(directory):
+    from PIL import Image, ImageDraw
+
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(42)
+    for name, size in PHOTO_FIXTURES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path): continue
+        img = Image.new("RGB", size, (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(200):  # Un peu de contenu, pour une compression JPEG réaliste
+            x, y = rng.randint(0, size[0]), rng.randint(0, size[1])
+            draw.ellipse((x, y, x + size[0] // 10, y + size[1] // 10), fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        img.save(path, "JPEG", quality=90)
+
+    for name, size in ((LOGO_FIXTURE, (600, 300)), (SIGNATURE_FIXTURE, (500, 200))):
+        path = os.path.join(directory, name)
+        if os.path.exists(path): continue
+        img = Image.new("RGBA", size, (0, 0, 0, 0))
+        ImageDraw.Draw(img).rectangle((20, 20, size[0] - 20, size[1] - 20), outline=(20, 20, 80, 255), width=12)
+        img.save(path, "PNG")
+    return directory
+
+
+def start_http_server(directory):
+    """Stand-in HTTP local (remplace Cloudinary) servant le dossier de fixtures."""
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="bench-images", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+# ==========================================
+# 2. GRAPHES SYNTHÉTIQUES (Chantier, Rapports, Inspections, PPSPS, DUERP...)
+# ==========================================
+# Objets à attributs (comme les Records envoyés aux processus de rendu) :
+# pas de base de données nécessaire.
+
+def build_graph(size, image_base, seed=0):
+    rng = random.Random(seed + size)
+    photo = lambda: f"{image_base}/{rng.choice(PHOTO_FIXTURES)[0]}"
+    start = datetime(2024, 1, 1)
+
+    company = SimpleNamespace(id=1, name="Bâtiment Bench SAS", logo_url=f"{image_base}/{LOGO_FIXTURE}")
+    chantier = SimpleNamespace(
+        id=1, nom=f"Chantier bench {size}", adresse="1 rue du Test, 75000 Paris", company=company,
+        signature_url=f"{image_base}/{SIGNATURE_FIXTURE}", company_id=1
+    )
+    rapports = [
+        SimpleNamespace(
+            id=i, titre=f"Observation {i}", description=f"Relevé n°{i} : zone {rng.randint(1, 40)}, RAS.",
+            date_creation=start + timedelta(hours=i), photo_url=None,
+            images=[SimpleNamespace(url=photo()) for _ in range(rng.randint(0, MAX_PHOTOS_PER_RAPPORT))]
+        )
+        for i in range(size)
+    ]
+    questions = lambda n: [{"q": f"Point de contrôle {j}", "status": rng.choice(["OK", "NOK", "NA"])} for j in range(n)]
+    inspections = [
+        SimpleNamespace(id=i, titre=f"Audit {i}", type="Sécurité", createur="Bench", date_creation=start + timedelta(days=i), data=questions(10))
+        for i in range(max(1, size // 10))
+    ]
+    taches = [{"tache": f"Tâche {i}", "risque": "Chute de hauteur", "prevention": "Garde-corps"} for i in range(size)]
+    ppsps = SimpleNamespace(
+        id=1, maitre_ouvrage="MOA", coordonnateur_sps="CSPS", responsable_chantier="Chef", nb_compagnons=12,
+        horaires="8h-17h", secours_data={"num_urgence": "15", "hopital": "CHU", "sst_noms": "A, B"}, taches_data=taches
+    )
+    pdp = SimpleNamespace(
+        id=1, entreprise_utilisatrice="EU", entreprise_exterieure="EE", date_inspection_commune=start,
+        consignes_securite={"urgence": "15"}, signature_eu=f"{image_base}/{SIGNATURE_FIXTURE}", signature_ee=f"{image_base}/{SIGNATURE_FIXTURE}",
+        risques_interferents=[{"tache": t["tache"], "risque": t["risque"], "mesure": t["prevention"]} for t in taches]
+    )
+    permis = SimpleNamespace(
+        id=1, date=start, lieu="Toiture", intervenant="Soudeur", description="Soudure de la charpente métallique.",
+        extincteur=True, nettoyage=True, surveillance=False, signature=None
+    )
+    duerp = SimpleNamespace(id=1, annee="2024", date_mise_a_jour=start)
+    lignes = [
+        SimpleNamespace(
+            unite_travail=f"Unité {i % 12}", tache=f"Tâche {i}", risque="Bruit", gravite=rng.randint(1, 3),
+            mesures_realisees="Casques", mesures_a_realiser="Encoffrement", statut=rng.choice(["EN COURS", "FAIT"])
+        )
+        for i in range(size)
+    ]
+    return SimpleNamespace(
+        company=company, chantier=chantier, rapports=rapports, inspections=inspections, ppsps=ppsps,
+        pdp=pdp, permis=permis, duerp=duerp, lignes=lignes,
+        audit=SimpleNamespace(**{**vars(inspections[0]), "data": questions(size)})
+    )
+
+
+# ==========================================
+# 3. GÉNÉRATEURS MESURÉS
+# ==========================================
+
+def _buffer_of(generator):
+    def run(g):
+        buffer = BytesIO()
+        generator(buffer, g)
+        return buffer.getvalue()
+    return run
+
+def _generators():
+    from ..services import pdf
+    return {
+        "journal": _buffer_of(lambda b, g: pdf.generate_journal_pdf(b, g.chantier, g.rapports, g.inspections, company=g.company)),
+        "ppsps": _buffer_of(lambda b, g: pdf.generate_ppsps_pdf(b, g.ppsps, g.chantier)),
+        "pdp": _buffer_of(lambda b, g: pdf.generate_pdp_pdf(b, g.pdp, g.chantier)),
+        "audit": _buffer_of(lambda b, g: pdf.generate_audit_pdf(b, g.audit, g.chantier)),
+        "permis_feu": _buffer_of(lambda b, g: pdf.generate_permis_feu_pdf(b, g.permis, g.chantier)),
+        "duerp": _buffer_of(lambda b, g: pdf.write_duerp_pdf(b, g.duerp, g.company, g.lignes)),
+    }
+
+GENERATORS = ("journal", "ppsps", "pdp", "audit", "permis_feu", "duerp")
+FIXED_SIZE_GENERATORS = ("permis_feu",)  # Une page, indépendante de la taille
+EXTRA_SIZES = {"duerp": (10000,)}  # Gros registre (milliers de lignes) : toujours mesuré
+
+
+def _peak_rss_mb():
+    # Linux : VmHWM repart de zéro à l'exec (ru_maxrss garde le pic du parent)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_case(name, size, image_base, seed, with_tracemalloc):
+    """Exécuté dans un processus neuf : rien n'est partagé entre deux cas."""
+    from pypdf import PdfReader
+
+    graph = build_graph(size, image_base, seed)
+    generate = _generators()[name]
+
+    start = time.perf_counter()
+    data = generate(graph)
+    wall = time.perf_counter() - start
+    result = {
+        "generator": name, "size": size, "wall_s": round(wall, 3), "peak_rss_mb": _peak_rss_mb(),
+        "bytes": len(data), "pages": len(PdfReader(BytesIO(data)).pages),
+    }
+
+    if with_tracemalloc:
+        # 2e passage, séparé : tracemalloc ralentit beaucoup le rendu
+        tracemalloc.start()
+        generate(graph)
+        result["peak_tracemalloc_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    return result
+
+
+# ==========================================
+# 4. LANCEMENT & COMPARAISON
+# ==========================================
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_suite(sizes, generators, use_http=False, fixtures_dir=None, seed=0, with_tracemalloc=True, image_cache=False):
+    fixtures_dir = build_fixtures(fixtures_dir or os.path.join(tempfile.gettempdir(), "conformeo_bench_fixtures"))
+
+    # Hérité par les processus de mesure (lu à l'import des services)
+    os.environ["PDF_IMAGE_CACHE_ENABLED"] = "1" if image_cache else "0"
+    os.environ.setdefault("PDF_IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="conformeo_bench_cache_"))
+
+    server = None
+    if use_http:
+        server, image_base = start_http_server(fixtures_dir)
+    else:
+        # Chemin relatif : le chargeur local retire le "/" initial des chemins
+        image_base = os.path.relpath(fixtures_dir)
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    try:
+        for name in generators:
+            for size in ((1,) if name in FIXED_SIZE_GENERATORS else sorted(set(sizes) | set(EXTRA_SIZES.get(name, ())))):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, name, size, image_base, seed, with_tracemalloc).result()
+                results.append(result)
+                print(f"⏱️ {name:<11} {size:>6} : {result['wall_s']:>8.3f}s  {result['peak_rss_mb']:>7.1f} Mo RSS  "
+                      f"{result['bytes'] / 1024:>9.1f} Ko  {result['pages']:>5} p.")
+    finally:
+        if server: server.shutdown()
+
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"), "git": _git_revision(),
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "images": "http" if use_http else "local", "image_cache": image_cache, "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(before, after):
+    """Tableau des écarts entre deux fichiers de résultats (après / avant)."""
+    key = lambda r: (r["generator"], r["size"])
+    old = {key(r): r for r in before["results"]}
+    ratio = lambda a, b: f"x{b / a:.2f}" if a else "-"
+    print(f"Avant : {before['meta'].get('git')} ({before['meta'].get('date')})  |  Après : {after['meta'].get('git')} ({after['meta'].get('date')})")
+    print(f"{'générateur':<11} {'taille':>6}  {'temps':>16}  {'RSS':>16}  {'taille PDF':>18}  pages")
+    for r in after["results"]:
+        o = old.get(key(r))
+        if not o:
+            print(f"{r['generator']:<11} {r['size']:>6}  (nouveau)"); continue
+        print(f"{r['generator']:<11} {r['size']:>6}  {r['wall_s']:>8.3f}s {ratio(o['wall_s'], r['wall_s']):>7}  "
+              f"{r['peak_rss_mb']:>7.1f}Mo {ratio(o['peak_rss_mb'], r['peak_rss_mb']):>7}  "
+              f"{r['bytes'] / 1024:>8.1f}Ko {ratio(o['bytes'], r['bytes']):>8}  {o['pages']}->{r['pages']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de mesure des générateurs PDF (hors ligne)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Nombres de rapports / lignes (ex: 10,500,5000)")
+    parser.add_argument("--generators", default=",".join(GENERATORS), help=f"Parmi : {', '.join(GENERATORS)}")
+    parser.add_argument("--http", action="store_true", help="Images servies par un serveur HTTP local au lieu de fichiers")
+    parser.add_argument("--image-cache", action="store_true", help="Active le cache disque des images (désactivé par défaut)")
+    parser.add_argument("--fixtures", help="Dossier des images de test (créé si besoin)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="Pas de 2e passage tracemalloc (plus rapide)")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--compare", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux fichiers de résultats")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f1, open(args.compare[1]) as f2:
+            compare(json.load(f1), json.load(f2))
+        return
+
+    generators = [g for g in args.generators.split(",") if g]
+    unknown = set(generators) - set(GENERATORS)
+    if unknown: parser.error(f"Générateurs inconnus : {', '.join(sorted(unknown))}")
+
+    report = run_suite(
+        [int(s) for s in args.sizes.split(",") if s], generators, use_http=args.http, fixtures_dir=args.fixtures,
+        seed=args.seed, with_tracemalloc=not args.no_tracemalloc, image_cache=args.image_cache
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"📝 Résultats : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
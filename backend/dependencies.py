@@ -7,6 +7,7 @@ from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from .database import get_db
 from . import models, schemas
+from .services.auth_cache import principal_cache, load_principal
 
 # Configuration JWT
 SECRET_KEY = os.getenv("SECRET_KEY", "votre_cle_secrete_a_changer")
@@ -26,20 +27,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Utilisateur du jeton (Principal) ; servi par le cache sans requête SQL la plupart du temps."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Impossible de valider les identifiants",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    principal = principal_cache.get(token)
+    if principal is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
+
+        principal = load_principal(db, email)
+        if principal is None:
+            raise credentials_exception
+        principal_cache.set(token, principal, payload.get("exp"))
+
+    # Compte désactivé : refusé (le cache est invalidé dès la modification)
+    if not principal.is_active:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return principal
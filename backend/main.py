@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 import requests
 
 # ✅ Imports directs des routeurs (Évite les erreurs d'import circulaire)
+from .routers import auth
 from .routers import users
 from .routers import companies
 from .routers import chantiers
@@ -10,15 +11,24 @@ from .routers import materiels
 from .routers import tasks
 from .routers import dashboard
 from .routers import documents
+from .routers import jobs
+from .routers import emails
+from .routers import metrics
+from .routers import sync
+from .routers import batch
 
 # ✅ Import des modèles (Via le nouveau dossier models/)
 # Le fichier models/__init__.py expose "Base" et charge toutes les tables
 from . import models
-from .database import engine
+from .database import engine, SessionLocal
+from .services import dashboard_stats, email_outbox, geocoding, idempotency, passwords, pdf_documents, pdf_executor, pdf_jobs, pdf_spool, sql_profiler, sync_log
+from .services.pdf_cache import pdf_cache
 
 # Création des tables dans la base de données
 # Cela fonctionne car models.Base est défini dans models/__init__.py
 models.Base.metadata.create_all(bind=engine)
+models.ensure_columns(engine)
+models.ensure_indexes(engine)
 
 app = FastAPI(title="Conformeo API")
 
@@ -32,11 +42,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],       
     allow_headers=["*"],       
+    expose_headers=["X-SQL-Count", "X-SQL-Time-Ms", "X-SQL-Repeated", "Idempotent-Replayed"],
 )
 
+# 🔁 POST rejoués avec le même Idempotency-Key : réponse mémorisée, pas de doublon
+app.add_middleware(idempotency.IdempotencyMiddleware)
+
+# 🧮 Nombre / temps des requêtes SQL par requête HTTP (+ détection N+1)
+sql_profiler.install(engine)
+app.add_middleware(sql_profiler.SqlProfilerMiddleware)
+
 # ==========================================
 # 🛣️ ROUTEURS
 # ==========================================
+app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(companies.router)
 app.include_router(chantiers.router)
@@ -44,6 +63,49 @@ app.include_router(materiels.router)
 app.include_router(tasks.router)
 app.include_router(dashboard.router)
 app.include_router(documents.router)
+app.include_router(jobs.router)
+app.include_router(emails.router)
+app.include_router(metrics.router)
+app.include_router(sync.router)
+app.include_router(batch.router)
+
+# ==========================================
+# ⏱️ TÂCHES DE FOND
+# ==========================================
+
+@app.on_event("startup")
+def start_background_jobs():
+    # Préchauffage nocturne du cache PDF (si PDF_CACHE_WARMUP_HOUR est défini)
+    pdf_documents.start_nightly_warmup(SessionLocal)
+    # Rendu asynchrone des PDF (file pdf_jobs)
+    pdf_jobs.start_embedded_dispatcher()
+    # Processus de rendu PDF démarrés et préchauffés avant la 1ère requête
+    pdf_executor.start_render_pool()
+    # Fichiers PDF spoolés laissés par un arrêt brutal
+    pdf_spool.cleanup_spool_dir()
+    # Envoi des emails en file (email_outbox)
+    email_outbox.start_embedded_sender()
+    # Recalcul périodique des statistiques du tableau de bord (company_stats)
+    dashboard_stats.start_reconciler()
+    # Purge quotidienne des tombstones de synchro mobile
+    sync_log.start_pruner()
+    # Purge des clés d'idempotence expirées
+    idempotency.start_purger()
+    # Géocodage des adresses de chantier (file + cache, 1 appel Nominatim / s)
+    geocoding.start_embedded_worker()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    dashboard_stats.stop_reconciler()
+    sync_log.stop_pruner()
+    idempotency.stop_purger()
+    email_outbox.stop_embedded_sender()
+    geocoding.stop_embedded_worker()
+    pdf_jobs.stop_embedded_dispatcher()
+    pdf_executor.stop_render_pool()
+    passwords.shutdown_executor()
+    # Libère les PDF du cache (dont les fichiers spoolés sur disque)
+    pdf_cache.clear()
 
 # ==========================================
 # 🏠 ROUTES GLOBALES & OUTILS
@@ -1,7 +1,13 @@
-from .base import Base
+from .base import Base, ensure_columns, ensure_indexes
 from .users import User, Company, CompanyDocument
 from .chantiers import Chantier, DocExterne
 from .materiels import Materiel
 from .rapports import Rapport, RapportImage, Inspection
 from .security import PPSPS, PlanPrevention, PIC, PermisFeu, DUERP, DUERPLigne
-from .tasks import Task
\ No newline at end of file
+from .tasks import Task
+from .jobs import PdfJob
+from .emails import EmailAttachment, OutboxEmail
+from .stats import CompanyStats
+from .sync import CompanySync, SyncChange
+from .idempotency import IdempotencyKey
+from .geocoding import GeocodeCache, RateLimitSlot
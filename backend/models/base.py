@@ -1,4 +1,39 @@
 # backend/models/base.py
+import os
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship as orm_relationship, backref as orm_backref
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Chargement paresseux des relations. En mode test (SQL_RAISE_ON_LAZY=1), toute relation
+# non chargée d'avance lève une erreur au lieu d'émettre une requête SQL cachée (N+1) :
+# les routes déclarent leurs chargements (cf. services/query_profiles.py).
+RAISE_ON_LAZY = os.getenv("SQL_RAISE_ON_LAZY", "0") == "1"
+LAZY = "raise_on_sql" if RAISE_ON_LAZY else "select"
+
+def relationship(*args, **kwargs):
+    kwargs.setdefault("lazy", LAZY)
+    return orm_relationship(*args, **kwargs)
+
+def backref(name, **kwargs):
+    kwargs.setdefault("lazy", LAZY)
+    return orm_backref(name, **kwargs)
+
+def ensure_indexes(bind):
+    """create_all ne touche pas aux tables existantes : crée les index ajoutés depuis, s'ils manquent."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def ensure_columns(bind):
+    """Idem pour les colonnes ajoutées à une table existante (nullables) : ALTER TABLE ... ADD COLUMN."""
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name): continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or column.primary_key or not column.nullable: continue
+            with bind.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}'))
+            print(f"🧱 Colonne ajoutée : {table.name}.{column.name}")
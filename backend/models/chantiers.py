@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Date, Index
 from datetime import datetime
-from .base import Base
+from .base import Base, relationship, backref
 
 class Chantier(Base):
     __tablename__ = "chantiers"
+    __table_args__ = (
+        Index("ix_chantiers_company_date", "company_id", "date_creation", "id"),
+        Index("ix_chantiers_geocode", "geocode_status", "geocode_after"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nom = Column(String, index=True)
@@ -23,8 +26,13 @@ class Chantier(Base):
 
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    # Géocodage en file (services/geocoding.py) : pending / running / not_found / failed, NULL = rien à faire
+    geocode_status = Column(String, nullable=True)
+    geocode_attempts = Column(Integer, nullable=True)
+    geocode_after = Column(DateTime, nullable=True)  # pending : pas avant ; running : réservé jusqu'à
     
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Clé étrangère
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
@@ -43,6 +51,9 @@ class Chantier(Base):
 
 class DocExterne(Base):
     __tablename__ = "docs_externes"
+    __table_args__ = (
+        Index("ix_docs_externes_chantier_date", "chantier_id", "date_ajout", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
@@ -51,5 +62,6 @@ class DocExterne(Base):
     url = Column(String)
     categorie = Column(String)
     date_ajout = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    chantier = relationship("Chantier", backref="docs_externes")
\ No newline at end of file
+    chantier = relationship("Chantier", backref=backref("docs_externes"))
\ No newline at end of file
@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Text, Index
+from sqlalchemy.orm import deferred
+from datetime import datetime
+from .base import Base, relationship
+
+class EmailAttachment(Base):
+    """Pièce jointe partagée par tous les destinataires d'un même envoi (rendue une seule fois)."""
+    __tablename__ = "email_attachments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String)                             # Document PDF à joindre (journal, ppsps...)
+    entity_id = Column(Integer)
+    filename = Column(String)
+    content = deferred(Column(LargeBinary, nullable=True))  # Rempli par l'expéditeur au 1er envoi
+    size = Column(Integer, nullable=True)
+    rendering_by = Column(String, nullable=True)          # Expéditeur en train de rendre le PDF (sans verrou ligne)
+    rendering_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class OutboxEmail(Base):
+    __tablename__ = "email_outbox"
+
+    id = Column(String, primary_key=True, index=True)    # UUID
+    to_email = Column(String)
+    subject = Column(String)
+    html = Column(Text)
+    attachment_id = Column(Integer, ForeignKey("email_attachments.id"), nullable=True)
+
+    provider = Column(String, default="brevo")
+    status = Column(String, default="PENDING")           # PENDING / SENDING / SENT / FAILED
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    error = Column(String, nullable=True)
+    http_status = Column(Integer, nullable=True)          # Dernière réponse du fournisseur
+    provider_message_id = Column(String, nullable=True)   # messageId Brevo (suivi de délivrabilité)
+
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow)  # Retry différé (backoff)
+    sent_at = Column(DateTime, nullable=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
+    chantier_id = Column(Integer, ForeignKey("chantiers.id"), nullable=True)
+
+    attachment = relationship("EmailAttachment")
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_run_after", "status", "run_after"),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, Float, DateTime
+from datetime import datetime
+from .base import Base
+
+class GeocodeCache(Base):
+    """Résultat de géocodage par adresse normalisée (trouvée ou non)."""
+    __tablename__ = "geocode_cache"
+
+    address_key = Column(String, primary_key=True)  # minuscules, sans accents ni ponctuation
+    query = Column(String)                          # Adresse telle qu'envoyée la 1ère fois
+    latitude = Column(Float, nullable=True)         # NULL : adresse introuvable
+    longitude = Column(Float, nullable=True)
+    provider = Column(String, default="nominatim")
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+class RateLimitSlot(Base):
+    """Prochain créneau d'appel d'un service externe, partagé par tous les processus."""
+    __tablename__ = "rate_limit_slots"
+
+    name = Column(String, primary_key=True)         # ex: nominatim
+    next_at = Column(DateTime, nullable=False)
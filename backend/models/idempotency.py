@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from datetime import datetime
+from .base import Base
+
+class IdempotencyKey(Base):
+    """Réponse mémorisée d'un POST envoyé avec un en-tête Idempotency-Key."""
+    __tablename__ = "idempotency_keys"
+
+    owner = Column(String, primary_key=True)         # Utilisateur (sub du jeton) : les clés ne sont pas partagées
+    key_hash = Column(String(64), primary_key=True)  # sha256 de la clé envoyée (longueur libre côté client)
+    fingerprint = Column(String(64), nullable=False) # sha256 méthode + chemin + corps : même clé, autre requête = refus
+    status_code = Column(Integer, nullable=True)     # NULL : requête en cours
+    content_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)        # Purge automatique au-delà
@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Index
+from sqlalchemy.orm import deferred
+from datetime import datetime
+from .base import Base
+
+class PdfJob(Base):
+    __tablename__ = "pdf_jobs"
+
+    id = Column(String, primary_key=True, index=True)  # UUID (non devinable : sert de lien de téléchargement)
+    doc_type = Column(String)                           # journal / ppsps / pdp / permis_feu
+    entity_id = Column(Integer)
+    quality = Column(String, default="standard")
+
+    status = Column(String, default="PENDING")         # PENDING / RUNNING / DONE / FAILED
+    progress = Column(Integer, default=0)               # 0 -> 100
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    error = Column(String, nullable=True)
+
+    result = deferred(Column(LargeBinary, nullable=True))  # Chargé seulement au téléchargement
+    result_size = Column(Integer, nullable=True)
+    filename = Column(String, nullable=True)
+
+    locked_by = Column(String, nullable=True)           # Identifiant du worker qui traite le job
+    created_at = Column(DateTime, default=datetime.utcnow)
+    run_after = Column(DateTime, default=datetime.utcnow)  # Retry différé (backoff)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
+
+    __table_args__ = (
+        Index("ix_pdf_jobs_status_run_after", "status", "run_after"),
+    )
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
-from .base import Base
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from .base import Base, relationship
 
 class Materiel(Base):
     __tablename__ = "materiels" 
+    __table_args__ = (
+        Index("ix_materiels_company_id", "company_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nom = Column(String, index=True)
@@ -15,6 +18,7 @@ class Materiel(Base):
     
     image_url = Column(String, nullable=True)
     date_derniere_vgp = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
     company = relationship("Company", back_populates="materiels")
@@ -1,7 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON, Index
 from datetime import datetime
-from .base import Base
+from .base import Base, relationship
 
 class RapportImage(Base):
     __tablename__ = "rapport_images"
@@ -14,6 +13,9 @@ class RapportImage(Base):
 
 class Rapport(Base):
     __tablename__ = "rapports"
+    __table_args__ = (
+        Index("ix_rapports_chantier_date", "chantier_id", "date_creation", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     titre = Column(String)
@@ -23,6 +25,7 @@ class Rapport(Base):
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
     
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     niveau_urgence = Column(String, default="Faible")
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
@@ -32,6 +35,9 @@ class Rapport(Base):
 
 class Inspection(Base):
     __tablename__ = "inspections"
+    __table_args__ = (
+        Index("ix_inspections_chantier_date", "chantier_id", "date_creation", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     titre = Column(String)
@@ -41,6 +47,7 @@ class Inspection(Base):
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
     
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     createur = Column(String)
 
     chantier = relationship("Chantier", back_populates="inspections")
\ No newline at end of file
@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, Index
 from datetime import datetime
-from .base import Base
+from .base import Base, relationship
 
 class PPSPS(Base):
     __tablename__ = "ppsps"
+    __table_args__ = (
+        Index("ix_ppsps_chantier_date", "chantier_id", "date_creation", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
@@ -20,11 +22,15 @@ class PPSPS(Base):
     installations_data = Column(JSON)
     taches_data = Column(JSON)
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     chantier = relationship("Chantier", back_populates="ppsps_docs")
 
 class PlanPrevention(Base):
     __tablename__ = "plans_prevention"
+    __table_args__ = (
+        Index("ix_plans_prevention_chantier_date", "chantier_id", "date_creation", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
@@ -37,6 +43,7 @@ class PlanPrevention(Base):
     signature_eu = Column(String) 
     signature_ee = Column(String) 
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     chantier = relationship("Chantier", back_populates="plans_prevention")
 
@@ -60,16 +67,21 @@ class PIC(Base):
     final_url = Column(String, nullable=True)      
     elements_data = Column(String, nullable=True)  
     date_creation = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     chantier = relationship("Chantier", back_populates="pic")
 
 class PermisFeu(Base):
     __tablename__ = "permis_feu"
+    __table_args__ = (
+        Index("ix_permis_feu_chantier_date", "chantier_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
     
     date = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     lieu = Column(String)
     intervenant = Column(String)
     description = Column(String)
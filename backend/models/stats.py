@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+from datetime import datetime
+from .base import Base
+
+class CompanyStats(Base):
+    """Compteurs du tableau de bord, tenus à jour à chaque écriture (cf. services/dashboard_stats.py)."""
+    __tablename__ = "company_stats"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    nb_chantiers = Column(Integer, default=0)
+    nb_materiels = Column(Integer, default=0)
+    nb_rapports = Column(Integer, default=0)
+    nb_rapports_critiques = Column(Integer, default=0)
+    # Chantiers actifs : {id: {nom, client, lat, lng, date_fin}} (carte + chantiers en retard)
+    sites = Column(JSON, default=dict)
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    reconciled_at = Column(DateTime, nullable=True)     # Dernier recalcul complet
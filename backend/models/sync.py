@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime
+from .base import Base
+
+class CompanySync(Base):
+    """Séquence de modifications d'une entreprise (la ligne est verrouillée par chaque écriture)."""
+    __tablename__ = "company_sync"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    last_seq = Column(Integer, default=0)        # Dernier numéro attribué
+    pruned_seq = Column(Integer, default=0)      # Tombstones purgés jusqu'ici : jeton plus ancien = resynchro complète
+    backfilled_at = Column(DateTime, nullable=True)  # Lignes antérieures à la synchro inscrites dans sync_changes
+
+class SyncChange(Base):
+    """Dernière modification connue de chaque ligne synchronisée (upsert ou suppression)."""
+    __tablename__ = "sync_changes"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    entity = Column(String, primary_key=True)    # chantiers, materiels, rapports...
+    entity_id = Column(Integer, primary_key=True)
+    op = Column(String, default="upsert")        # upsert / delete (tombstone)
+    seq = Column(Integer, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_sync_changes_company_seq", "company_id", "seq"),
+    )
@@ -1,15 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from datetime import datetime
-from .base import Base
+from .base import Base, relationship
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_chantier_date", "chantier_id", "date_prevue", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, index=True)
     status = Column(String, default="TODO") 
     date_prevue = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     chantier_id = Column(Integer, ForeignKey("chantiers.id"))
     chantier = relationship("Chantier", back_populates="tasks")
\ No newline at end of file
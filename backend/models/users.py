@@ -1,7 +1,6 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
 from datetime import datetime
-from .base import Base
+from .base import Base, relationship
 
 class Company(Base):
     __tablename__ = "companies"
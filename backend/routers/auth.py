@@ -1,31 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 
 # Imports relatifs
 from .. import models, database, dependencies
+from ..services import passwords
 
 router = APIRouter(tags=["Authentification"])
 
+def find_user(db, email):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def save_password_hash(db, user, new_hash):
+    user.hashed_password = new_hash
+    db.commit()
+
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+    # Route async : la base dans le threadpool, bcrypt dans son propre pool (services/passwords.py)
     # 1. Chercher l'utilisateur par email
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+    user = await run_in_threadpool(find_user, db, form_data.username)
     
-    # 2. Vérification du mot de passe (En clair pour l'instant, à hasher plus tard)
-    if not user or user.hashed_password != form_data.password: 
+    # 2. Vérification du mot de passe (bcrypt, ou ancienne valeur en clair re-hachée au passage)
+    ok, new_hash = await passwords.verify_password(form_data.password, user.hashed_password) if user else (False, None)
+    if not ok: 
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    claims = {"sub": user.email, "role": user.role}  # Lus avant le commit (qui expire l'objet)
+    if new_hash:
+        await run_in_threadpool(save_password_hash, db, user, new_hash)
 
     # 3. Création du Token
     access_token_expires = timedelta(minutes=dependencies.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = dependencies.create_access_token(
-        data={"sub": user.email, "role": user.role},
+        data=claims,
         expires_delta=access_token_expires
     )
     
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
@@ -0,0 +1,110 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import get_db
+from ..dependencies import get_current_user
+from .chantiers import add_chantier
+from .materiels import add_materiel
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+# ==========================================
+# 📦 ENVOI GROUPÉ DE LA FILE HORS-LIGNE
+# ==========================================
+# Au retour du réseau, le mobile rejoue sa file (chantiers, matériels, rapports)
+# en une seule requête : une authentification, une transaction, un commit.
+# Un chantier créé hors-ligne porte un id temporaire (ref) que les opérations
+# suivantes du lot référencent via `refs` :
+#     {"type": "create_chantier", "ref": "tmp-1", "data": {"nom": "Villa"}}
+#     {"type": "create_rapport", "data": {"titre": "Fissure"}, "refs": {"chantier_id": "tmp-1"}}
+
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "200"))
+
+
+def owned_chantier_id(db, chantier_id, current_user):
+    """Le chantier visé doit appartenir à l'entreprise de l'utilisateur."""
+    if chantier_id is None: return None
+    found = db.query(models.Chantier.id).filter(
+        models.Chantier.id == chantier_id, models.Chantier.company_id == current_user.company_id
+    ).first()
+    if not found: raise HTTPException(404, "Chantier introuvable")
+    return chantier_id
+
+def add_rapport(db, rapport, current_user):
+    owned_chantier_id(db, rapport.chantier_id, current_user)
+    urls = list(rapport.image_urls)
+    if rapport.photo_url and rapport.photo_url not in urls: urls.insert(0, rapport.photo_url)
+    new_r = models.Rapport(**rapport.model_dump(exclude={"image_urls", "photo_url"}), photo_url=urls[0] if urls else None)
+    new_r.images = [models.RapportImage(url=url) for url in urls]
+    db.add(new_r); db.flush()
+    return new_r
+
+def add_materiel_checked(db, mat, current_user):
+    owned_chantier_id(db, mat.chantier_id, current_user)
+    return add_materiel(db, mat, current_user)
+
+# Type d'opération -> (schéma du corps, création sans commit)
+OPERATIONS = {
+    "create_chantier": (schemas.ChantierCreate, add_chantier),
+    "create_materiel": (schemas.MaterielCreate, add_materiel_checked),
+    "create_rapport": (schemas.BatchRapportCreate, add_rapport),
+}
+
+
+def run_operation(db, op, ids, current_user):
+    """Applique une opération ; renvoie l'id créé (HTTPException / ValidationError sinon)."""
+    data = dict(op.data)
+    for field, ref in op.refs.items():
+        if ref not in ids: raise HTTPException(424, f"Référence '{ref}' non créée dans ce lot")
+        data[field] = ids[ref]
+    schema, create = OPERATIONS[op.type]
+    return create(db, schema.model_validate(data), current_user).id
+
+def error_result(exc):
+    if isinstance(exc, HTTPException): return exc.status_code, exc.detail
+    if isinstance(exc, ValidationError): return 422, jsonable_encoder(exc.errors(include_url=False))
+    return 500, str(exc)
+
+
+@router.post("", response_model=schemas.BatchResponse)
+def run_batch(batch: schemas.BatchRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Applique les opérations dans l'ordre et renvoie un résultat par opération.
+    - atomic=false (défaut) : chaque opération dans son SAVEPOINT, les échecs n'annulent qu'elles-mêmes
+    - atomic=true : au premier échec tout est annulé (committed=false)
+    """
+    if not current_user.company_id: raise HTTPException(400, "Aucune entreprise liée")
+    if len(batch.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(413, f"Lot limité à {BATCH_MAX_OPERATIONS} opérations")
+
+    ids, results, failed = {}, [], False
+    for index, op in enumerate(batch.operations):
+        result = {"index": index, "ref": op.ref}
+        if failed:
+            results.append({**result, "status": 424, "error": "Non exécutée : lot annulé"})
+            continue
+        try:
+            if batch.atomic:
+                new_id = run_operation(db, op, ids, current_user)
+            else:
+                with db.begin_nested():
+                    new_id = run_operation(db, op, ids, current_user)
+        except Exception as e:
+            status, detail = error_result(e)
+            results.append({**result, "status": status, "error": detail})
+            if batch.atomic:
+                db.rollback(); failed = True
+            continue
+        if op.ref: ids[op.ref] = new_id
+        results.append({**result, "status": 200, "id": new_id})
+
+    if failed:
+        for r in results:
+            if r["status"] == 200: r.update(status=424, id=None, error="Annulée : lot atomique en échec")
+        return {"results": results, "committed": False, "ids": {}}
+    db.commit()
+    return {"results": results, "committed": True, "ids": ids}
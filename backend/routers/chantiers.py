@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Request
 from fastapi.responses import StreamingResponse # 👈 INDISPENSABLE POUR LE PDF
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta, date
 import cloudinary
 import cloudinary.uploader
@@ -10,19 +11,33 @@ from io import BytesIO
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_user
-from ..utils import get_gps_from_address, send_email_via_brevo
 from ..services import pdf as pdf_service # 👈 IMPORT DU GÉNÉRATEUR
+from ..services import email_outbox, geocoding, pdf_documents, pdf_executor
+from ..services.pdf_spool import blob_response
+from ..services.query_profiles import query_for
+from ..services.pagination import Keyset, PageParams, paginate
 
 # Le préfixe est déjà défini ici, donc toutes les routes commencent par /chantiers
 router = APIRouter(prefix="/chantiers", tags=["Chantiers"])
 
+# Clés de tri des listes paginées (index composites correspondants dans models/)
+CHANTIER_KEYS = Keyset((models.Chantier.date_creation, models.Chantier.id))
+TASK_KEYS = Keyset((models.Task.date_prevue, models.Task.id), descending=False)
+RAPPORT_KEYS = Keyset((models.Rapport.date_creation, models.Rapport.id))
+INSPECTION_KEYS = Keyset((models.Inspection.date_creation, models.Inspection.id))
+DOC_KEYS = Keyset((models.DocExterne.date_ajout, models.DocExterne.id))
+PERMIS_FEU_KEYS = Keyset((models.PermisFeu.date, models.PermisFeu.id))
+PDP_KEYS = Keyset((models.PlanPrevention.date_creation, models.PlanPrevention.id))
+PPSPS_KEYS = Keyset((models.PPSPS.date_creation, models.PPSPS.id))
+
 # ==========================
 # CRUD CHANTIERS
 # ==========================
 
-@router.get("", response_model=List[schemas.ChantierOut])
-def read_chantiers(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.Chantier).filter(models.Chantier.company_id == current_user.company_id).order_by(models.Chantier.date_creation.desc()).all()
+@router.get("", response_model=Union[schemas.Page[schemas.ChantierOut], List[schemas.ChantierOut]])
+def read_chantiers(page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    query = query_for(db, models.Chantier, schemas.ChantierOut).filter(models.Chantier.company_id == current_user.company_id).order_by(models.Chantier.date_creation.desc())
+    return paginate(query, CHANTIER_KEYS, page)
 
 @router.get("/{cid}", response_model=schemas.ChantierOut)
 def get_chantier(cid: int, db: Session = Depends(get_db)):
@@ -32,9 +47,13 @@ def get_chantier(cid: int, db: Session = Depends(get_db)):
 
 @router.post("", response_model=schemas.ChantierOut)
 def create_chantier(chantier: schemas.ChantierCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    new_c = add_chantier(db, chantier, current_user)
+    db.commit(); db.refresh(new_c)
+    return new_c
+
+def add_chantier(db, chantier, current_user):
+    """Ajoute le chantier à la session (flush, sans commit : réutilisé par POST /batch)."""
     lat, lng = chantier.latitude, chantier.longitude
-    if (not lat or lat == 0) and chantier.adresse:
-        lat, lng = get_gps_from_address(chantier.adresse)
     
     d_debut = chantier.date_debut or datetime.now().date()
     d_fin = chantier.date_fin or (datetime.now() + timedelta(days=30)).date()
@@ -44,7 +63,10 @@ def create_chantier(chantier: schemas.ChantierCreate, db: Session = Depends(get_
         company_id=current_user.company_id, date_debut=d_debut, date_fin=d_fin,
         latitude=lat, longitude=lng, soumis_sps=False
     )
-    db.add(new_c); db.commit(); db.refresh(new_c)
+    # Sans coordonnées : cache de géocodage, sinon en file (geocode_status = "pending")
+    if (not lat or lat == 0) and chantier.adresse:
+        geocoding.request_geocode(db, new_c)
+    db.add(new_c); db.flush()
     return new_c
 
 @router.put("/{cid}", response_model=schemas.ChantierOut)
@@ -55,10 +77,10 @@ def update_chantier(cid: int, chantier: schemas.ChantierUpdate, db: Session = De
     for k, v in data.items():
         if k == "adresse" and v != db_c.adresse and "latitude" not in data:
             db_c.adresse = v
-            lat, lng = get_gps_from_address(v)
-            if lat: db_c.latitude, db_c.longitude = lat, lng
+            geocoding.request_geocode(db, db_c)  # Anciennes coordonnées gardées jusqu'au résultat
         elif k in ["date_debut", "date_fin"] and isinstance(v, datetime): setattr(db_c, k, v.date())
         else: setattr(db_c, k, v)
+    if data.get("latitude"): db_c.geocode_status = None  # Coordonnées fournies : géocodage en attente annulé
     db.commit(); db.refresh(db_c)
     return db_c
 
@@ -79,37 +101,37 @@ def delete_chantier(cid: int, db: Session = Depends(get_db)):
 # SOUS-RESSOURCES (TASKS, RAPPORTS, DOCS...)
 # ==========================
 
-@router.get("/{chantier_id}/tasks", response_model=List[schemas.TaskOut])
-def get_chantier_tasks(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.Task).filter(models.Task.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/tasks", response_model=Union[schemas.Page[schemas.TaskOut], List[schemas.TaskOut]])
+def get_chantier_tasks(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(db.query(models.Task).filter(models.Task.chantier_id == chantier_id), TASK_KEYS, page)
 
-@router.get("/{chantier_id}/rapports", response_model=List[schemas.RapportOut])
-def get_chantier_rapports(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.Rapport).filter(models.Rapport.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/rapports", response_model=Union[schemas.Page[schemas.RapportOut], List[schemas.RapportOut]])
+def get_chantier_rapports(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(query_for(db, models.Rapport, schemas.RapportOut).filter(models.Rapport.chantier_id == chantier_id), RAPPORT_KEYS, page)
 
-@router.get("/{chantier_id}/inspections", response_model=List[schemas.InspectionOut])
-def get_chantier_inspections(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.Inspection).filter(models.Inspection.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/inspections", response_model=Union[schemas.Page[schemas.InspectionOut], List[schemas.InspectionOut]])
+def get_chantier_inspections(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(db.query(models.Inspection).filter(models.Inspection.chantier_id == chantier_id), INSPECTION_KEYS, page)
 
-@router.get("/{chantier_id}/docs", response_model=List[schemas.DocExterneOut])
-def get_chantier_docs(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.DocExterne).filter(models.DocExterne.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/docs", response_model=Union[schemas.Page[schemas.DocExterneOut], List[schemas.DocExterneOut]])
+def get_chantier_docs(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(db.query(models.DocExterne).filter(models.DocExterne.chantier_id == chantier_id), DOC_KEYS, page)
 
 @router.get("/{chantier_id}/pic", response_model=Optional[schemas.PicOut])
 def get_chantier_pic(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     return db.query(models.PIC).filter(models.PIC.chantier_id == chantier_id).first()
 
-@router.get("/{chantier_id}/permis-feu", response_model=List[schemas.PermisFeuOut])
-def get_chantier_permis_feu(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.PermisFeu).filter(models.PermisFeu.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/permis-feu", response_model=Union[schemas.Page[schemas.PermisFeuOut], List[schemas.PermisFeuOut]])
+def get_chantier_permis_feu(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(db.query(models.PermisFeu).filter(models.PermisFeu.chantier_id == chantier_id), PERMIS_FEU_KEYS, page)
 
-@router.get("/{chantier_id}/plans-prevention", response_model=List[schemas.PlanPreventionOut])
-def get_pdps(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.PlanPrevention).filter(models.PlanPrevention.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/plans-prevention", response_model=Union[schemas.Page[schemas.PlanPreventionOut], List[schemas.PlanPreventionOut]])
+def get_pdps(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(query_for(db, models.PlanPrevention, schemas.PlanPreventionOut).filter(models.PlanPrevention.chantier_id == chantier_id), PDP_KEYS, page)
 
-@router.get("/{chantier_id}/ppsps", response_model=List[schemas.PPSPSOut])
-def get_ppsps(chantier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.PPSPS).filter(models.PPSPS.chantier_id == chantier_id).all()
+@router.get("/{chantier_id}/ppsps", response_model=Union[schemas.Page[schemas.PPSPSOut], List[schemas.PPSPSOut]])
+def get_ppsps(chantier_id: int, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return paginate(query_for(db, models.PPSPS, schemas.PPSPSOut).filter(models.PPSPS.chantier_id == chantier_id), PPSPS_KEYS, page)
 
 # ==========================
 # CREATION PERMIS FEU
@@ -143,34 +165,24 @@ def create_permis_feu(chantier_id: int, permis: schemas.PermisFeuCreate, db: Ses
 # 📄 GÉNÉRATION PDF PERMIS FEU (C'est ce qu'il vous manquait !)
 # ==========================
 @router.get("/permis-feu/{permis_id}/pdf")
-def download_permis_feu_pdf(permis_id: int, db: Session = Depends(get_db)):
-    # 1. Récupérer le permis
-    permis = db.query(models.PermisFeu).filter(models.PermisFeu.id == permis_id).first()
-    if not permis:
+async def download_permis_feu_pdf(permis_id: int, request: Request, db: Session = Depends(get_db)):
+    # 1. Récupérer le permis et son chantier (threadpool : la route est async)
+    doc = await run_in_threadpool(pdf_documents.permis_feu_document, db, permis_id)
+    if not doc:
         # Si le permis n'existe pas en BDD, on renvoie une 404 explicite
         raise HTTPException(status_code=404, detail="Permis introuvable dans la base de données")
-    
-    # 2. Récupérer le chantier lié
-    chantier = db.query(models.Chantier).filter(models.Chantier.id == permis.chantier_id).first()
 
-    # 3. Générer le PDF
-    buffer = BytesIO()
+    # 2. Générer le PDF (cache, sinon pool de processus)
     try:
-        # On appelle le service de dessin
-        pdf_service.generate_permis_feu_pdf(buffer, permis, chantier)
+        blob, temporary = await pdf_documents.get_pdf_blob_async(doc)
+    except pdf_executor.RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"Erreur PDF Service: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du PDF : {str(e)}")
 
-    buffer.seek(0)
-
-    # 4. Renvoyer le fichier
-    filename = f"Permis_Feu_{permis_id}.pdf"
-    return StreamingResponse(
-        buffer, 
-        media_type="application/pdf", 
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
+    # 3. Renvoyer le fichier
+    return blob_response(request, blob, doc.filename, temporary=temporary)
 
 # ==========================
 # FEATURES (COVER, EMAIL...)
@@ -187,22 +199,19 @@ def upload_cover(cid: int, file: UploadFile = File(...), db: Session = Depends(g
         return {"url": c.cover_url}
     except Exception as e: raise HTTPException(500, str(e))
 
-@router.post("/{cid}/send-email")
+@router.post("/{cid}/send-email", response_model=schemas.EmailBatchOut, status_code=202)
 def send_email(cid: int, email_dest: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Met le journal en file d'envoi (plusieurs destinataires séparés par , ou ;). Suivi : GET /emails/{id}"""
     c = db.query(models.Chantier).filter(models.Chantier.id == cid).first()
     if not c: raise HTTPException(404)
-    
-    raps = db.query(models.Rapport).filter(models.Rapport.chantier_id == cid).all()
-    inss = db.query(models.Inspection).filter(models.Inspection.chantier_id == cid).all()
-    comp = db.query(models.Company).filter(models.Company.id == current_user.company_id).first()
 
-    pdf_buffer = BytesIO()
-    try:
-        pdf_service.generate_pdf(c, raps, inss, pdf_buffer, company=comp)
-    except Exception as e:
-        raise HTTPException(500, f"Erreur PDF Journal: {str(e)}")
-        
+    recipients = [r for r in email_dest.replace(";", ",").split(",") if r.strip()]
+    if not recipients: raise HTTPException(400, "Aucun destinataire")
+
+    # Le PDF est rendu une seule fois par l'expéditeur, en arrière-plan, pour tous les destinataires
     html = f"<html><body><h2>Suivi Chantier: {c.nom}</h2><p>Ci-joint le journal de bord.</p></body></html>"
-    if send_email_via_brevo(email_dest, f"Suivi - {c.nom}", html, pdf_buffer, f"Journal_{c.nom}.pdf"):
-        return {"message": "Email envoyé !"}
-    raise HTTPException(500, "Erreur envoi email")
\ No newline at end of file
+    emails = email_outbox.enqueue_emails(
+        db, recipients, f"Suivi - {c.nom}", html, attachment=("journal", cid, f"Journal_{c.nom}.pdf"),
+        company_id=current_user.company_id, chantier_id=cid
+    )
+    return {"message": f"{len(emails)} email(s) en file d'envoi", "emails": emails}
\ No newline at end of file
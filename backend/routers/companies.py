@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse # 👈 INDISPENSABLE
 from ..services import pdf as pdf_service # Importez le fichier créé à l'étape 2
+from ..services import pdf_documents, pdf_executor
+from ..services.pdf_spool import blob_response
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from io import BytesIO
 from .. import models, schemas
@@ -120,24 +123,17 @@ def add_company_document(
 # 📄 GÉNÉRATION PDF PERMIS FEU
 # ==========================
 @router.get("/permis-feu/{permis_id}/pdf")
-def download_permis_feu_pdf(permis_id: int, db: Session = Depends(get_db)):
-    # 1. Récupérer le permis
-    permis = db.query(models.PermisFeu).filter(models.PermisFeu.id == permis_id).first()
-    if not permis:
+async def download_permis_feu_pdf(permis_id: int, request: Request, db: Session = Depends(get_db)):
+    # 1. Récupérer le permis et le chantier lié (threadpool : la route est async)
+    doc = await run_in_threadpool(pdf_documents.permis_feu_document, db, permis_id)
+    if not doc:
         raise HTTPException(status_code=404, detail="Permis introuvable")
-    
-    # 2. Récupérer le chantier lié (pour le nom et l'adresse)
-    chantier = db.query(models.Chantier).filter(models.Chantier.id == permis.chantier_id).first()
 
-    # 3. Générer le PDF en mémoire
-    buffer = BytesIO()
-    pdf_service.generate_permis_feu_pdf(buffer, permis, chantier)
-    buffer.seek(0)
+    # 2. Générer le PDF (cache, sinon pool de processus)
+    try:
+        blob, temporary = await pdf_documents.get_pdf_blob_async(doc)
+    except pdf_executor.RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
 
-    # 4. Renvoyer le fichier au navigateur
-    filename = f"Permis_Feu_{permis_id}.pdf"
-    return StreamingResponse(
-        buffer, 
-        media_type="application/pdf", 
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
\ No newline at end of file
+    # 3. Renvoyer le fichier au navigateur
+    return blob_response(request, blob, doc.filename, temporary=temporary)
@@ -1,61 +1,95 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from io import BytesIO
+from typing import Optional
+from datetime import date
 
 from .. import models
-from ..database import get_db
-from ..services import pdf as pdf_service
+from ..database import get_pdf_db as get_db  # Délai SQL de la classe "pdf"
+from ..dependencies import get_current_user
+from ..services import pdf_archive, pdf_documents, pdf_doe, pdf_executor, pdf_jobs
+from ..services.pdf_images import QualityProfile, DEFAULT_QUALITY
+from ..services.pdf_spool import blob_response
 
 router = APIRouter(tags=["Documents PDF"])
 
+# Routes async : les requêtes SQL passent par le threadpool, le rendu par le
+# pool de processus (pdf_executor) -> un gros PDF ne bloque pas les autres requêtes.
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match : liste d'ETags séparés par des virgules (faibles W/ acceptés) ou "*"."""
+    if not if_none_match: return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+async def pdf_response(request: Request, doc: pdf_documents.PdfDocument, db: Session, quality=DEFAULT_QUALITY, get_blob=pdf_documents.get_pdf_blob_async):
+    """Réponse PDF avec ETag : 304 si le client a déjà cette version, sinon cache ou rendu (`get_blob`)."""
+    headers = {"ETag": doc.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), doc.etag):
+        return Response(status_code=304, headers=headers)
+
+    # Gros document : le client peut demander un rendu asynchrone (Prefer: respond-async)
+    if "respond-async" in request.headers.get("prefer", "") and doc.doc_type in pdf_documents.DOCUMENT_BUILDERS:
+        job = await run_in_threadpool(pdf_jobs.submit_job, db, doc.doc_type, doc.entity_id, quality, company_id=doc.company_id)
+        return JSONResponse(
+            status_code=202, content={"job_id": job.id, "status_url": f"/pdf-jobs/{job.id}"},
+            headers={"Location": f"/pdf-jobs/{job.id}"}
+        )
+
+    try:
+        blob, temporary = await get_blob(doc)
+    except pdf_executor.RenderTimeout as e:
+        raise HTTPException(504, f"{e} : réessayez avec l'en-tête 'Prefer: respond-async'")
+    # Envoi par morceaux depuis le fichier spoolé (+ Range pour la visionneuse mobile)
+    return blob_response(request, blob, doc.filename, headers, temporary=temporary)
+
 # 1. PDF JOURNAL DE BORD (Global Chantier)
 @router.get("/chantiers/{cid}/pdf")
-def download_journal_pdf(cid: int, db: Session = Depends(get_db)):
-    chantier = db.query(models.Chantier).filter(models.Chantier.id == cid).first()
-    if not chantier: raise HTTPException(404, "Chantier introuvable")
-    
-    rapports = db.query(models.Rapport).filter(models.Rapport.chantier_id == cid).order_by(models.Rapport.date_creation.desc()).all()
-    
-    buffer = BytesIO()
-    pdf_service.generate_journal_pdf(buffer, chantier, rapports)
-    buffer.seek(0)
-    
-    return StreamingResponse(buffer, media_type="application/pdf", headers={"Content-Disposition": f"inline; filename=Journal_{cid}.pdf"})
+async def download_journal_pdf(cid: int, request: Request, quality: QualityProfile = DEFAULT_QUALITY, db: Session = Depends(get_db)):
+    doc = await run_in_threadpool(pdf_documents.journal_document, db, cid, quality)
+    if not doc: raise HTTPException(404, "Chantier introuvable")
+    return await pdf_response(request, doc, db, quality)
 
 # 2. PDF PPSPS
 @router.get("/ppsps/{doc_id}/pdf")
-def download_ppsps_pdf(doc_id: int, db: Session = Depends(get_db)):
-    doc = db.query(models.PPSPS).filter(models.PPSPS.id == doc_id).first()
+async def download_ppsps_pdf(doc_id: int, request: Request, quality: QualityProfile = DEFAULT_QUALITY, db: Session = Depends(get_db)):
+    doc = await run_in_threadpool(pdf_documents.ppsps_document, db, doc_id, quality)
     if not doc: raise HTTPException(404, "PPSPS introuvable")
-    
-    chantier = db.query(models.Chantier).filter(models.Chantier.id == doc.chantier_id).first()
-    
-    buffer = BytesIO()
-    pdf_service.generate_ppsps_pdf(buffer, doc, chantier)
-    buffer.seek(0)
-    
-    return StreamingResponse(buffer, media_type="application/pdf", headers={"Content-Disposition": f"inline; filename=PPSPS_{doc_id}.pdf"})
+    return await pdf_response(request, doc, db, quality)
 
 # 3. PDF PLAN DE PREVENTION
 @router.get("/plans-prevention/{pdp_id}/pdf")
-def download_pdp_pdf(pdp_id: int, db: Session = Depends(get_db)):
-    pdp = db.query(models.PlanPrevention).filter(models.PlanPrevention.id == pdp_id).first()
-    if not pdp: raise HTTPException(404, "Plan introuvable")
-    
-    chantier = db.query(models.Chantier).filter(models.Chantier.id == pdp.chantier_id).first()
-    
-    buffer = BytesIO()
-    pdf_service.generate_pdp_pdf(buffer, pdp, chantier)
-    buffer.seek(0)
-    
-    return StreamingResponse(buffer, media_type="application/pdf", headers={"Content-Disposition": f"inline; filename=PDP_{pdp_id}.pdf"})
+async def download_pdp_pdf(pdp_id: int, request: Request, quality: QualityProfile = DEFAULT_QUALITY, db: Session = Depends(get_db)):
+    doc = await run_in_threadpool(pdf_documents.pdp_document, db, pdp_id, quality)
+    if not doc: raise HTTPException(404, "Plan introuvable")
+    return await pdf_response(request, doc, db, quality)
 
 # 4. PDF INSPECTIONS / AUDITS
 @router.get("/inspections/{insp_id}/pdf")
-def download_inspection_pdf(insp_id: int, db: Session = Depends(get_db)):
+async def download_inspection_pdf(insp_id: int, request: Request, quality: QualityProfile = DEFAULT_QUALITY, db: Session = Depends(get_db)):
     # Pour l'instant on renvoie le journal global car la structure inspection est complexe
     # À affiner plus tard si vous voulez un PDF spécifique audit
-    insp = db.query(models.Inspection).filter(models.Inspection.id == insp_id).first()
+    insp = await run_in_threadpool(lambda: db.query(models.Inspection).filter(models.Inspection.id == insp_id).first())
     if not insp: raise HTTPException(404)
-    return download_journal_pdf(insp.chantier_id, db)
\ No newline at end of file
+    return await download_journal_pdf(insp.chantier_id, request, quality, db)
+
+# 5. DOE : DOSSIER DES OUVRAGES EXÉCUTÉS (Toutes les pièces du chantier, avec sommaire et signets)
+@router.get("/chantiers/{cid}/doe")
+async def download_doe_pdf(cid: int, request: Request, quality: QualityProfile = DEFAULT_QUALITY, db: Session = Depends(get_db)):
+    doe = await run_in_threadpool(pdf_doe.doe_document, db, cid, quality)
+    if not doe: raise HTTPException(404, "Chantier introuvable")
+    return await pdf_response(request, doe, db, quality, get_blob=pdf_doe.get_doe_blob_async)
+
+# 6. ARCHIVE ZIP DE L'ENTREPRISE (Tous les PDF réglementaires, avec manifest)
+@router.get("/companies/me/archive")
+async def download_company_archive(
+    date_from: Optional[date] = None, date_to: Optional[date] = None,
+    current_user: models.User = Depends(get_current_user)
+):
+    if not current_user.company_id: raise HTTPException(404, "Aucune entreprise liée")
+    filename = f"Archive_Conformeo_{date.today().isoformat()}.zip"
+    return StreamingResponse(
+        pdf_archive.stream_company_archive(current_user.company_id, date_from, date_to),
+        media_type="application/zip", headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from .. import models, schemas
+from ..database import get_db
+from ..dependencies import get_current_user
+
+router = APIRouter(prefix="/emails", tags=["Emails"])
+
+# 1. SUIVI DES ENVOIS (File email_outbox)
+@router.get("", response_model=List[schemas.OutboxEmailOut])
+def list_emails(chantier_id: Optional[int] = None, status: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    query = db.query(models.OutboxEmail).filter(models.OutboxEmail.company_id == current_user.company_id)
+    if chantier_id: query = query.filter(models.OutboxEmail.chantier_id == chantier_id)
+    if status: query = query.filter(models.OutboxEmail.status == status.upper())
+    return query.order_by(models.OutboxEmail.created_at.desc()).limit(min(limit, 200)).all()
+
+# 2. STATUT D'UN EMAIL
+@router.get("/{email_id}", response_model=schemas.OutboxEmailOut)
+def get_email(email_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    email = db.query(models.OutboxEmail).filter(models.OutboxEmail.id == email_id).first()
+    if not email or email.company_id != current_user.company_id: raise HTTPException(404, "Email introuvable")
+    return email
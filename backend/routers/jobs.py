@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+from datetime import datetime
+
+from .. import models, schemas
+from ..database import get_db
+from ..dependencies import get_current_user
+from ..services import pdf_documents, pdf_jobs
+
+router = APIRouter(prefix="/pdf-jobs", tags=["Documents PDF"])
+
+def to_out(job):
+    out = schemas.PdfJobOut.model_validate(job)
+    if job.status == pdf_jobs.STATUS_DONE: out.result_url = f"/pdf-jobs/{job.id}/result"
+    return out
+
+# 1. SOUMETTRE UN RENDU
+@router.post("", response_model=schemas.PdfJobOut, status_code=status.HTTP_202_ACCEPTED)
+def submit_pdf_job(job_in: schemas.PdfJobCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Le document doit appartenir à l'entreprise de l'utilisateur (sinon 404, comme s'il n'existait pas)
+    owner = pdf_documents.document_company_id(db, job_in.doc_type, job_in.entity_id)
+    if owner is None or owner != current_user.company_id: raise HTTPException(404, "Document introuvable")
+    job = pdf_jobs.submit_job(db, job_in.doc_type, job_in.entity_id, job_in.quality, company_id=current_user.company_id)
+    return to_out(job)
+
+# 2. SUIVRE L'AVANCEMENT
+@router.get("/{job_id}", response_model=schemas.PdfJobOut)
+def get_pdf_job(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    job = db.query(models.PdfJob).filter(models.PdfJob.id == job_id).first()
+    if not job or job.company_id != current_user.company_id: raise HTTPException(404, "Job introuvable")
+    return to_out(job)
+
+# 3. RÉCUPÉRER LE PDF (Lien direct, comme les autres routes PDF : l'UUID fait office de jeton)
+@router.get("/{job_id}/result")
+def get_pdf_job_result(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(models.PdfJob).filter(models.PdfJob.id == job_id).first()
+    if not job: raise HTTPException(404, "Job introuvable")
+    if job.expires_at and job.expires_at < datetime.utcnow(): raise HTTPException(410, "Résultat expiré")
+    if job.status == pdf_jobs.STATUS_FAILED: raise HTTPException(500, f"Échec du rendu : {job.error}")
+    if job.status != pdf_jobs.STATUS_DONE: raise HTTPException(409, f"PDF pas encore prêt ({job.progress}%)")
+    return Response(
+        content=job.result, media_type="application/pdf",
+        headers={"Content-Disposition": f"inline; filename={job.filename or 'document.pdf'}"}
+    )
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from typing import List, Optional, Union
 import csv
 import io
 from datetime import datetime, timedelta
@@ -9,9 +9,13 @@ from datetime import datetime, timedelta
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_user
+from ..services.query_profiles import query_for
+from ..services.pagination import Keyset, PageParams, paginate
 
 router = APIRouter(prefix="/materiels", tags=["Materiels"])
 
+MATERIEL_KEYS = Keyset((models.Materiel.id,), descending=False)
+
 # --- FONCTION UTILITAIRE : CALCUL STATUT VGP ---
 def inject_statut(mat):
     statut = "INCONNU"
@@ -47,16 +51,26 @@ def inject_statut(mat):
 # ==========================
 # 1. LISTE DES MATÉRIELS
 # ==========================
-@router.get("", response_model=List[schemas.MaterielOut])
-def read_materiels(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    rows = db.query(models.Materiel).filter(models.Materiel.company_id == current_user.company_id).offset(skip).limit(limit).all()
-    return [inject_statut(r) for r in rows]
+@router.get("", response_model=Union[schemas.Page[schemas.MaterielOut], List[schemas.MaterielOut]])
+def read_materiels(skip: int = 0, page: PageParams = Depends(), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    query = query_for(db, models.Materiel, schemas.MaterielOut).filter(models.Materiel.company_id == current_user.company_id)
+    # ?all=true : ancien comportement (skip / limit, 1000 par défaut)
+    result = paginate(query, MATERIEL_KEYS, page, all_query=query.offset(skip).limit(page.limit or 1000))
+    for r in (result if page.all else result["items"]): inject_statut(r)
+    return result
 
 # ==========================
 # 2. CRÉER UN MATÉRIEL
 # ==========================
 @router.post("", response_model=schemas.MaterielOut)
 def create_materiel(mat: schemas.MaterielCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    new_m = add_materiel(db, mat, current_user)
+    db.commit()
+    db.refresh(new_m)
+    return inject_statut(new_m)
+
+def add_materiel(db, mat, current_user):
+    """Ajoute le matériel à la session (flush, sans commit : réutilisé par POST /batch)."""
     d_vgp = None
     if mat.date_derniere_vgp:
         try: d_vgp = datetime.fromisoformat(str(mat.date_derniere_vgp)[:10])
@@ -73,9 +87,8 @@ def create_materiel(mat: schemas.MaterielCreate, db: Session = Depends(get_db),
         company_id=current_user.company_id
     )
     db.add(new_m)
-    db.commit()
-    db.refresh(new_m)
-    return inject_statut(new_m)
+    db.flush()
+    return new_m
 
 # ==========================
 # 3. TRANSFERT MATÉRIEL (FIX CHANTIER INVISIBLE)
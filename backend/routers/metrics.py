@@ -0,0 +1,39 @@
+import os
+import hmac
+from fastapi import APIRouter, Header, HTTPException, Request
+from typing import Optional
+
+from ..database import DB_POOL_PROFILE, DB_STATEMENT_TIMEOUTS, pool_settings
+from ..services.db_metrics import pool_metrics
+from ..services.auth_cache import principal_cache
+
+router = APIRouter(prefix="/internal/metrics", tags=["Interne"], include_in_schema=False)
+
+# Accès : en-tête X-Metrics-Token = METRICS_TOKEN, ou appel local si aucun jeton n'est défini
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+LOCAL_CLIENTS = ("127.0.0.1", "::1", "localhost", "testclient")
+
+def check_access(request: Request, token: Optional[str]):
+    if METRICS_TOKEN:
+        if not token or not hmac.compare_digest(token, METRICS_TOKEN): raise HTTPException(404)
+    elif not request.client or request.client.host not in LOCAL_CLIENTS:
+        raise HTTPException(404)
+
+# 1. POOL DE CONNEXIONS SQL
+@router.get("/db")
+def get_db_metrics(request: Request, reset: bool = False, x_metrics_token: Optional[str] = Header(None)):
+    check_access(request, x_metrics_token)
+    snapshot = pool_metrics.snapshot()
+    snapshot["profile"] = DB_POOL_PROFILE
+    snapshot["settings"] = pool_settings()
+    snapshot["statement_timeouts_ms"] = DB_STATEMENT_TIMEOUTS
+    if reset: pool_metrics.reset()
+    return snapshot
+
+# 2. CACHE D'AUTHENTIFICATION
+@router.get("/auth-cache")
+def get_auth_cache_metrics(request: Request, reset: bool = False, x_metrics_token: Optional[str] = Header(None)):
+    check_access(request, x_metrics_token)
+    snapshot = principal_cache.snapshot()
+    if reset: principal_cache.reset_stats()
+    return snapshot
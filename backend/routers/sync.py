@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from .. import models, schemas
+from ..database import get_db
+from ..dependencies import get_current_user
+from ..services import sync_log
+from ..services.query_profiles import query_for
+from .materiels import inject_statut
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+# Entité -> schéma de la ligne envoyée (le même que les routes de liste)
+SYNC_SCHEMAS = {
+    "chantiers": schemas.ChantierOut, "materiels": schemas.MaterielOut, "rapports": schemas.RapportOut,
+    "inspections": schemas.InspectionOut, "tasks": schemas.TaskOut, "docs": schemas.DocExterneOut,
+    "ppsps": schemas.PPSPSOut, "plans_prevention": schemas.PlanPreventionOut,
+    "permis_feu": schemas.PermisFeuOut, "pic": schemas.PicOut,
+}
+
+@router.get("", response_model=schemas.SyncPage)
+def sync_changes(
+    since: Optional[str] = Query(None, description="next_token de la réponse précédente (vide = synchro complète)"),
+    limit: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+):
+    """
+    Lignes créées, modifiées ou supprimées depuis `since`, par pages (has_more).
+    Un chantier supprimé emporte ses sous-ressources : l'appareil les retire aussi.
+    """
+    if not current_user.company_id: raise HTTPException(400, "Aucune entreprise liée")
+    rows, next_token, has_more, reset = sync_log.read_changes(db, current_user.company_id, since, limit)
+
+    # Lignes à jour : une requête par type d'entité présent dans la page
+    ids = {}
+    for row in rows:
+        if row.op == sync_log.OP_UPSERT: ids.setdefault(row.entity, []).append(row.entity_id)
+    data = {}
+    for entity, entity_ids in ids.items():
+        model, schema = sync_log.ENTITY_MODELS[entity], SYNC_SCHEMAS[entity]
+        for obj in query_for(db, model, schema).filter(model.id.in_(entity_ids)).all():
+            if entity == "materiels": inject_statut(obj)
+            data[(entity, obj.id)] = jsonable_encoder(schema.model_validate(obj))
+
+    changes = []
+    for row in rows:
+        payload = data.get((row.entity, row.entity_id))
+        # Ligne disparue sans tombstone (suppression en masse) : envoyée comme supprimée
+        op = row.op if payload is not None or row.op == sync_log.OP_DELETE else sync_log.OP_DELETE
+        changes.append({"entity": row.entity, "id": row.entity_id, "op": op, "seq": row.seq, "changed_at": row.changed_at, "data": payload})
+    return {"changes": changes, "next_token": next_token, "has_more": has_more, "reset": reset}
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 from .. import models, schemas, database
+from ..services.pagination import Keyset, PageParams, paginate
 
 router = APIRouter(
     prefix="/tasks",
     tags=["Tasks"]
 )
 
-@router.get("", response_model=List[schemas.TaskOut])
-def read_tasks(db: Session = Depends(database.get_db)):
-    return db.query(models.Task).all()
+@router.get("", response_model=Union[schemas.Page[schemas.TaskOut], List[schemas.TaskOut]])
+def read_tasks(page: PageParams = Depends(), db: Session = Depends(database.get_db)):
+    return paginate(db.query(models.Task), Keyset((models.Task.id,), descending=False), page)
 
 @router.post("", response_model=schemas.TaskOut)
 def create_task(task: schemas.TaskCreate, db: Session = Depends(database.get_db)):
@@ -4,6 +4,8 @@ from typing import List
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_user
+from ..services import passwords
+from starlette.concurrency import run_in_threadpool
 
 router = APIRouter(prefix="/users", tags=["Utilisateurs"])
 
@@ -30,7 +32,12 @@ def read_team(db: Session = Depends(get_db), current_user: models.User = Depends
 from fastapi import HTTPException # Assurez-vous d'avoir cet import
 
 @router.post("/", response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # Hachage bcrypt dans son pool dédié (services/passwords.py), la base dans le threadpool
+    hashed_password = await passwords.hash_password(user.password)
+    return await run_in_threadpool(insert_user, db, user, hashed_password)
+
+def insert_user(db, user, hashed_password):
     # 1. Vérifier si l'email existe déjà
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
@@ -51,10 +58,9 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         company_id = db_company.id
 
     # 3. Création de l'utilisateur
-    # ATTENTION : Pour l'instant on stocke le mot de passe en clair pour que ça marche avec votre auth.py actuel
     new_user = models.User(
         email=user.email,
-        hashed_password=user.password, # ⚠️ À hasher plus tard avec bcrypt
+        hashed_password=hashed_password,
         nom=user.nom,
         role="admin", # On force le rôle admin pour le premier
         company_id=company_id
@@ -3,4 +3,10 @@ from .chantiers import *
 from .materiels import *
 from .tasks import *
 from .rapports import *
-from .security import *
\ No newline at end of file
+from .security import *
+from .jobs import *
+from .emails import *
+
+from .pagination import *
+from .sync import *
+from .batch import *
\ No newline at end of file
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal
+
+from .rapports import RapportCreate
+
+# --- ENVOI GROUPÉ DE LA FILE HORS-LIGNE (POST /batch) ---
+class BatchOperation(BaseModel):
+    type: Literal["create_chantier", "create_materiel", "create_rapport"]
+    ref: Optional[str] = None                       # Id temporaire côté mobile (ex: "tmp-chantier-3")
+    data: Dict[str, Any] = {}                       # Corps de la route unitaire correspondante
+    refs: Dict[str, str] = {}                       # Champ -> id temporaire, ex: {"chantier_id": "tmp-chantier-3"}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1)
+    atomic: bool = False                            # True : tout ou rien (sinon chaque opération isolée)
+
+class BatchRapportCreate(RapportCreate):
+    image_urls: List[str] = []                      # Photos déjà envoyées (POST /upload)
+
+class BatchItemResult(BaseModel):
+    index: int
+    ref: Optional[str] = None
+    status: int                                     # Code HTTP qu'aurait renvoyé la route unitaire
+    id: Optional[int] = None                        # Id serveur de la ligne créée
+    error: Optional[Any] = None
+
+class BatchResponse(BaseModel):
+    results: List[BatchItemResult]
+    committed: bool                                 # Faux si un lot atomique a été annulé
+    ids: Dict[str, int] = {}                        # Id temporaire -> id serveur
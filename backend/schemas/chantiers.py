@@ -46,6 +46,7 @@ class ChantierOut(BaseModel):
     company_id: Optional[int] = None
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    geocode_status: Optional[str] = None  # pending / running : coordonnées en cours de calcul
     class Config:
         from_attributes = True
 
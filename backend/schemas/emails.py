@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+# --- FILE D'ENVOI DES EMAILS ---
+class OutboxEmailOut(BaseModel):
+    id: str
+    to_email: str
+    subject: Optional[str] = None
+    status: str
+    attempts: int = 0
+    error: Optional[str] = None
+    http_status: Optional[int] = None
+    provider_message_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    run_after: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
+    chantier_id: Optional[int] = None
+    class Config:
+        from_attributes = True
+
+class EmailBatchOut(BaseModel):
+    message: str
+    emails: List[OutboxEmailOut]
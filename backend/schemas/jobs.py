@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import Optional, Literal
+from datetime import datetime
+
+# --- JOBS PDF ASYNCHRONES ---
+class PdfJobCreate(BaseModel):
+    doc_type: Literal["journal", "ppsps", "pdp", "permis_feu", "duerp"]
+    entity_id: int
+    quality: Literal["draft", "standard", "print"] = "standard"
+
+class PdfJobOut(BaseModel):
+    id: str
+    doc_type: str
+    entity_id: int
+    status: str
+    progress: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    result_size: Optional[int] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    result_url: Optional[str] = None
+    class Config:
+        from_attributes = True
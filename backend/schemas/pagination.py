@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional, List, Generic, TypeVar
+
+T = TypeVar("T")
+
+# --- PAGE D'UNE LISTE (Pagination par curseur) ---
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None  # À renvoyer en ?cursor= ; null = dernière page
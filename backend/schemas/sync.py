@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+
+# --- SYNCHRONISATION MOBILE (GET /sync) ---
+class SyncChangeOut(BaseModel):
+    entity: str                      # chantiers, materiels, rapports, inspections, tasks, docs, ppsps...
+    id: int
+    op: str                          # upsert / delete
+    seq: int
+    changed_at: Optional[datetime] = None
+    data: Optional[Dict[str, Any]] = None  # Ligne complète (upsert), absente pour un delete
+
+class SyncPage(BaseModel):
+    changes: List[SyncChangeOut]
+    next_token: str                  # À renvoyer en ?since= (même si has_more est faux)
+    has_more: bool = False
+    reset: bool = False              # L'appareil doit vider son cache avant d'appliquer cette page
@@ -0,0 +1,128 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# ==========================================
+# 🔐 CACHE DES UTILISATEURS AUTHENTIFIÉS
+# ==========================================
+# get_current_user décodait le JWT et relisait l'utilisateur à chaque requête.
+# Jeton -> Principal (id, entreprise, rôle, offre) gardé AUTH_CACHE_TTL secondes
+# (jamais au-delà de l'expiration du jeton), LRU borné à AUTH_CACHE_SIZE entrées.
+# Invalidation au commit d'une modification d'un utilisateur ou d'une entreprise ;
+# sur plusieurs workers, les autres processus voient le changement au plus tard
+# après le TTL.
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))   # 0 = désactivé
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Utilisateur connecté tel que vu par les routes (sérialisable en UserOut)."""
+    id: int
+    email: str
+    nom: Optional[str]
+    role: str
+    is_active: bool
+    company_id: Optional[int]
+    plan: Optional[str]  # Offre de l'entreprise (companies.subscription_plan)
+
+
+def load_principal(db, email):
+    """Utilisateur + offre de son entreprise en une requête (None si inconnu)."""
+    U, C = models.User, models.Company
+    row = (
+        db.query(U.id, U.email, U.nom, U.role, U.is_active, U.company_id, C.subscription_plan)
+        .outerjoin(C, C.id == U.company_id)
+        .filter(U.email == email)
+        .first()
+    )
+    if row is None: return None
+    return Principal(
+        id=row.id, email=row.email, nom=row.nom, role=row.role or "conducteur",
+        is_active=row.is_active is not False, company_id=row.company_id, plan=row.subscription_plan,
+    )
+
+
+class PrincipalCache:
+    def __init__(self, ttl, size):
+        self.ttl, self.size = ttl, size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # jeton -> (expiration monotonic, Principal)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.invalidations = self.evictions = 0
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None: del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token, principal, token_exp=None):
+        if self.ttl <= 0: return
+        ttl = self.ttl
+        if token_exp is not None: ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0: return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False); self.evictions += 1
+
+    def invalidate(self, user_ids=(), company_ids=()):
+        """Retire les jetons des utilisateurs / entreprises modifiés (écritures rares : parcours complet)."""
+        user_ids, company_ids = set(user_ids), set(company_ids)
+        with self._lock:
+            stale = [t for t, (_, p) in self._entries.items() if p.id in user_ids or p.company_id in company_ids]
+            for token in stale: del self._entries[token]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "max_size": self.size, "ttl_s": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations, "evictions": self.evictions,
+            }
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL, AUTH_CACHE_SIZE)
+
+
+# --- Invalidation (utilisateur / entreprise modifiés ou supprimés) ---
+
+@event.listens_for(Session, "after_flush")
+def _collect_auth_changes(session, flush_context):
+    changed = session.info.setdefault("auth_cache", {"users": set(), "companies": set()})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User) and obj.id is not None: changed["users"].add(obj.id)
+        elif isinstance(obj, models.Company) and obj.id is not None: changed["companies"].add(obj.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    changed = session.info.pop("auth_cache", None)
+    if changed and (changed["users"] or changed["companies"]):
+        principal_cache.invalidate(changed["users"], changed["companies"])
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("auth_cache", None)
@@ -0,0 +1,354 @@
+import os
+import time
+import threading
+from datetime import datetime, date, time as dtime
+from sqlalchemy import event, func, case, select, update, desc
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, contains_eager, load_only
+from sqlalchemy.orm.attributes import get_history
+
+from .. import models
+from ..database import SessionLocal
+
+# ==========================================
+# STATISTIQUES DU TABLEAU DE BORD (Table company_stats)
+# ==========================================
+# Les compteurs par entreprise (chantiers, matériels, rapports, rapports
+# critiques) et la liste des chantiers actifs (carte, retards) sont mis à jour
+# à chaque flush qui touche un chantier, un matériel ou un rapport, dans la même
+# transaction. Un recalcul complet périodique corrige les écarts (suppressions
+# en masse, écritures hors ORM). GET /dashboard/stats lit cette table, via un
+# petit cache mémoire de quelques secondes.
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))                  # secondes
+DASHBOARD_RECONCILE_SECONDS = int(os.getenv("DASHBOARD_RECONCILE_SECONDS", "3600"))  # 0 = pas de recalcul périodique
+URGENCE_CRITIQUE = "Critique"
+COUNTERS = ("nb_chantiers", "nb_materiels", "nb_rapports", "nb_rapports_critiques")
+
+
+# --- Cache mémoire (par processus) ---
+
+class StatsCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # company_id -> (expiration, payload)
+
+    def get(self, company_id):
+        with self._lock:
+            entry = self._entries.get(company_id)
+            if entry is None or entry[0] < time.monotonic(): return None
+            return entry[1]
+
+    def set(self, company_id, payload):
+        if self.ttl <= 0: return
+        with self._lock:
+            self._entries[company_id] = (time.monotonic() + self.ttl, payload)
+
+    def invalidate(self, company_id=None):
+        with self._lock:
+            if company_id is None: self._entries.clear()
+            else: self._entries.pop(company_id, None)
+
+
+stats_cache = StatsCache(DASHBOARD_CACHE_TTL)
+
+
+# --- Recalcul complet ---
+
+def site_entry(chantier):
+    """Chantier actif tel que stocké dans company_stats.sites (clé : id en texte, JSON oblige)."""
+    return {
+        "nom": chantier.nom, "client": chantier.client,
+        "lat": chantier.latitude, "lng": chantier.longitude,
+        "date_fin": chantier.date_fin.isoformat() if chantier.date_fin else None,
+    }
+
+def compute_stats(db, company_id):
+    """Compteurs et chantiers actifs recalculés depuis les tables sources."""
+    C, R = models.Chantier, models.Rapport
+    nb_rapports, nb_critiques = (
+        db.query(func.count(R.id), func.count(case((R.niveau_urgence == URGENCE_CRITIQUE, 1))))
+        .join(C, R.chantier_id == C.id).filter(C.company_id == company_id).one()
+    )
+    actifs = (
+        db.query(C.id, C.nom, C.client, C.latitude, C.longitude, C.date_fin)
+        .filter(C.company_id == company_id, C.est_actif == True).all()
+    )
+    return {
+        "nb_chantiers": db.query(func.count(C.id)).filter(C.company_id == company_id).scalar(),
+        "nb_materiels": db.query(func.count(models.Materiel.id)).filter(models.Materiel.company_id == company_id).scalar(),
+        "nb_rapports": nb_rapports, "nb_rapports_critiques": nb_critiques,
+        "sites": {str(c.id): site_entry(c) for c in actifs},
+    }
+
+def refresh_company_stats(db, company_id):
+    """
+    Recalcule (ou crée) la ligne d'une entreprise. La ligne est verrouillée avant
+    les comptages : les mises à jour incrémentales concurrentes attendent la fin.
+    Retourne (ligne, écart constaté sur les compteurs).
+    """
+    row = db.query(models.CompanyStats).filter(models.CompanyStats.company_id == company_id).with_for_update().first()
+    values = compute_stats(db, company_id)
+    now = datetime.utcnow()
+    if row is None:
+        row = models.CompanyStats(company_id=company_id, **values, updated_at=now, reconciled_at=now)
+        db.add(row)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Créée entre-temps par une autre requête : on relit la sienne
+            db.rollback()
+            return db.query(models.CompanyStats).filter(models.CompanyStats.company_id == company_id).first(), {}
+        return row, {}
+
+    drift = {k: values[k] - (getattr(row, k) or 0) for k in COUNTERS if values[k] != (getattr(row, k) or 0)}
+    for key, value in values.items(): setattr(row, key, value)
+    row.updated_at = row.reconciled_at = now
+    db.commit()
+    return row, drift
+
+def reconcile_all(db):
+    """Recalcul complet de toutes les entreprises. Retourne le nombre de lignes corrigées."""
+    corrected = 0
+    for (company_id,) in db.query(models.Company.id).order_by(models.Company.id).all():
+        _, drift = refresh_company_stats(db, company_id)
+        if drift:
+            corrected += 1
+            print(f"🔧 Stats dashboard entreprise {company_id} corrigées : {drift}")
+        stats_cache.invalidate(company_id)
+    return corrected
+
+
+# --- Lecture (GET /dashboard/stats) ---
+
+def chantier_en_retard(site, now):
+    return bool(site.get("date_fin")) and datetime.combine(date.fromisoformat(site["date_fin"]), dtime()) < now
+
+def get_dashboard_payload(db, company_id):
+    payload = stats_cache.get(company_id)
+    if payload is not None: return payload
+
+    row = db.query(models.CompanyStats).filter(models.CompanyStats.company_id == company_id).first()
+    if row is None:
+        row, _ = refresh_company_stats(db, company_id)  # 1ère ouverture : ligne créée à la volée
+
+    sites = list((row.sites or {}).values())
+    now = datetime.now()
+    chantiers_retard = sum(1 for s in sites if chantier_en_retard(s, now))
+
+    # Carte : On filtre les coordonnées invalides (0.0 ou None)
+    map_data = [
+        {"nom": s["nom"], "client": s["client"], "lat": float(s["lat"]), "lng": float(s["lng"])}
+        for s in sites if s.get("lat") and s.get("lng") and abs(s["lat"]) > 0.1
+    ]
+
+    # Récents (le nom du chantier vient de la jointure : pas de requête par rapport)
+    recents_db = (
+        db.query(models.Rapport).join(models.Rapport.chantier)
+        .options(
+            load_only(models.Rapport.id, models.Rapport.titre, models.Rapport.niveau_urgence, models.Rapport.date_creation, models.Rapport.chantier_id),
+            contains_eager(models.Rapport.chantier).load_only(models.Chantier.nom),
+        )
+        .filter(models.Chantier.company_id == company_id).order_by(desc(models.Rapport.date_creation)).limit(5).all()
+    )
+    recents_formatted = [{
+        "id": r.id,
+        "date": r.date_creation.isoformat() if r.date_creation else None,
+        "titre": getattr(r, "titre", None) or f"Rapport #{r.id}",
+        "niveau_urgence": getattr(r, "niveau_urgence", "Normal"),
+        "chantier_nom": r.chantier.nom if r.chantier else "Inconnu",
+        "chantier_id": r.chantier_id
+    } for r in recents_db]
+
+    name = db.query(models.Company.name).filter(models.Company.id == company_id).scalar() or "N/A"
+    alertes = chantiers_retard + (row.nb_rapports_critiques or 0)
+
+    stats_data = {
+        "nb_chantiers": row.nb_chantiers, "nb_materiels": row.nb_materiels, "nb_rapports": row.nb_rapports,
+        "alertes": alertes,
+        "map": map_data, "recents": recents_formatted, "company_name": name,
+        "nbChantiers": row.nb_chantiers, "nbMateriels": row.nb_materiels, "nbRapports": row.nb_rapports,
+        "nbAlertes": alertes
+    }
+    payload = {**stats_data, "data": stats_data}
+    stats_cache.set(company_id, payload)
+    return payload
+
+
+# ==========================================
+# MISE À JOUR INCRÉMENTALE (après chaque flush SQLAlchemy)
+# ==========================================
+# Chaque ligne suivie "contribue" aux compteurs d'une entreprise ; on retire la
+# contribution d'avant le flush et on ajoute celle d'après. Les rapports ne
+# connaissent que leur chantier : l'entreprise est résolue dans l'UPDATE.
+
+TRACKED_COLUMNS = {
+    models.Materiel: ("company_id",),
+    models.Rapport: ("chantier_id", "niveau_urgence"),
+    models.Chantier: ("company_id", "est_actif", "nom", "client", "latitude", "longitude", "date_fin"),
+}
+
+def column_values(obj, keys, before):
+    """Valeurs des colonnes avant (before=True) ou après ce flush (historique encore disponible)."""
+    values = {}
+    for key in keys:
+        history = get_history(obj, key)
+        if before: current = (history.deleted or history.unchanged or [None])[0]
+        else: current = (history.added or history.unchanged or [None])[0]
+        values[key] = current
+    return values
+
+def contribution(model, values):
+    """[(("company"|"chantier", id), {compteur: valeur})] d'une ligne."""
+    if model is models.Materiel:
+        return [(("company", values["company_id"]), {"nb_materiels": 1})] if values["company_id"] else []
+    if model is models.Rapport:
+        critique = 1 if values["niveau_urgence"] == URGENCE_CRITIQUE else 0
+        return [(("chantier", values["chantier_id"]), {"nb_rapports": 1, "nb_rapports_critiques": critique})] if values["chantier_id"] else []
+    return [(("company", values["company_id"]), {"nb_chantiers": 1})] if values["company_id"] else []
+
+def collect_changes(session):
+    """Écarts de compteurs par cible, chantiers actifs à (re)placer par entreprise, entreprises à recalculer."""
+    deltas, sites, stale = {}, {}, set()
+    for obj, is_new, is_deleted in (
+        [(o, True, False) for o in session.new] + [(o, False, False) for o in session.dirty]
+        + [(o, False, True) for o in session.deleted]
+    ):
+        model = type(obj)
+        if model not in TRACKED_COLUMNS: continue
+        keys = TRACKED_COLUMNS[model]
+        before = None if is_new else column_values(obj, keys, before=True)
+        after = None if is_deleted else column_values(obj, keys, before=False)
+        if before == after: continue
+
+        for values, sign in ((before, -1), (after, 1)):
+            if values is None: continue
+            for target, counters in contribution(model, values):
+                totals = deltas.setdefault(target, dict.fromkeys(COUNTERS, 0))
+                for key, n in counters.items(): totals[key] += sign * n
+
+        if model is models.Chantier:
+            if is_deleted:
+                # Ses rapports sont supprimés en masse par la route (invisibles ici) : recalcul complet
+                if before["company_id"]: stale.add(before["company_id"])
+                continue
+            if before and before["company_id"] and before["company_id"] != after["company_id"]:
+                sites.setdefault(before["company_id"], {})[str(obj.id)] = None
+            if after["company_id"]:
+                sites.setdefault(after["company_id"], {})[str(obj.id)] = site_entry(obj) if after["est_actif"] is True else None
+    return deltas, sites, stale
+
+def apply_changes(session, deltas, sites):
+    """UPDATE des lignes company_stats existantes (une ligne absente sera calculée à la 1ère lecture)."""
+    CS = models.CompanyStats
+    conn = session.connection()
+    returning = conn.dialect.update_returning
+    touched = set()
+    now = datetime.utcnow()
+
+    for (kind, key), totals in deltas.items():
+        totals = {k: n for k, n in totals.items() if n}
+        if not totals: continue
+        stmt = update(CS).values(updated_at=now, **{k: getattr(CS, k) + n for k, n in totals.items()})
+        if kind == "company":
+            stmt = stmt.where(CS.company_id == key)
+            touched.add(key)
+        else:
+            stmt = stmt.where(CS.company_id == select(models.Chantier.company_id).where(models.Chantier.id == key).scalar_subquery())
+        if returning and kind == "chantier":
+            touched.update(company_id for (company_id,) in conn.execute(stmt.returning(CS.company_id)))
+        else:
+            conn.execute(stmt)
+
+    for company_id, changes in sites.items():
+        row = conn.execute(select(CS.sites).where(CS.company_id == company_id).with_for_update()).first()
+        if row is None: continue
+        current = dict(row.sites or {})
+        for site_id, entry in changes.items():
+            if entry is None: current.pop(site_id, None)
+            else: current[site_id] = entry
+        conn.execute(update(CS).where(CS.company_id == company_id).values(sites=current, updated_at=now))
+        touched.add(company_id)
+    return touched
+
+@event.listens_for(Session, "after_flush")
+def _update_stats_after_flush(session, flush_context):
+    try:
+        deltas, sites, stale = collect_changes(session)
+        if not (deltas or sites or stale): return
+        # SAVEPOINT : un UPDATE en échec n'annule que lui (sous PostgreSQL, une erreur
+        # hors savepoint rendrait toute la transaction métier inutilisable)
+        with session.connection().begin_nested():
+            touched = apply_changes(session, deltas, sites)
+    except Exception as e:
+        # L'écriture métier passe quand même : le recalcul périodique corrigera l'écart
+        print(f"⚠️ Mise à jour stats dashboard : {e}")
+        return
+    info = session.info.setdefault("dashboard_stats", {"touched": set(), "stale": set()})
+    info["touched"] |= touched
+    info["stale"] |= stale
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    info = session.info.pop("dashboard_stats", None)
+    if not info: return
+    for company_id in info["touched"] | info["stale"]: stats_cache.invalidate(company_id)
+    if not info["stale"]: return
+    # La transaction est terminée : recalcul dans une session à part
+    db = Session(bind=session.get_bind(), info={"route_class": "background"})
+    try:
+        for company_id in info["stale"]:
+            if db.query(models.CompanyStats.company_id).filter(models.CompanyStats.company_id == company_id).first():
+                refresh_company_stats(db, company_id)
+    except Exception as e:
+        print(f"⚠️ Recalcul stats dashboard : {e}")
+    finally:
+        db.close()
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop("dashboard_stats", None)
+
+
+# ==========================================
+# RECALCUL PÉRIODIQUE
+# ==========================================
+
+_stop = threading.Event()
+_thread = None
+
+def start_reconciler(session_factory=SessionLocal):
+    """Recalcul complet toutes les DASHBOARD_RECONCILE_SECONDS (0 = désactivé)."""
+    global _thread
+    if DASHBOARD_RECONCILE_SECONDS <= 0 or _thread is not None: return None
+
+    def loop():
+        while not _stop.wait(DASHBOARD_RECONCILE_SECONDS):
+            db = session_factory(info={"route_class": "background"})
+            try:
+                print(f"📊 Stats dashboard recalculées ({reconcile_all(db)} corrigées)")
+            except Exception as e:
+                print(f"❌ Recalcul stats dashboard : {e}")
+            finally:
+                db.close()
+
+    _stop.clear()
+    _thread = threading.Thread(target=loop, name="dashboard-stats-reconcile", daemon=True)
+    _thread.start()
+    return _thread
+
+def stop_reconciler():
+    global _thread
+    _stop.set()
+    if _thread: _thread.join(timeout=5)
+    _thread = None
+
+
+if __name__ == "__main__":
+    # Recalcul manuel : python -m backend.services.dashboard_stats
+    session = SessionLocal(info={"route_class": "background"})
+    try:
+        print(f"📊 {reconcile_all(session)} entreprise(s) corrigée(s)")
+    finally:
+        session.close()
@@ -0,0 +1,115 @@
+import time
+import threading
+from bisect import bisect_left
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+# ==========================================
+# TÉLÉMÉTRIE DU POOL DE CONNEXIONS SQL
+# ==========================================
+# Emprunts en cours, attente pour obtenir une connexion (histogramme),
+# usage du débordement (max_overflow), connexions invalidées (pre-ping,
+# recyclage). Exposé par GET /internal/metrics/db.
+
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engine = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.wait_histogram = [0] * (len(WAIT_BUCKETS_MS) + 1)  # Dernier seau : au-delà
+            self.wait_total_s = 0.0
+            self.wait_max_s = 0.0
+            self.checkouts = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.peak_checked_out = 0
+            self.peak_overflow = 0
+
+    def observe_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_histogram[bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            if timed_out: self.timeouts += 1
+
+    def on_checkout(self, pool):
+        with self._lock:
+            self.checkouts += 1
+            if not isinstance(pool, QueuePool): return
+            self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+            self.peak_overflow = max(self.peak_overflow, pool.overflow())
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        pool = self.engine.pool if self.engine is not None else None  # engine.dispose() recrée le pool
+        with self._lock:
+            waits = sum(self.wait_histogram)
+            labels = [f"<={ms}ms" for ms in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "pool": pool.__class__.__name__ if pool else None,
+                "size": pool.size() if isinstance(pool, QueuePool) else None,
+                "max_overflow": getattr(pool, "_max_overflow", None),
+                "checked_out": pool.checkedout() if isinstance(pool, QueuePool) else None,
+                "checked_in": pool.checkedin() if isinstance(pool, QueuePool) else None,
+                "overflow": max(pool.overflow(), 0) if isinstance(pool, QueuePool) else None,
+                "peak_checked_out": self.peak_checked_out,
+                "peak_overflow": max(self.peak_overflow, 0),
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "count": waits,
+                    "avg": round(self.wait_total_s * 1000 / waits, 3) if waits else 0.0,
+                    "max": round(self.wait_max_s * 1000, 3),
+                    "histogram": dict(zip(labels, self.wait_histogram)),
+                },
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'obtention d'une connexion (attente + ouverture éventuelle)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+def instrument_engine(engine):
+    """Branche les événements du pool de `engine` sur pool_metrics."""
+    pool_metrics.engine = engine
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_metrics.on_checkout(engine.pool)
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        pool_metrics.count("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        # Connexion morte détectée (pre-ping, erreur réseau) : remplacée au prochain emprunt
+        pool_metrics.count("invalidations")
+
+    return engine
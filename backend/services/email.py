@@ -1,45 +1,106 @@
 import os
-import requests
 import base64
+import threading
+import requests
+from typing import NamedTuple, Optional
+from requests.adapters import HTTPAdapter
 
-def send_email_via_brevo(to_email: str, subject: str, html_content: str, pdf_attachment=None, pdf_filename="document.pdf"):
-    """
-    Service d'envoi d'email via Brevo API.
-    """
+# ==========================================
+# ENVOI D'EMAILS (API Brevo)
+# ==========================================
+# Une seule session HTTP keep-alive par processus (connexions TLS réutilisées),
+# toujours avec un timeout. Les envois applicatifs passent par la file
+# email_outbox (services/email_outbox.py), qui gère retries et débit.
+
+BREVO_API_URL = os.getenv("BREVO_API_URL", "https://api.brevo.com/v3/smtp/email")  # Surchargeable (serveur de test local)
+EMAIL_HTTP_TIMEOUT = (float(os.getenv("EMAIL_CONNECT_TIMEOUT", "5")), float(os.getenv("EMAIL_READ_TIMEOUT", "30")))
+EMAIL_HTTP_POOL_SIZE = int(os.getenv("EMAIL_HTTP_POOL_SIZE", "4"))
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=EMAIL_HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+class DeliveryResult(NamedTuple):
+    ok: bool
+    http_status: Optional[int] = None
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    retryable: bool = False               # Erreur passagère (réseau, 429, 5xx) : on réessaiera
+    retry_after: Optional[float] = None   # Délai imposé par le fournisseur (secondes)
+
+
+def encode_attachment(content):
+    """Octets (ou buffer) -> base64 attendu par Brevo."""
+    content = content.getvalue() if hasattr(content, "getvalue") else content
+    return base64.b64encode(content).decode("utf-8")
+
+
+def deliver_brevo(to_email: str, subject: str, html_content: str, attachment_b64=None, attachment_name="document.pdf"):
+    """Un envoi via l'API Brevo. Ne lève pas d'exception : tout est décrit dans le DeliveryResult."""
     api_key = os.getenv("BREVO_API_KEY")
     sender_email = os.getenv("SENDER_EMAIL", "contact@conformeo-app.fr")
     sender_name = os.getenv("SENDER_NAME", "Conforméo")
 
     if not api_key:
-        print("❌ SERVICE EMAIL: Clé API manquante")
-        return False
+        return DeliveryResult(False, error="Clé API Brevo manquante (BREVO_API_KEY)")
 
-    url = "https://api.brevo.com/v3/smtp/email"
     headers = {"accept": "application/json", "api-key": api_key, "content-type": "application/json"}
-    
     payload = {
         "sender": {"name": sender_name, "email": sender_email},
         "to": [{"email": to_email}],
         "subject": subject,
         "htmlContent": html_content
     }
+    if attachment_b64:
+        payload["attachment"] = [{"content": attachment_b64, "name": attachment_name}]
+
+    try:
+        response = get_session().post(BREVO_API_URL, json=payload, headers=headers, timeout=EMAIL_HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        return DeliveryResult(False, error=f"Réseau : {e}", retryable=True)
+
+    if response.status_code in (200, 201, 202):
+        try: message_id = response.json().get("messageId")
+        except ValueError: message_id = None
+        return DeliveryResult(True, response.status_code, message_id)
+
+    retry_after = response.headers.get("Retry-After")
+    return DeliveryResult(
+        False, response.status_code, error=f"Brevo {response.status_code} : {response.text[:500]}",
+        retryable=response.status_code == 429 or response.status_code >= 500,
+        retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+    )
+
 
+# Fournisseur -> fonction d'envoi (utilisé par la file d'envoi)
+PROVIDERS = {"brevo": deliver_brevo}
+
+
+def send_email_via_brevo(to_email: str, subject: str, html_content: str, pdf_attachment=None, pdf_filename="document.pdf"):
+    """
+    Envoi immédiat (synchrone) via Brevo. Préférer email_outbox.enqueue_emails
+    dans les routes : la requête HTTP n'attend pas le fournisseur.
+    """
+    encoded = None
     if pdf_attachment:
         try:
-            # Gestion buffer vs bytes
-            content = pdf_attachment.getvalue() if hasattr(pdf_attachment, "getvalue") else pdf_attachment
-            encoded = base64.b64encode(content).decode("utf-8")
-            payload["attachment"] = [{"content": encoded, "name": pdf_filename}]
+            encoded = encode_attachment(pdf_attachment)
         except Exception as e:
             print(f"⚠️ Erreur encodage PDF: {e}")
 
-    try:
-        response = requests.post(url, json=payload, headers=headers)
-        if response.status_code in [200, 201, 202]:
-            print(f"✅ Email envoyé à {to_email}")
-            return True
-        print(f"❌ Erreur Brevo: {response.text}")
-        return False
-    except Exception as e:
-        print(f"❌ Exception Python Email: {e}")
-        return False
\ No newline at end of file
+    result = deliver_brevo(to_email, subject, html_content, encoded, pdf_filename)
+    if result.ok:
+        print(f"✅ Email envoyé à {to_email}")
+    else:
+        print(f"❌ SERVICE EMAIL: {result.error}")
+    return result.ok
@@ -0,0 +1,345 @@
+import os
+import time
+import uuid
+import socket
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from .. import models
+from ..database import SessionLocal
+from . import pdf_executor
+from .email import PROVIDERS, DeliveryResult, encode_attachment
+from .pdf_documents import DOCUMENT_BUILDERS, get_pdf_bytes
+
+# ==========================================
+# FILE D'ENVOI DES EMAILS (Table email_outbox)
+# ==========================================
+# La route enregistre un message par destinataire et répond 202. Un thread
+# expéditeur réserve les messages (SELECT ... FOR UPDATE SKIP LOCKED, comme
+# les jobs PDF), rend la pièce jointe une seule fois pour tout l'envoi, puis
+# livre via une session HTTP keep-alive, au débit autorisé par le fournisseur.
+
+EMAIL_OUTBOX_EMBEDDED = os.getenv("EMAIL_OUTBOX_EMBEDDED", "1") == "1"   # Expéditeur lancé avec l'API
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = int(os.getenv("EMAIL_RETRY_BASE_DELAY", "30"))    # secondes (x2 à chaque tentative)
+EMAIL_RETRY_MAX_DELAY = int(os.getenv("EMAIL_RETRY_MAX_DELAY", "3600"))
+EMAIL_STALE_SECONDS = int(os.getenv("EMAIL_STALE_SECONDS", "300"))          # message SENDING sans nouvelles
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+# Débit maximal par fournisseur (emails / seconde, 0 = illimité)
+EMAIL_PROVIDER_RATES = {"brevo": float(os.getenv("BREVO_MAX_PER_SECOND", "5"))}
+POLL_INTERVAL = 2.0
+
+STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_FAILED = "PENDING", "SENDING", "SENT", "FAILED"
+
+
+# --- API (côté requêtes HTTP) ---
+
+def enqueue_emails(db, recipients, subject, html, attachment=None, company_id=None, chantier_id=None, provider="brevo"):
+    """
+    Un message par destinataire (doublons ignorés). `attachment` : (doc_type, entity_id, nom
+    du fichier), rendu plus tard par l'expéditeur et partagé par tous les messages.
+    """
+    if provider not in PROVIDERS:
+        raise ValueError(f"Fournisseur email inconnu : {provider}")
+    if attachment and attachment[0] not in DOCUMENT_BUILDERS:
+        raise ValueError(f"Type de document inconnu : {attachment[0]}")
+
+    attachment_row = None
+    if attachment:
+        doc_type, entity_id, filename = attachment
+        attachment_row = models.EmailAttachment(doc_type=doc_type, entity_id=entity_id, filename=filename)
+        db.add(attachment_row); db.flush()
+
+    now = datetime.utcnow()
+    emails = []
+    for to_email in dict.fromkeys(r.strip() for r in recipients if r and r.strip()):
+        emails.append(models.OutboxEmail(
+            id=str(uuid.uuid4()), to_email=to_email, subject=subject, html=html,
+            attachment_id=attachment_row.id if attachment_row else None, provider=provider,
+            status=STATUS_PENDING, max_attempts=EMAIL_MAX_ATTEMPTS, created_at=now, run_after=now,
+            company_id=company_id, chantier_id=chantier_id
+        ))
+    db.add_all(emails); db.commit()
+    for email in emails: db.refresh(email)
+    if sender is not None: sender.wake()
+    return emails
+
+
+# --- Réservation / cycle de vie (côté expéditeur) ---
+
+def claim_emails(db, worker_id, limit=EMAIL_BATCH_SIZE):
+    """Réserve les prochains messages prêts (ids). Verrou ligne non bloquant entre instances."""
+    now = datetime.utcnow()
+    emails = (
+        db.query(models.OutboxEmail)
+        .filter(models.OutboxEmail.status == STATUS_PENDING, models.OutboxEmail.run_after <= now)
+        .order_by(models.OutboxEmail.created_at)
+        .with_for_update(skip_locked=True)
+        .limit(limit)
+        .all()
+    )
+    for email in emails:
+        email.status = STATUS_SENDING
+        email.attempts = (email.attempts or 0) + 1
+        email.locked_by = worker_id
+        email.locked_at = now
+    ids = [e.id for e in emails]
+    db.commit()
+    return ids
+
+def touch_email(db, email_id, worker_id):
+    """
+    Rafraîchit locked_at juste avant la livraison : un long lot n'est pas remis
+    en file sous nos pieds. False si le message a déjà été repris ailleurs.
+    """
+    count = (
+        db.query(models.OutboxEmail)
+        .filter(models.OutboxEmail.id == email_id, models.OutboxEmail.status == STATUS_SENDING,
+                models.OutboxEmail.locked_by == worker_id)
+        .update({"locked_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return count == 1
+
+def requeue_stale_emails(db):
+    """Messages SENDING dont l'expéditeur a disparu : remis en file (livraison "au moins une fois")."""
+    limit = datetime.utcnow() - timedelta(seconds=EMAIL_STALE_SECONDS)
+    count = (
+        db.query(models.OutboxEmail)
+        .filter(models.OutboxEmail.status == STATUS_SENDING, models.OutboxEmail.locked_at < limit)
+        .update({"status": STATUS_PENDING, "locked_by": None}, synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+def retry_delay(attempts, retry_after=None):
+    delay = min(EMAIL_RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), EMAIL_RETRY_MAX_DELAY)
+    return max(delay, retry_after or 0)
+
+def record_result(db, email, result):
+    """Succès -> SENT ; échec passager -> PENDING différé (backoff) ; sinon FAILED."""
+    email.http_status = result.http_status
+    email.locked_by = None
+    if result.ok:
+        email.status = STATUS_SENT
+        email.provider_message_id = result.message_id
+        email.error = None
+        email.sent_at = datetime.utcnow()
+    elif result.retryable and email.attempts < email.max_attempts:
+        email.status = STATUS_PENDING
+        email.error = result.error
+        email.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(email.attempts, result.retry_after))
+    else:
+        email.status = STATUS_FAILED
+        email.error = result.error
+    db.commit()
+
+
+class RateLimiter:
+    """Seau à jetons : au plus `rate` envois par seconde (petite rafale autorisée)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0: return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# --- Expéditeur ---
+
+class AttachmentError(Exception):
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class EmailSender:
+    def __init__(self, session_factory=SessionLocal):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.session_factory = session_factory
+        self.limiters = {name: RateLimiter(rate) for name, rate in EMAIL_PROVIDER_RATES.items()}
+        self._encoded = OrderedDict()  # id pièce jointe -> base64 (quelques envois récents)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        """Nouveau message en file : pas besoin d'attendre le prochain tour."""
+        self._wake.set()
+
+    def attachment_b64(self, db, attachment_id):
+        """Pièce jointe encodée : rendue et stockée une seule fois pour tous les destinataires."""
+        if attachment_id in self._encoded:
+            self._encoded.move_to_end(attachment_id)
+            return self._encoded[attachment_id]
+
+        content, filename = self._attachment_content(db, attachment_id)
+        self._encoded[attachment_id] = encoded = (encode_attachment(content), filename or "document.pdf")
+        while len(self._encoded) > 4: self._encoded.popitem(last=False)
+        return encoded
+
+    def _attachment_content(self, db, attachment_id):
+        """
+        Le rendu se fait hors transaction : l'expéditeur pose d'abord un marqueur
+        (rendering_by / rendering_at) et valide. Une autre instance qui voit le
+        marqueur relit la ligne jusqu'à ce que le contenu arrive (ou que le
+        marqueur expire, si le rendu a été abandonné).
+        """
+        Attachment = models.EmailAttachment
+        # Attente bornée par un rendu (le bail du message, EMAIL_STALE_SECONDS, n'expire pas entre-temps)
+        deadline = time.monotonic() + pdf_executor.PDF_RENDER_TIMEOUT + 10
+        while True:
+            row = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+            if row is None: raise AttachmentError("Pièce jointe introuvable", permanent=True)
+            if row.content is not None:
+                content, filename = row.content, row.filename
+                db.commit()
+                return content, filename
+
+            now = datetime.utcnow()
+            stale = now - timedelta(seconds=pdf_executor.PDF_RENDER_TIMEOUT * 2)
+            claimed = (
+                db.query(Attachment)
+                .filter(Attachment.id == attachment_id, Attachment.content.is_(None),
+                        (Attachment.rendering_at.is_(None)) | (Attachment.rendering_at < stale))
+                .update({"rendering_by": self.worker_id, "rendering_at": now}, synchronize_session=False)
+            )
+            db.commit()
+            if claimed: break
+            if time.monotonic() > deadline:
+                raise AttachmentError("Pièce jointe en cours de rendu par un autre expéditeur")
+            db.expire_all()
+            time.sleep(1)
+
+        try:
+            doc = DOCUMENT_BUILDERS[row.doc_type](db, row.entity_id)
+            if doc is None:
+                raise AttachmentError(f"{row.doc_type} #{row.entity_id} introuvable", permanent=True)
+            filename = row.filename or doc.filename
+            db.commit()  # Aucune transaction ouverte pendant le rendu
+            # Rendu dans le pool de processus (ce thread partage le GIL avec l'API)
+            content = get_pdf_bytes(doc, executor=pdf_executor.get_executor())
+        except Exception:
+            db.rollback()
+            db.query(Attachment).filter(Attachment.id == attachment_id, Attachment.rendering_by == self.worker_id) \
+                .update({"rendering_by": None, "rendering_at": None}, synchronize_session=False)
+            db.commit()
+            raise
+
+        db.query(Attachment).filter(Attachment.id == attachment_id).update(
+            {"content": content, "size": len(content), "filename": filename, "rendering_by": None, "rendering_at": None},
+            synchronize_session=False
+        )
+        db.commit()
+        return content, filename
+
+    def deliver(self, db, email_id):
+        email = db.query(models.OutboxEmail).filter(models.OutboxEmail.id == email_id).first()
+        if email is None: return
+        try:
+            encoded, name = self.attachment_b64(db, email.attachment_id) if email.attachment_id else (None, None)
+        except Exception as e:
+            db.rollback()
+            permanent = isinstance(e, AttachmentError) and e.permanent
+            print(f"❌ Email {email_id} : pièce jointe : {e}")
+            return record_result(db, email, DeliveryResult(False, error=f"Pièce jointe : {e}", retryable=not permanent))
+
+        limiter = self.limiters.get(email.provider)
+        if limiter: limiter.acquire()
+        result = PROVIDERS[email.provider](email.to_email, email.subject, email.html, encoded, name or "document.pdf")
+        if result.ok: print(f"✅ Email envoyé à {email.to_email}")
+        else: print(f"❌ Email {email.to_email} (tentative {email.attempts}) : {result.error}")
+        record_result(db, email, result)
+
+    def run_once(self):
+        """Traite un lot. Retourne le nombre de messages réservés."""
+        db = self.session_factory()
+        try:
+            ids = claim_emails(db, self.worker_id)
+            for email_id in ids:
+                if self._stop.is_set(): break
+                try:
+                    if not touch_email(db, email_id, self.worker_id):
+                        continue  # Remis en file puis repris par un autre expéditeur
+                    self.deliver(db, email_id)
+                except Exception as e:
+                    db.rollback()
+                    print(f"⚠️ Expéditeur email : {email_id} : {e}")
+            return len(ids)
+        finally:
+            db.close()
+
+    def _maintenance(self):
+        db = self.session_factory()
+        try:
+            requeue_stale_emails(db)
+        except Exception as e:
+            print(f"⚠️ Maintenance file email : {e}")
+        finally:
+            db.close()
+
+    def run(self):
+        last_maintenance = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_maintenance > 60:
+                self._maintenance()
+                last_maintenance = time.monotonic()
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Expéditeur email : {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="email-sender", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread: self._thread.join(timeout=5)
+
+
+sender = None
+
+def start_embedded_sender():
+    """Démarre l'expéditeur dans le processus de l'API (si EMAIL_OUTBOX_EMBEDDED=1)."""
+    global sender
+    if EMAIL_OUTBOX_EMBEDDED and sender is None:
+        sender = EmailSender().start()
+    return sender
+
+def stop_embedded_sender():
+    global sender
+    if sender is not None:
+        sender.stop()
+        sender = None
+
+
+if __name__ == "__main__":
+    # Expéditeur autonome : python -m backend.services.email_outbox
+    print("📧 Expéditeur email démarré")
+    worker = EmailSender()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from typing import NamedTuple, Optional
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from .sync_log import dialect_insert
+
+# ==========================================
+# 🌍 GÉOCODAGE DES CHANTIERS (Cache + file en arrière-plan)
+# ==========================================
+# La route ne contacte plus Nominatim : l'adresse normalisée est cherchée dans
+# geocode_cache (une lecture par clé primaire). Trouvée -> coordonnées tout de
+# suite ; sinon le chantier part avec geocode_status = "pending" et un thread
+# (comme l'expéditeur email) le complète après le commit.
+# Nominatim impose 1 requête / seconde : chaque appel réserve d'abord son
+# créneau dans rate_limit_slots (ligne verrouillée), partagé par tous les
+# processus et toutes les instances de l'API.
+
+GEOCODE_WORKER_EMBEDDED = os.getenv("GEOCODE_WORKER_EMBEDDED", "1") == "1"   # Thread lancé avec l'API
+GEOCODE_MIN_INTERVAL = float(os.getenv("GEOCODE_MIN_INTERVAL", "1.0"))         # secondes entre deux appels (tous processus)
+GEOCODE_MAX_ATTEMPTS = int(os.getenv("GEOCODE_MAX_ATTEMPTS", "5"))
+GEOCODE_RETRY_BASE_DELAY = int(os.getenv("GEOCODE_RETRY_BASE_DELAY", "60"))    # secondes (x2 à chaque tentative)
+GEOCODE_NOT_FOUND_DAYS = int(os.getenv("GEOCODE_NOT_FOUND_DAYS", "30"))        # Adresse introuvable : réessayée après
+GEOCODE_STALE_SECONDS = int(os.getenv("GEOCODE_STALE_SECONDS", "300"))         # Réservation sans nouvelles
+GEOCODE_BATCH_SIZE = int(os.getenv("GEOCODE_BATCH_SIZE", "10"))
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "ConformeoApp/1.0")
+POLL_INTERVAL = 5.0
+
+STATUS_PENDING, STATUS_RUNNING, STATUS_NOT_FOUND, STATUS_FAILED = "pending", "running", "not_found", "failed"
+
+
+def normalize_address(address):
+    """Clé de cache : "12, Rue de l'Église  PARIS" -> "12 rue de l eglise paris"."""
+    if not address: return None
+    text = unicodedata.normalize("NFKD", address)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r"[\W_]+", " ", text).strip()
+    return text if len(text) >= 3 else None
+
+
+class GeocodeResult(NamedTuple):
+    found: bool
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    retryable: bool = False       # Erreur réseau / 429 / 5xx : à retenter plus tard
+    error: Optional[str] = None
+
+
+# --- Cache ---
+
+def cached_result(db, key):
+    """Résultat connu pour cette adresse (None si absent ou "introuvable" trop ancien)."""
+    row = db.query(models.GeocodeCache).filter(models.GeocodeCache.address_key == key).first()
+    if row is None: return None
+    if row.latitude is None:
+        if row.checked_at < datetime.utcnow() - timedelta(days=GEOCODE_NOT_FOUND_DAYS): return None
+        return GeocodeResult(False)
+    return GeocodeResult(True, row.latitude, row.longitude)
+
+def store_result(db, key, address, result):
+    table = models.GeocodeCache.__table__
+    values = {"latitude": result.latitude, "longitude": result.longitude, "checked_at": datetime.utcnow()}
+    stmt = dialect_insert(db.connection(), table).values(address_key=key, query=address, provider="nominatim", **values)
+    db.execute(stmt.on_conflict_do_update(index_elements=["address_key"], set_=values))
+    db.commit()
+
+
+# --- Côté requêtes HTTP ---
+
+def request_geocode(db, chantier):
+    """
+    Coordonnées de chantier.adresse depuis le cache, sinon chantier mis en file
+    (geocode_status = "pending") : la route n'attend jamais Nominatim.
+    """
+    key = normalize_address(chantier.adresse)
+    if key is None:
+        chantier.geocode_status = None
+        return
+    cached = cached_result(db, key)
+    if cached is not None:
+        if cached.found: chantier.latitude, chantier.longitude = cached.latitude, cached.longitude
+        chantier.geocode_status = None if cached.found else STATUS_NOT_FOUND
+        return
+    chantier.geocode_status = STATUS_PENDING
+    chantier.geocode_attempts = 0
+    chantier.geocode_after = datetime.utcnow()
+    db.info["geocode_wake"] = True
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("geocode_wake", None) and worker is not None: worker.wake()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("geocode_wake", None)
+
+
+# --- Limite de débit globale (tous processus) ---
+
+def reserve_slot(db, name="nominatim", interval=GEOCODE_MIN_INTERVAL):
+    """Réserve le prochain créneau d'appel ; retourne l'attente (secondes) avant de l'utiliser."""
+    now = datetime.utcnow()
+    table = models.RateLimitSlot.__table__
+    db.execute(dialect_insert(db.connection(), table).values(name=name, next_at=now).on_conflict_do_nothing(index_elements=["name"]))
+    slot_row = db.query(models.RateLimitSlot).filter(models.RateLimitSlot.name == name).with_for_update().one()
+    slot = max(now, slot_row.next_at)
+    slot_row.next_at = slot + timedelta(seconds=interval)
+    db.commit()
+    return (slot - now).total_seconds()
+
+def nominatim_lookup(address, http=requests):
+    try:
+        res = http.get(
+            NOMINATIM_URL, params={"q": address, "format": "json", "limit": 1, "countrycodes": "fr"},
+            headers={"User-Agent": NOMINATIM_USER_AGENT}, timeout=4,
+        )
+    except requests.RequestException as e:
+        return GeocodeResult(False, retryable=True, error=str(e))
+    if res.status_code == 429 or res.status_code >= 500:
+        return GeocodeResult(False, retryable=True, error=f"HTTP {res.status_code}")
+    if res.status_code != 200:
+        return GeocodeResult(False, error=f"HTTP {res.status_code}")
+    data = res.json()
+    if not data: return GeocodeResult(False)
+    return GeocodeResult(True, float(data[0]["lat"]), float(data[0]["lon"]))
+
+
+# --- File (côté thread de géocodage) ---
+
+def claim_chantiers(db, limit=GEOCODE_BATCH_SIZE):
+    """Réserve les chantiers en attente : [(id, adresse)]. Verrou ligne non bloquant entre instances."""
+    now = datetime.utcnow()
+    chantiers = (
+        db.query(models.Chantier)
+        .filter(models.Chantier.geocode_status == STATUS_PENDING, models.Chantier.geocode_after <= now)
+        .order_by(models.Chantier.geocode_after)
+        .with_for_update(skip_locked=True)
+        .limit(limit)
+        .all()
+    )
+    claimed = []
+    for c in chantiers:
+        c.geocode_status = STATUS_RUNNING
+        c.geocode_attempts = (c.geocode_attempts or 0) + 1
+        c.geocode_after = now + timedelta(seconds=GEOCODE_STALE_SECONDS)
+        claimed.append((c.id, c.adresse))
+    db.commit()
+    return claimed
+
+def requeue_stale(db):
+    """Chantiers "running" dont le thread a disparu : remis en file."""
+    count = (
+        db.query(models.Chantier)
+        .filter(models.Chantier.geocode_status == STATUS_RUNNING, models.Chantier.geocode_after < datetime.utcnow())
+        .update({"geocode_status": STATUS_PENDING}, synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+def apply_result(db, chantier_id, address, result):
+    """Coordonnées écrites via l'ORM (journal de synchro, stats, cache PDF suivent)."""
+    chantier = db.query(models.Chantier).filter(models.Chantier.id == chantier_id).first()
+    # Adresse modifiée entre-temps : la nouvelle demande (pending) sera traitée à son tour
+    if chantier is None or chantier.adresse != address or chantier.geocode_status != STATUS_RUNNING:
+        db.rollback(); return
+    if result.found:
+        chantier.latitude, chantier.longitude = result.latitude, result.longitude
+        chantier.geocode_status = None
+    elif result.retryable and (chantier.geocode_attempts or 0) < GEOCODE_MAX_ATTEMPTS:
+        chantier.geocode_status = STATUS_PENDING
+        chantier.geocode_after = datetime.utcnow() + timedelta(seconds=GEOCODE_RETRY_BASE_DELAY * 2 ** (chantier.geocode_attempts - 1))
+    else:
+        chantier.geocode_status = STATUS_FAILED if result.error else STATUS_NOT_FOUND
+    db.commit()
+
+
+class GeocodeWorker:
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.http = requests.Session()  # Keep-alive vers Nominatim
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        """Nouveau chantier en file : pas besoin d'attendre le prochain tour."""
+        self._wake.set()
+
+    def geocode(self, db, address):
+        key = normalize_address(address)
+        if key is None: return GeocodeResult(False)
+        # Même adresse déjà résolue (autre chantier, autre processus) : pas d'appel
+        result = cached_result(db, key)
+        if result is not None: return result
+        wait = reserve_slot(db)
+        if wait > 0 and self._stop.wait(wait): return GeocodeResult(False, retryable=True, error="Arrêt")
+        result = nominatim_lookup(address, self.http)
+        if result.error: print(f"⚠️ Géocodage '{address}' : {result.error}")
+        else: store_result(db, key, address, result)
+        return result
+
+    def run_once(self):
+        """Traite un lot. Retourne le nombre de chantiers réservés."""
+        db = self.session_factory(info={"route_class": "background"})
+        try:
+            claimed = claim_chantiers(db)
+            for chantier_id, address in claimed:
+                if self._stop.is_set(): break
+                try:
+                    apply_result(db, chantier_id, address, self.geocode(db, address))
+                except Exception as e:
+                    db.rollback()
+                    print(f"⚠️ Géocodage chantier {chantier_id} : {e}")
+            return len(claimed)
+        finally:
+            db.close()
+
+    def _maintenance(self):
+        db = self.session_factory(info={"route_class": "background"})
+        try:
+            requeue_stale(db)
+        except Exception as e:
+            print(f"⚠️ Maintenance file géocodage : {e}")
+        finally:
+            db.close()
+
+    def run(self):
+        last_maintenance = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_maintenance > 60:
+                self._maintenance()
+                last_maintenance = time.monotonic()
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Géocodage : {e}")
+                claimed = 0
+            if not claimed:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="geocode-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread: self._thread.join(timeout=5)
+
+
+worker = None
+
+def start_embedded_worker():
+    """Démarre le géocodage dans le processus de l'API (si GEOCODE_WORKER_EMBEDDED=1)."""
+    global worker
+    if GEOCODE_WORKER_EMBEDDED and worker is None:
+        worker = GeocodeWorker().start()
+    return worker
+
+def stop_embedded_worker():
+    global worker
+    if worker is not None:
+        worker.stop()
+        worker = None
+
+
+if __name__ == "__main__":
+    # Géocodage autonome : python -m backend.services.geocoding
+    print("🌍 Géocodage des chantiers démarré")
+    standalone = GeocodeWorker()
+    try:
+        standalone.run()
+    except KeyboardInterrupt:
+        standalone.stop()
@@ -0,0 +1,193 @@
+import os
+import time
+import asyncio
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from jose import JWTError, jwt
+from sqlalchemy import select, delete, update
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from .. import models
+from ..database import engine
+from ..dependencies import SECRET_KEY, ALGORITHM
+from .sync_log import dialect_insert
+
+# ==========================================
+# 🔁 CLÉS D'IDEMPOTENCE (En-tête Idempotency-Key)
+# ==========================================
+# Un POST rejoué par le mobile (réseau coupé avant la réponse) porte la même
+# clé : la 1ère exécution mémorise sa réponse, les suivantes la reçoivent telle
+# quelle (en-tête Idempotent-Replayed) sans recréer la ligne.
+# Doublons simultanés : la clé est enregistrée "en cours" (transaction courte,
+# validée tout de suite) et le doublon relit la ligne jusqu'à ce qu'elle soit
+# complétée. Aucune connexion n'est gardée pendant l'exécution de la route.
+# Réponses 5xx non mémorisées : la requête pourra être retentée.
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))    # Fenêtre de rejeu
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))  # Attente max d'un doublon
+IDEMPOTENCY_STALE_SECONDS = int(os.getenv("IDEMPOTENCY_STALE_SECONDS", "600"))   # Clé "en cours" abandonnée (arrêt du serveur)
+IDEMPOTENCY_PURGE_SECONDS = int(os.getenv("IDEMPOTENCY_PURGE_SECONDS", "3600"))
+IDEMPOTENCY_MAX_KEY = 1024
+
+TABLE = models.IdempotencyKey.__table__
+
+
+def request_owner(authorization):
+    """Utilisateur du jeton Bearer (None si absent ou invalide : la route répondra 401)."""
+    if not authorization or not authorization.lower().startswith("bearer "): return None
+    try:
+        return jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+def sha256(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Claim:
+    """Clé réservée par cette requête : complete() mémorise la réponse, release() libère la clé."""
+
+    def __init__(self, owner, key_hash, created_at):
+        # created_at : si la clé a été abandonnée puis reprise, on ne touche pas à la nouvelle
+        self.where = (TABLE.c.owner == owner, TABLE.c.key_hash == key_hash, TABLE.c.created_at == created_at)
+
+    def complete(self, status_code, content_type, body):
+        with engine.begin() as conn:
+            conn.execute(update(TABLE).where(*self.where).values(status_code=status_code, content_type=content_type, body=body))
+
+    def release(self):
+        with engine.begin() as conn:
+            conn.execute(delete(TABLE).where(*self.where))
+
+
+def claim_key(owner, key_hash, fingerprint):
+    """Réserve la clé -> (Claim, None), ou (None, ligne existante) si elle est déjà prise."""
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        stmt = dialect_insert(conn, TABLE).values(
+            owner=owner, key_hash=key_hash, fingerprint=fingerprint,
+            created_at=now, expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS),
+        ).on_conflict_do_nothing(index_elements=["owner", "key_hash"])
+        if conn.execute(stmt).rowcount == 1:
+            return Claim(owner, key_hash, now), None
+        return None, conn.execute(select(TABLE).where(TABLE.c.owner == owner, TABLE.c.key_hash == key_hash)).first()
+
+def drop_row(row):
+    """Supprime une clé expirée ou abandonnée (seulement si elle n'a pas été reprise entre-temps)."""
+    with engine.begin() as conn:
+        conn.execute(delete(TABLE).where(
+            TABLE.c.owner == row.owner, TABLE.c.key_hash == row.key_hash, TABLE.c.created_at == row.created_at,
+        ))
+
+def purge_expired():
+    with engine.begin() as conn:
+        return conn.execute(delete(TABLE).where(TABLE.c.expires_at < datetime.utcnow())).rowcount
+
+_stop = threading.Event()
+_thread = None
+
+def start_purger(interval=IDEMPOTENCY_PURGE_SECONDS):
+    """Purge au démarrage puis toutes les `interval` secondes (un seul thread par processus)."""
+    global _thread
+    if _thread is not None: return None
+
+    def loop():
+        while not _stop.is_set():
+            try:
+                count = purge_expired()
+                if count: print(f"🧹 Idempotence : {count} clés expirées purgées")
+            except Exception as e:
+                print(f"❌ Purge des clés d'idempotence : {e}")
+            _stop.wait(interval)
+
+    _stop.clear()
+    _thread = threading.Thread(target=loop, name="idempotency-purge", daemon=True)
+    _thread.start()
+    return _thread
+
+def stop_purger():
+    global _thread
+    _stop.set()
+    if _thread: _thread.join(timeout=5)
+    _thread = None
+
+
+# --- Middleware ASGI ---
+
+class IdempotencyMiddleware:
+    """POST avec Idempotency-Key : exécuté une fois par utilisateur et par clé, réponse rejouée ensuite."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        owner = request_owner(headers.get("authorization")) if key else None
+        if not owner:
+            return await self.app(scope, receive, send)
+        if len(key) > IDEMPOTENCY_MAX_KEY:
+            return await JSONResponse({"detail": "Idempotency-Key trop longue"}, 400)(scope, receive, send)
+
+        # Corps lu en entier (empreinte), puis redonné tel quel à la route
+        chunks, more = [], True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect": return
+            chunks.append(message.get("body", b"")); more = message.get("more_body", False)
+        body = b"".join(chunks)
+        fingerprint = sha256(scope["method"], scope["path"], scope.get("query_string", b""), body)
+        key_hash = sha256(key)
+
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            claim, row = await run_in_threadpool(claim_key, owner, key_hash, fingerprint)
+            if claim is not None: break
+            if row is None: continue  # Libérée entre-temps (1ère requête en erreur) : on réessaie
+            if row.fingerprint != fingerprint:
+                return await JSONResponse({"detail": "Idempotency-Key déjà utilisée pour une autre requête"}, 422)(scope, receive, send)
+            if row.expires_at < datetime.utcnow():
+                await run_in_threadpool(drop_row, row); continue
+            if row.status_code is not None:
+                replay = Response(row.body, row.status_code, media_type=row.content_type, headers={"Idempotent-Replayed": "true"})
+                return await replay(scope, receive, send)
+            if row.created_at < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_STALE_SECONDS):
+                await run_in_threadpool(drop_row, row); continue  # Requête abandonnée (arrêt du serveur)
+            if time.monotonic() >= deadline:
+                return await JSONResponse({"detail": "Requête identique en cours"}, 409)(scope, receive, send)
+            await asyncio.sleep(0.1)
+
+        async def replay_body():
+            nonlocal body
+            if body is None: return await receive()
+            message, body = {"type": "http.request", "body": body, "more_body": False}, None
+            return message
+
+        response = {"status": None, "content_type": None, "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["content_type"] = Headers(raw=message["headers"]).get("content-type")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_body, capture)
+        except BaseException:
+            await run_in_threadpool(claim.release)
+            raise
+        if response["status"] is None or response["status"] >= 500:
+            await run_in_threadpool(claim.release)
+        else:
+            await run_in_threadpool(claim.complete, response["status"], response["content_type"], b"".join(response["body"]))
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import requests
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+# ==========================================
+# CACHE DISQUE DES IMAGES (Logos, signatures, photos Cloudinary)
+# ==========================================
+# Les assets changent rarement : on les garde sur disque, indexés par l'URL
+# normalisée (après transformation Cloudinary). Éviction LRU au-delà de la
+# taille max, TTL, puis revalidation conditionnelle (ETag / Last-Modified).
+
+CACHE_ENABLED = os.getenv("PDF_IMAGE_CACHE_ENABLED", "1") == "1"
+CACHE_DIR = os.getenv("PDF_IMAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "conformeo_image_cache"))
+CACHE_MAX_BYTES = int(os.getenv("PDF_IMAGE_CACHE_MAX_MB", "256")) * 1024 * 1024
+CACHE_TTL_SECONDS = int(os.getenv("PDF_IMAGE_CACHE_TTL", str(7 * 24 * 3600)))  # 7 jours
+HTTP_TIMEOUT = 5
+
+
+def normalize_url(url: str) -> str:
+    """Schéma/hôte en minuscules, sans fragment ni espaces parasites."""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+
+class ImageCache:
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # clé -> taille (ordre = du moins au plus récemment utilisé)
+        self._total = 0
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "refreshed": 0, "evictions": 0, "errors": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # --- Index ---
+
+    def _load_index(self):
+        """Reconstruit l'index LRU depuis le disque (mtime = dernier accès)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"): continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".bin", base + ".json"
+
+    def _read_meta(self, key):
+        try:
+            with open(self._paths(key)[1], "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        _, meta_path = self._paths(key)
+        tmp = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def _touch(self, key):
+        with self._lock:
+            if key in self._index: self._index.move_to_end(key)
+        try: os.utime(self._paths(key)[0])
+        except OSError: pass
+
+    def _remove(self, key):
+        """À appeler sous verrou."""
+        size = self._index.pop(key, 0)
+        self._total -= size
+        for p in self._paths(key):
+            try: os.remove(p)
+            except OSError: pass
+
+    def _store(self, key, url, content, response):
+        bin_path, _ = self._paths(key)
+        tmp = f"{bin_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, bin_path)
+        self._write_meta(key, {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "size": len(content),
+        })
+        with self._lock:
+            if key in self._index: self._total -= self._index[key]
+            self._index[key] = len(content)
+            self._index.move_to_end(key)
+            self._total += len(content)
+            # Éviction LRU (on garde toujours l'entrée qu'on vient d'écrire)
+            while self._total > self.max_bytes and len(self._index) > 1:
+                oldest = next(iter(self._index))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _read(self, key):
+        try:
+            with open(self._paths(key)[0], "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    # --- API publique ---
+
+    def fetch(self, url, timeout=HTTP_TIMEOUT):
+        """Retourne les octets de l'image (cache ou réseau), ou None si indisponible."""
+        url = normalize_url(url)
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+        with self._lock:
+            cached = key in self._index
+        meta = self._read_meta(key) if cached else None
+        content = self._read(key) if meta else None
+
+        # 1. Entrée fraîche : aucun appel réseau
+        if content is not None and (time.time() - meta.get("fetched_at", 0)) < self.ttl:
+            self._count("hits")
+            self._touch(key)
+            return content
+
+        # 2. Entrée périmée : requête conditionnelle / 3. Absente : téléchargement
+        headers = {}
+        if content is not None:
+            if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+        else:
+            self._count("misses")
+
+        try:
+            response = requests.get(url, headers=headers, timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ Cache image: réseau indisponible pour {url} ({e})")
+            self._count("errors")
+            # Mieux vaut une image un peu ancienne que pas d'image du tout
+            return content
+
+        if response.status_code == 304 and content is not None:
+            meta["fetched_at"] = time.time()
+            self._write_meta(key, meta)
+            self._touch(key)
+            self._count("revalidated")
+            return content
+
+        if response.status_code == 200:
+            if content is not None: self._count("refreshed")
+            try:
+                self._store(key, url, response.content, response)
+            except OSError as e:
+                print(f"⚠️ Cache image: écriture impossible ({e})")
+                self._count("errors")
+            return response.content
+
+        self._count("errors")
+        return content
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._index), "size_bytes": self._total, "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+
+
+def _build_cache():
+    if not CACHE_ENABLED: return None
+    try:
+        return ImageCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_TTL_SECONDS)
+    except OSError as e:
+        print(f"⚠️ Cache image désactivé ({e})")
+        return None
+
+image_cache = _build_cache()
+
+
+def fetch_image_bytes(url, timeout=HTTP_TIMEOUT):
+    """Point d'entrée unique : passe par le cache s'il est actif, sinon requête directe."""
+    if image_cache is not None:
+        return image_cache.fetch(url, timeout=timeout)
+    response = requests.get(url, timeout=timeout)
+    return response.content if response.status_code == 200 else None
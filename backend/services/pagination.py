@@ -0,0 +1,94 @@
+import os
+import json
+import base64
+import binascii
+from datetime import datetime, date
+from typing import NamedTuple, Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+# ==========================================
+# PAGINATION PAR CURSEUR (Keyset)
+# ==========================================
+# Les listes sont triées sur une clé stable et unique (date + id, ou id seul).
+# Le curseur est la clé de la dernière ligne reçue, encodée (opaque pour le
+# client) : la page suivante = "les lignes après cette clé", servie par l'index
+# composite (company_id|chantier_id, date, id) sans OFFSET, même loin dans la liste.
+#     GET /chantiers/12/rapports?limit=50            -> {"items": [...], "next_cursor": "..."}
+#     GET /chantiers/12/rapports?cursor=...&limit=50 -> page suivante (next_cursor null à la fin)
+#     GET /chantiers/12/rapports?all=true            -> ancienne réponse : liste complète
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+
+class Keyset(NamedTuple):
+    columns: tuple           # ex: (Rapport.date_creation, Rapport.id) ; l'id en dernier rend la clé unique
+    descending: bool = True  # Plus récents d'abord
+
+
+class PageParams:
+    """Paramètres communs des listes paginées (dépendance FastAPI)."""
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="next_cursor de la page précédente"),
+        limit: Optional[int] = Query(None, ge=1, description=f"Taille de page (défaut {PAGE_SIZE_DEFAULT}, max {PAGE_SIZE_MAX})"),
+        all: bool = Query(False, description="Liste complète non paginée (ancien comportement)"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.all = all
+
+    @property
+    def size(self):
+        return min(self.limit or PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX)
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+def _from_json(column, value):
+    """Valeur du curseur -> type Python de la colonne (dates relues depuis l'ISO)."""
+    if value is None: return None
+    python_type = column.type.python_type
+    if python_type is datetime: return datetime.fromisoformat(value)
+    if python_type is date: return date.fromisoformat(value)
+    return python_type(value)
+
+def encode_cursor(values):
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor, keyset):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keyset.columns): raise ValueError
+        return [_from_json(column, v) for column, v in zip(keyset.columns, values)]
+    except (ValueError, TypeError, binascii.Error, json.JSONDecodeError):
+        raise HTTPException(400, "Curseur de pagination invalide")
+
+
+def paginate(query, keyset, page, all_query=None):
+    """
+    Page suivant `page.cursor` : {"items": [...], "next_cursor": str | None}.
+    Avec ?all=true : liste complète telle qu'avant (`all_query` si l'ancien tri diffère).
+    """
+    if page.all:
+        return (all_query if all_query is not None else query).all()
+
+    key = tuple_(*keyset.columns)
+    order = [c.desc() if keyset.descending else c.asc() for c in keyset.columns]
+    query = query.order_by(None).order_by(*order)
+    if page.cursor:
+        after = tuple_(*decode_cursor(page.cursor, keyset))
+        query = query.filter(key < after if keyset.descending else key > after)
+
+    rows = query.limit(page.size + 1).all()
+    items, has_more = rows[:page.size], len(rows) > page.size
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in keyset.columns])
+    return {"items": items, "next_cursor": next_cursor}
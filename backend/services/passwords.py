@@ -0,0 +1,68 @@
+import os
+import hmac
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+# ==========================================
+# 🔑 MOTS DE PASSE (bcrypt hors de la boucle d'événements)
+# ==========================================
+# Un hachage bcrypt coûte ~250 ms de CPU (coût 12) : exécuté dans un pool de
+# threads dédié et borné (bcrypt libère le GIL), jamais sur la boucle asyncio
+# ni dans le threadpool partagé des routes. Au-delà de PASSWORD_HASH_QUEUE
+# calculs en attente, la connexion répond 503 (Retry-After) au lieu d'empiler
+# les secondes d'attente pendant le pic de 7h.
+# Anciennes lignes en clair : comparées telles quelles puis re-hachées à la
+# première connexion réussie (idem si PASSWORD_BCRYPT_ROUNDS change).
+
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))  # Calculs en cours + en attente
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None: _executor.shutdown(wait=False)
+        _executor = None
+
+
+async def run_bounded(fn, *args):
+    """Exécute fn dans le pool bcrypt ; 503 si trop de calculs sont déjà en attente."""
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(503, "Trop de connexions simultanées, réessayez", headers={"Retry-After": "2"})
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+    finally:
+        _slots.release()
+
+
+def _verify(password, stored):
+    """(mot de passe correct, nouveau hash à enregistrer ou None)."""
+    if not stored: return False, None
+    if pwd_context.identify(stored) is None:
+        # Ancienne ligne en clair : comparaison à temps constant, puis migration
+        ok = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return ok, (pwd_context.hash(password) if ok else None)
+    return pwd_context.verify_and_update(password, stored)
+
+async def verify_password(password, stored):
+    return await run_bounded(_verify, password, stored)
+
+async def hash_password(password):
+    return await run_bounded(pwd_context.hash, password)
@@ -1,16 +1,22 @@
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable, CondPageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib import colors
-from PIL import Image, ImageOps
-import os
-import requests
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.annotations import Link
 from io import BytesIO
 from datetime import datetime
+from typing import NamedTuple
+import os
+from .pdf_templates import form_name, use_form
+from .pdf_images import (
+    DEFAULT_QUALITY, PHOTO_BOX, LOGO_BOX, SIGNATURE_BOX,
+    get_image_bytes, get_file_bytes, load_image, prepare_image, prefetch_images
+)
 
 # ==========================================
 # 0. CONFIGURATION & STYLES GLOBAUX
@@ -37,95 +43,103 @@ def get_optimized_image(path_or_url):
     """Télécharge ou récupère une image locale de manière robuste."""
     if not path_or_url: return None
     try:
-        if path_or_url.startswith("http"):
-            # Optimisation Cloudinary
-            optimized_url = path_or_url
-            if "cloudinary.com" in path_or_url and "/upload/" in path_or_url:
-                optimized_url = path_or_url.replace("/upload/", "/upload/w_1000,q_auto,f_jpg/")
-            
-            response = requests.get(optimized_url, stream=True, timeout=5)
-            if response.status_code == 200:
-                return Image.open(BytesIO(response.content))
-        else:
-            # Gestion fichier local
-            clean_path = path_or_url.strip("/")
-            possible_paths = [
-                clean_path,
-                os.path.join("uploads", os.path.basename(clean_path)),
-                os.path.join(os.getcwd(), clean_path)
-            ]
-            for p in possible_paths:
-                if os.path.exists(p):
-                    return Image.open(p)
+        content = get_image_bytes(path_or_url)
+        if content:
+            return Image.open(BytesIO(content))
     except Exception as e:
         print(f"❌ Erreur image: {e}")
     return None
 
-def draw_footer(c, w, h, chantier, titre_doc):
-    """Pied de page standardisé"""
-    c.saveState()
+def get_logo_source(chantier, company=None):
+    """URL du logo à afficher en page de garde (entreprise explicite ou celle du chantier)."""
+    if company and company.logo_url: return company.logo_url
+    if hasattr(chantier, 'company') and chantier.company: return chantier.company.logo_url
+    return None
+
+def get_rapport_images(rap):
+    """Liste des URLs photos d'un rapport (multi-photos ou photo unique legacy)."""
+    if hasattr(rap, 'images') and rap.images: return [i.url for i in rap.images]
+    if hasattr(rap, 'photo_url') and rap.photo_url: return [rap.photo_url]
+    return []
+
+def draw_footer(c, w, h, chantier, titre_doc, page_offset=0):
+    """Pied de page standardisé (`page_offset` : pages des morceaux précédents)"""
     footer_y = 2 * cm 
-    c.setStrokeColorRGB(0.8, 0.8, 0.8); c.setLineWidth(0.5)
-    c.line(1*cm, footer_y + 0.5*cm, w-1*cm, footer_y + 0.5*cm)
-    
+    label = f"Conforméo - {titre_doc} - {chantier.nom}"
+
+    # Filet + libellé : identiques sur toutes les pages du document -> form
+    def draw_static(c):
+        c.setStrokeColorRGB(0.8, 0.8, 0.8); c.setLineWidth(0.5)
+        c.line(1*cm, footer_y + 0.5*cm, w-1*cm, footer_y + 0.5*cm)
+        c.setFont(FONT_TEXT, 8); c.setFillColorRGB(0.5, 0.5, 0.5)
+        c.drawString(1*cm, footer_y, label)
+
+    c.saveState()
+    use_form(c, form_name("Footer", label, w), draw_static)
     c.setFont(FONT_TEXT, 8); c.setFillColorRGB(0.5, 0.5, 0.5)
-    c.drawString(1*cm, footer_y, f"Conforméo - {titre_doc} - {chantier.nom}")
-    c.drawRightString(w-1*cm, footer_y, f"Page {c.getPageNumber()}")
+    c.drawRightString(w-1*cm, footer_y, f"Page {c.getPageNumber() + page_offset}")
     c.restoreState()
 
-def draw_cover_page(c, chantier, titre_principal, sous_titre, company=None):
-    """Page de garde (Style Bleu/Dossier)"""
+def draw_cover_page(c, chantier, titre_principal, sous_titre, company=None, images=None, quality=DEFAULT_QUALITY):
+    """Page de garde (Style Bleu/Dossier). `images` : images préchargées optionnelles."""
     logo_center_y = height / 2 + 3 * cm 
-    
-    # 1. Logo
-    logo_source = None
-    if company and company.logo_url: logo_source = company.logo_url
-    elif hasattr(chantier, 'company') and chantier.company: logo_source = chantier.company.logo_url
-
-    if logo_source:
-        img = get_optimized_image(logo_source)
-        if img:
-            max_im_w, max_im_h = 12 * cm, 8 * cm
-            iw, ih = img.size
-            ratio = min(max_im_w/iw, max_im_h/ih)
-            new_w, new_h = iw * ratio, ih * ratio
-            
-            pos_x = (width - new_w) / 2
-            pos_y = logo_center_y - (new_h / 2)
-            try:
-                c.drawImage(ImageReader(img), pos_x, pos_y, width=new_w, height=new_h, mask='auto', preserveAspectRatio=True)
-            except: pass
-
-    # 2. Titres
-    y_text = logo_center_y - 5 * cm 
-    c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 24)
-    c.drawCentredString(width/2, y_text, titre_principal)
-    
-    y_text -= 1.2 * cm
-    c.setFillColorRGB(*COLOR_SECONDARY); c.setFont(FONT_TEXT, 14)
-    c.drawCentredString(width/2, y_text, sous_titre)
-    
-    y_text -= 2 * cm
-    c.setStrokeColorRGB(0.8, 0.8, 0.8); c.setLineWidth(0.5)
-    c.line(2*cm, y_text, width-2*cm, y_text)
-
-    # 3. Infos Chantier
-    y_info = y_text - 3 * cm
+    logo_source = get_logo_source(chantier, company)
+
+    # Positions partagées entre le gabarit et le texte variable
+    y_text = logo_center_y - 5 * cm
+    y_rule = y_text - 3.2 * cm
+    y_projet = y_rule - 3 * cm
+    y_adresse = y_projet - 1.5 * cm
+    y_company = y_adresse - 2.5 * cm
     x_labels, x_values = 2 * cm, 6 * cm 
-    c.setFillColorRGB(0, 0, 0)
-    
-    c.setFont(FONT_TITLE, 14); c.drawString(x_labels, y_info, "PROJET :")
-    c.setFont(FONT_TEXT, 14); c.drawString(x_values, y_info, chantier.nom or "Non défini")
-    
-    y_info -= 1.5 * cm
-    c.setFont(FONT_TITLE, 14); c.drawString(x_labels, y_info, "ADRESSE :")
-    c.setFont(FONT_TEXT, 14); c.drawString(x_values, y_info, chantier.adresse or "Non définie")
+
+    # Gabarit (logo, titres, filet, libellés) : un form par habillage
+    def draw_static(c):
+        # 1. Logo
+        if logo_source:
+            img = images.get(logo_source) if images is not None else load_image(logo_source, LOGO_BOX, quality)
+            if img:
+                max_im_w, max_im_h = LOGO_BOX
+                iw, ih = img.getSize()
+                ratio = min(max_im_w/iw, max_im_h/ih)
+                new_w, new_h = iw * ratio, ih * ratio
+                
+                pos_x = (width - new_w) / 2
+                pos_y = logo_center_y - (new_h / 2)
+                try:
+                    c.drawImage(img, pos_x, pos_y, width=new_w, height=new_h, mask='auto', preserveAspectRatio=True)
+                except: pass
+
+        # 2. Titres
+        c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 24)
+        c.drawCentredString(width/2, y_text, titre_principal)
+        
+        c.setFillColorRGB(*COLOR_SECONDARY); c.setFont(FONT_TEXT, 14)
+        c.drawCentredString(width/2, y_text - 1.2 * cm, sous_titre)
+        
+        c.setStrokeColorRGB(0.8, 0.8, 0.8); c.setLineWidth(0.5)
+        c.line(2*cm, y_rule, width-2*cm, y_rule)
+
+        # 3. Libellés
+        c.setFillColorRGB(0, 0, 0); c.setFont(FONT_TITLE, 14)
+        c.drawString(x_labels, y_projet, "PROJET :")
+        c.drawString(x_labels, y_adresse, "ADRESSE :")
+        if company:
+            c.setFont(FONT_TITLE, 12); c.setFillColorRGB(*COLOR_SECONDARY)
+            c.drawString(x_labels, y_company, "RÉALISÉ PAR :")
+
+    use_form(c, form_name("Cover", titre_principal, sous_titre, logo_source, bool(company)), draw_static)
+
+    # Infos Chantier (variables)
+    c.setFillColorRGB(0, 0, 0); c.setFont(FONT_TEXT, 14)
+    c.drawString(x_values, y_projet, chantier.nom or "Non défini")
+    c.drawString(x_values, y_adresse, chantier.adresse or "Non définie")
     
+    y_info = y_adresse
     if company:
-        y_info -= 2.5 * cm
-        c.setFont(FONT_TITLE, 12); c.setFillColorRGB(*COLOR_SECONDARY)
-        c.drawString(x_labels, y_info, "RÉALISÉ PAR :")
-        c.setFont(FONT_TEXT, 12); c.drawString(x_values, y_info, company.name)
+        y_info = y_company
+        c.setFont(FONT_TEXT, 12); c.setFillColorRGB(*COLOR_SECONDARY)
+        c.drawString(x_values, y_info, company.name)
 
     date_str = datetime.now().strftime('%d/%m/%Y')
     c.setFont(FONT_TEXT, 10); c.setFillColorRGB(0.5, 0.5, 0.5)
@@ -136,70 +150,158 @@ def draw_cover_page(c, chantier, titre_principal, sous_titre, company=None):
 # ==========================================
 # 2. JOURNAL DE BORD (Correction du nom et args)
 # ==========================================
-# ✅ CORRECTION ICI : Renommé 'generate_pdf' -> 'generate_journal_pdf'
-# ✅ CORRECTION ICI : 'buffer' en premier argument
-def generate_journal_pdf(buffer, chantier, rapports, inspections=None, company=None):
+# --- Découpage en shards (très gros journaux) ---
+# Les rapports sont répartis en tranches rendues en parallèle (un canvas par
+# processus), puis recollées. On ne coupe qu'avant un rapport qui ouvre de toute
+# façon une nouvelle page : le document final est identique au rendu d'un bloc.
+
+JOURNAL_SHARD_IMAGES = int(os.getenv("PDF_JOURNAL_SHARD_IMAGES", "150"))  # photos par shard (environ)
+JOURNAL_TOP_Y = height - 3 * cm
+JOURNAL_BOTTOM_LIMIT = 3 * cm
+
+
+class JournalShard(NamedTuple):
+    start: int            # Index du premier rapport
+    stop: int             # Index après le dernier rapport
+    page_offset: int      # Pages qui précèdent le shard (numérotation continue)
+    first: bool           # Page de garde + titre de section
+    last: bool            # Inspections + signature
+
+
+def layout_journal_rapports(rapports):
+    """
+    Simule la mise en page des rapports, sans rien dessiner (mêmes hauteurs
+    que le rendu). Retourne, pour chaque rapport, (page de départ, ouvre une page ?).
+    """
+    img_h = PHOTO_BOX[1]
+    page, y = 2, JOURNAL_TOP_Y - 1.2 * cm  # Page 1 = garde, puis titre "1. RELEVÉS PHOTOS"
+    starts = []
+
+    def check_space(needed):
+        nonlocal page, y
+        if (y - needed) < JOURNAL_BOTTOM_LIMIT:
+            page += 1; y = JOURNAL_TOP_Y
+            return True
+        return False
+
+    for rap in rapports:
+        breaks = check_space(4*cm)
+        starts.append((page, breaks))
+        y -= 0.6*cm
+        if rap.description: y -= 0.8*cm
+        for _ in range(0, len(get_rapport_images(rap)), 2):
+            check_space(img_h + 0.5*cm)
+            y -= (img_h + 0.5*cm)
+        y -= 0.5*cm
+    return starts
+
+
+def plan_journal_shards(rapports, max_shards):
+    """Découpe adaptative : ~JOURNAL_SHARD_IMAGES photos par shard, au plus `max_shards`."""
+    rapports = rapports or []
+    n_images = sum(len(get_rapport_images(r)) for r in rapports)
+    wanted = max(1, min(max_shards, -(-n_images // max(JOURNAL_SHARD_IMAGES, 1))))
+    if wanted == 1 or len(rapports) < 2:
+        return [JournalShard(0, len(rapports), 0, True, True)]
+
+    # Coupures possibles : rapports qui commencent une page, au plus près de l'équilibre en photos
+    starts = layout_journal_rapports(rapports)
+    cuts, seen, target = [], 0, n_images / wanted
+    for idx, rap in enumerate(rapports):
+        if idx and starts[idx][1] and seen >= target * (len(cuts) + 1) and len(cuts) < wanted - 1:
+            cuts.append(idx)
+        seen += len(get_rapport_images(rap))
+
+    bounds = [0] + cuts + [len(rapports)]
+    return [
+        JournalShard(a, b, starts[a][0] - 1 if i else 0, i == 0, i == len(bounds) - 2)
+        for i, (a, b) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+def render_journal_shard(buffer, chantier, rapports, shard, inspections=None, company=None, quality=DEFAULT_QUALITY, progress=None):
+    """Rend un shard (rapports[shard.start:shard.stop]) dans son propre canvas."""
     c = canvas.Canvas(buffer, pagesize=A4)
     margin = 2 * cm
-    draw_cover_page(c, chantier, "JOURNAL DE BORD", "Suivi d'exécution & Rapports", company)
+    rapports = (rapports or [])[shard.start:shard.stop]
 
-    y = height - 3 * cm
-    bottom_limit = 3 * cm 
+    def footer():
+        draw_footer(c, width, height, chantier, "Journal de Bord", page_offset=shard.page_offset)
+
+    # Préchargement parallèle des images du shard (photos, logo, signature),
+    # décodées directement à la résolution de leur cadre
+    extra = []
+    if shard.first: extra.append((get_logo_source(chantier, company), LOGO_BOX, False))
+    if shard.last: extra.append((chantier.signature_url, SIGNATURE_BOX, False))
+    images = prefetch_images(
+        [(u, PHOTO_BOX, True) for rap in rapports for u in get_rapport_images(rap)] + extra,
+        quality=quality
+    )
+
+    if shard.first:
+        draw_cover_page(c, chantier, "JOURNAL DE BORD", "Suivi d'exécution & Rapports", company, images=images)
+
+    y = JOURNAL_TOP_Y
+    bottom_limit = JOURNAL_BOTTOM_LIMIT
 
     def check_space(needed_height):
         nonlocal y
         if (y - needed_height) < bottom_limit:
-            draw_footer(c, width, height, chantier, "Journal de Bord")
+            footer()
             c.showPage()
-            y = height - 3 * cm
+            y = JOURNAL_TOP_Y
 
     # --- PHOTOS ---
-    if rapports:
+    if rapports and shard.first:
         c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 14)
         c.drawString(margin, y, "1. RELEVÉS PHOTOS")
         y -= 0.2*cm; c.setLineWidth(1); c.setStrokeColorRGB(*COLOR_PRIMARY)
         c.line(margin, y, width-margin, y)
         y -= 1 * cm
 
-        for rap in rapports:
-            check_space(4*cm)
-            c.setFillColorRGB(0,0,0); c.setFont(FONT_TITLE, 11)
-            date_rap = rap.date_creation.strftime('%d/%m') if isinstance(rap.date_creation, datetime) else str(rap.date_creation)[:10]
-            c.drawString(margin, y, f"{date_rap} | {rap.titre or 'Observation'}")
-            y -= 0.6*cm
+    for idx, rap in enumerate(rapports):
+        if progress: progress(idx, len(rapports))
+        # Un shard suivant commence en haut de page : ce test ne déclenche rien pour son 1er rapport
+        if idx or shard.first: check_space(4*cm)
+        c.setFillColorRGB(0,0,0); c.setFont(FONT_TITLE, 11)
+        date_rap = rap.date_creation.strftime('%d/%m') if isinstance(rap.date_creation, datetime) else str(rap.date_creation)[:10]
+        c.drawString(margin, y, f"{date_rap} | {rap.titre or 'Observation'}")
+        y -= 0.6*cm
+        
+        if rap.description:
+            c.setFont(FONT_TEXT, 10); c.setFillColorRGB(0.2, 0.2, 0.2)
+            c.drawString(margin, y, rap.description)
+            y -= 0.8*cm
+
+        imgs = get_rapport_images(rap)
+
+        # Grille 2 colonnes (images déjà téléchargées, préparées et redressées)
+        (img_w, img_h), gap = PHOTO_BOX, 1*cm
+        for i in range(0, len(imgs), 2):
+            check_space(img_h + 0.5*cm)
             
-            if rap.description:
-                c.setFont(FONT_TEXT, 10); c.setFillColorRGB(0.2, 0.2, 0.2)
-                c.drawString(margin, y, rap.description)
-                y -= 0.8*cm
-
-            imgs = []
-            if hasattr(rap, 'images') and rap.images: imgs = [i.url for i in rap.images]
-            elif hasattr(rap, 'photo_url') and rap.photo_url: imgs = [rap.photo_url]
-
-            # Grille 2 colonnes
-            img_w, img_h, gap = 8*cm, 6*cm, 1*cm
-            for i in range(0, len(imgs), 2):
-                check_space(img_h + 0.5*cm)
-                
-                # Img 1
-                pil1 = get_optimized_image(imgs[i])
-                if pil1:
-                    try:
-                        pil1 = ImageOps.exif_transpose(pil1)
-                        c.drawImage(ImageReader(pil1), margin, y-img_h, width=img_w, height=img_h, preserveAspectRatio=True)
+            # Img 1
+            pil1 = images.get(imgs[i])
+            if pil1:
+                try: c.drawImage(pil1, margin, y-img_h, width=img_w, height=img_h, preserveAspectRatio=True)
+                except: pass
+            
+            # Img 2
+            if i+1 < len(imgs):
+                pil2 = images.get(imgs[i+1])
+                if pil2:
+                    try: c.drawImage(pil2, margin+img_w+gap, y-img_h, width=img_w, height=img_h, preserveAspectRatio=True)
                     except: pass
-                
-                # Img 2
-                if i+1 < len(imgs):
-                    pil2 = get_optimized_image(imgs[i+1])
-                    if pil2:
-                        try:
-                            pil2 = ImageOps.exif_transpose(pil2)
-                            c.drawImage(ImageReader(pil2), margin+img_w+gap, y-img_h, width=img_w, height=img_h, preserveAspectRatio=True)
-                        except: pass
-                y -= (img_h + 0.5*cm)
-            y -= 0.5*cm
+            y -= (img_h + 0.5*cm)
+        y -= 0.5*cm
+
+    if progress: progress(len(rapports), len(rapports))
+
+    if not shard.last:
+        # La suite commence sur une nouvelle page (shard suivant)
+        footer()
+        c.save()
+        return
 
     # --- INSPECTIONS ---
     if inspections:
@@ -241,21 +343,68 @@ def generate_journal_pdf(buffer, chantier, rapports, inspections=None, company=N
     c.drawString(width-8*cm, y, "Validation :")
     
     if chantier.signature_url:
-        sig = get_optimized_image(chantier.signature_url)
+        sig = images.get(chantier.signature_url)
         if sig:
-            try: c.drawImage(ImageReader(sig), width-8*cm, y-4*cm, 5*cm, 3*cm, mask='auto', preserveAspectRatio=True)
+            try: c.drawImage(sig, width-8*cm, y-4*cm, *SIGNATURE_BOX, mask='auto', preserveAspectRatio=True)
             except: pass
     
-    draw_footer(c, width, height, chantier, "Journal de Bord")
+    footer()
     c.save()
 
+
+def merge_pdf_parts(parts, buffer):
+    """Recolle des PDF (bytes) dans l'ordre."""
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(PdfReader(BytesIO(part)))
+    writer.write(buffer)
+
+
+# ✅ CORRECTION ICI : Renommé 'generate_pdf' -> 'generate_journal_pdf'
+# ✅ CORRECTION ICI : 'buffer' en premier argument
+def generate_journal_pdf(buffer, chantier, rapports, inspections=None, company=None, quality=DEFAULT_QUALITY, progress=None, executor=None, max_shards=1):
+    """
+    `progress(fait, total)` optionnel : appelé au fil des rapports (jobs asynchrones).
+    `executor` (pool de processus) : les gros journaux sont rendus en `max_shards` shards parallèles.
+    """
+    rapports = rapports or []
+    if executor is None:
+        shard = JournalShard(0, len(rapports), 0, True, True)
+        return render_journal_shard(buffer, chantier, rapports, shard, inspections, company, quality, progress)
+
+    shards = plan_journal_shards(rapports, max_shards)
+    futures = []
+    for shard in shards:
+        # Chaque processus ne reçoit que ses rapports (le reste n'est pas sérialisé)
+        local = JournalShard(0, shard.stop - shard.start, shard.page_offset, shard.first, shard.last)
+        futures.append((shard, executor.submit(
+            _render_shard_bytes, chantier, rapports[shard.start:shard.stop], local,
+            inspections if shard.last else None, company, quality
+        )))
+
+    parts, done = [], 0
+    for shard, future in futures:
+        parts.append(future.result())
+        done += shard.stop - shard.start
+        if progress: progress(done, len(rapports))
+
+    if len(parts) == 1:
+        buffer.write(parts[0])
+    else:
+        merge_pdf_parts(parts, buffer)
+
+def _render_shard_bytes(*args):
+    buffer = BytesIO()
+    render_journal_shard(buffer, *args)
+    return buffer.getvalue()
+
 # ==========================================
 # 3. PPSPS
 # ==========================================
-def generate_ppsps_pdf(buffer, ppsps, chantier):
+def generate_ppsps_pdf(buffer, ppsps, chantier, quality=DEFAULT_QUALITY):
     c = canvas.Canvas(buffer, pagesize=A4)
     margin = 2 * cm
-    draw_cover_page(c, chantier, "P.P.S.P.S", "Plan Particulier de Sécurité")
+    draw_cover_page(c, chantier, "P.P.S.P.S", "Plan Particulier de Sécurité", quality=quality)
     
     y = height - 3 * cm
     bottom_limit = 3 * cm
@@ -320,10 +469,10 @@ def generate_ppsps_pdf(buffer, ppsps, chantier):
 # ==========================================
 # 4. AUDIT UNIQUE
 # ==========================================
-def generate_audit_pdf(buffer, inspection, chantier):
+def generate_audit_pdf(buffer, inspection, chantier, quality=DEFAULT_QUALITY):
     c = canvas.Canvas(buffer, pagesize=A4)
     margin = 2 * cm
-    draw_cover_page(c, chantier, "RAPPORT D'INSPECTION", f"{inspection.titre} ({inspection.type})")
+    draw_cover_page(c, chantier, "RAPPORT D'INSPECTION", f"{inspection.titre} ({inspection.type})", quality=quality)
     
     y = height - 3 * cm
     bottom_limit = 3 * cm
@@ -370,10 +519,19 @@ def generate_audit_pdf(buffer, inspection, chantier):
 # ==========================================
 # 5. PLAN DE PREVENTION (PdP)
 # ==========================================
-def generate_pdp_pdf(buffer, pdp, chantier):
+def generate_pdp_pdf(buffer, pdp, chantier, quality=DEFAULT_QUALITY):
     c = canvas.Canvas(buffer, pagesize=A4)
     margin = 2 * cm
-    draw_cover_page(c, chantier, "PLAN DE PRÉVENTION", "Travaux en site occupé / Coactivité")
+
+    # Logo + signatures EU/EE téléchargés en parallèle
+    sig_ee_source = pdp.signature_ee or (chantier.signature_url if chantier.signature_url else None)
+    images = prefetch_images([
+        (get_logo_source(chantier), LOGO_BOX, False),
+        (pdp.signature_eu, SIGNATURE_BOX, False),
+        (sig_ee_source, SIGNATURE_BOX, False),
+    ], quality=quality)
+
+    draw_cover_page(c, chantier, "PLAN DE PRÉVENTION", "Travaux en site occupé / Coactivité", images=images)
 
     y = height - 3 * cm
     bottom_limit = 3 * cm
@@ -451,20 +609,19 @@ def generate_pdp_pdf(buffer, pdp, chantier):
 
     # Signatures
     if pdp.signature_eu:
-        sig_eu = get_optimized_image(pdp.signature_eu)
+        sig_eu = images.get(pdp.signature_eu)
         if sig_eu:
             try:
-                c.drawImage(ImageReader(sig_eu), margin, y_sig_start, width=5*cm, height=3*cm, mask='auto', preserveAspectRatio=True)
+                c.drawImage(sig_eu, margin, y_sig_start, width=5*cm, height=3*cm, mask='auto', preserveAspectRatio=True)
                 c.setFont(FONT_TEXT, 8); c.setFillColorRGB(0, 0.6, 0)
                 c.drawString(margin, y_sig_start - 0.3*cm, "Signé électroniquement")
             except: pass
 
-    sig_ee_source = pdp.signature_ee or (chantier.signature_url if chantier.signature_url else None)
     if sig_ee_source:
-        sig_ee = get_optimized_image(sig_ee_source)
+        sig_ee = images.get(sig_ee_source)
         if sig_ee:
             try:
-                c.drawImage(ImageReader(sig_ee), margin + col_w, y_sig_start, width=5*cm, height=3*cm, mask='auto', preserveAspectRatio=True)
+                c.drawImage(sig_ee, margin + col_w, y_sig_start, width=5*cm, height=3*cm, mask='auto', preserveAspectRatio=True)
                 c.setFont(FONT_TEXT, 8); c.setFillColorRGB(0, 0.6, 0)
                 c.drawString(margin + col_w, y_sig_start - 0.3*cm, "Signé électroniquement (Auto)")
             except: pass
@@ -478,61 +635,158 @@ def generate_pdp_pdf(buffer, pdp, chantier):
 # ==========================================
 # 6. DUERP (Tableau Dynamique)
 # ==========================================
-def generate_duerp_pdf(duerp, company, lignes):
-    """Génère le DUERP avec historique conservé"""
-    buffer = BytesIO()
+# Le registre est découpé par unité de travail, puis en tableaux de
+# DUERP_CHUNK_ROWS lignes : platypus ne coupe ainsi que de petits tableaux
+# (le coût d'un découpage croît avec la taille du tableau restant), et le
+# temps de rendu reste proportionnel au nombre de lignes.
+# Seul le premier tableau d'une unité porte l'en-tête : les suivants ne le
+# reprennent qu'en haut de page (DuerpChunk), comme un tableau d'un seul tenant.
+DUERP_CHUNK_ROWS = int(os.getenv("PDF_DUERP_CHUNK_ROWS", "25"))
+DUERP_COL_WIDTHS = [160, 140, 40, 360, 80]
+
+# Styles calculés une fois par processus (et non à chaque ligne)
+_duerp_sheet = getSampleStyleSheet()
+DUERP_STYLES = {
+    "titre": ParagraphStyle('TitreDoc', parent=_duerp_sheet['Title'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#333333'), alignment=TA_CENTER),
+    "sous_titre": ParagraphStyle('SousTitre', parent=_duerp_sheet['Normal'], fontSize=10, textColor=colors.HexColor('#666666'), alignment=TA_CENTER),
+    "unite": ParagraphStyle('Unite', parent=_duerp_sheet['Normal'], fontSize=12, fontName='Helvetica-Bold', textColor=colors.HexColor('#333333'), spaceBefore=14, spaceAfter=6),
+    "header": ParagraphStyle('CellHeader', parent=_duerp_sheet['Normal'], fontSize=10, fontName='Helvetica-Bold', textColor=colors.black, alignment=TA_CENTER),
+    "normal": ParagraphStyle('CellNormal', parent=_duerp_sheet['Normal'], fontSize=10, fontName='Helvetica', leading=12),
+}
+DUERP_STYLES["center"] = ParagraphStyle('Center', parent=DUERP_STYLES["normal"], alignment=TA_CENTER)
+DUERP_HEADERS = ('Unité / Tâche', 'Risque Identifié', 'G.', 'Mesures de Prévention', 'État')
+DUERP_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F0F0')),
+    ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#999999')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('PADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+    ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+])
+# Suite d'unité sans ligne d'en-tête : pas de fond ni de trait sur la ligne 0
+DUERP_BODY_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('PADDING', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
+    ('ALIGN', (2, 0), (2, -1), 'CENTER'),
+])
+
+class DuerpChunk(Flowable):
+    """Tableau de suite d'une unité : l'en-tête n'est ajouté qu'en haut de page."""
+
+    def __init__(self, headers, rows):
+        super().__init__()
+        self.headers, self.rows = headers, rows
+        self._tables = {}
+
+    def _at_top(self):
+        # Frame._add / Frame.split renseignent _frame avant wrap et split
+        return bool(getattr(getattr(self, "_frame", None), "_atTop", True))
+
+    def _table(self):
+        with_header = self._at_top()
+        if with_header not in self._tables:
+            if with_header:
+                table = Table([self.headers] + self.rows, colWidths=DUERP_COL_WIDTHS, repeatRows=1, style=DUERP_TABLE_STYLE)
+            else:
+                table = Table(self.rows, colWidths=DUERP_COL_WIDTHS, style=DUERP_BODY_STYLE)
+            self._tables[with_header] = table
+        return self._tables[with_header]
+
+    def wrap(self, availWidth, availHeight):
+        self._current = self._table()
+        self.width, self.height = self._current.wrap(availWidth, availHeight)
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        table = self._table()
+        parts = table.split(availWidth, availHeight)
+        if not parts or table is self._tables.get(True):
+            return parts  # repeatRows=1 : la suite reprend déjà l'en-tête
+        # Coupure d'une suite sans en-tête : le reste repart en haut de page
+        done = parts[0]._nrows
+        return [parts[0], DuerpChunk(self.headers, self.rows[done:])]
+
+    def draw(self):
+        self._current.drawOn(self.canv, 0, 0)
+
+class CellParagraph(Paragraph):
+    """Paragraph de cellule : le calage des lignes (breakLines) n'est refait que si la largeur change."""
+    _wrapped = None
+
+    def wrap(self, availWidth, availHeight):
+        if self._wrapped is None or self._wrapped[0] != availWidth:
+            self._wrapped = (availWidth, super().wrap(availWidth, availHeight))
+        return self._wrapped[1]
+
+def duerp_mesures_html(statut_val, l):
+    if statut_val == "FAIT":
+        mesures_html = f"<font color='#27AE60'><b>✔ ACTION TERMINÉE : {l.mesures_realisees}</b></font>" if l.mesures_realisees else "<font color='#27AE60'><b>✔ ACTION TERMINÉE</b></font>"
+        if l.mesures_a_realiser: mesures_html += f"<br/><br/><font color='#888888' size='9'><i>(Mesure initiale prévue : {l.mesures_a_realiser})</i></font>"
+        return mesures_html
+    mesures_html = ""
+    if l.mesures_a_realiser: mesures_html += f"<b>➔ Reste à faire :</b> {l.mesures_a_realiser}"
+    if l.mesures_realisees: mesures_html += f"<br/><br/><font color='#666666'><i>✔ Déjà réalisé : {l.mesures_realisees}</i></font>"
+    return mesures_html or "<i>(Aucune mesure définie)</i>"
+
+def write_duerp_pdf(buffer, duerp, company, lignes):
+    """Génère le DUERP avec historique conservé (registre groupé par unité de travail)"""
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    style_titre = ParagraphStyle('TitreDoc', parent=styles['Title'], fontSize=18, spaceAfter=20, textColor=colors.HexColor('#333333'), alignment=TA_CENTER)
-    style_sous_titre = ParagraphStyle('SousTitre', parent=styles['Normal'], fontSize=10, textColor=colors.HexColor('#666666'), alignment=TA_CENTER)
-    style_cell_header = ParagraphStyle('CellHeader', parent=styles['Normal'], fontSize=10, fontName='Helvetica-Bold', textColor=colors.black, alignment=TA_CENTER)
-    style_cell_normal = ParagraphStyle('CellNormal', parent=styles['Normal'], fontSize=10, fontName='Helvetica', leading=12)
-    
-    elements.append(Paragraph(f"DOCUMENT UNIQUE D'ÉVALUATION DES RISQUES (DUERP) - {duerp.annee}", style_titre))
-    elements.append(Paragraph(f"<b>Entreprise :</b> {company.name} &nbsp;&nbsp;|&nbsp;&nbsp; <b>Mise à jour :</b> {duerp.date_mise_a_jour.strftime('%d/%m/%Y')}", style_sous_titre))
-    elements.append(Spacer(1, 25))
-    
-    headers = [Paragraph('Unité / Tâche', style_cell_header), Paragraph('Risque Identifié', style_cell_header), Paragraph('G.', style_cell_header), Paragraph('Mesures de Prévention', style_cell_header), Paragraph('État', style_cell_header)]
-    data = [headers]
-    
-    for l in lignes:
-        tache = Paragraph(f"<b>{l.unite_travail}</b><br/>{l.tache}", style_cell_normal)
-        risque = Paragraph(l.risque, style_cell_normal)
-        gravite = Paragraph(str(l.gravite), ParagraphStyle('Center', parent=style_cell_normal, alignment=TA_CENTER))
-        
+
+    # Cache des paragraphes : les cellules répétées (risques, mesures types,
+    # gravité, statut) ne sont analysées et calées qu'une fois. Une clé par
+    # colonne : un paragraphe partagé a toujours la même largeur.
+    paragraphs = {}
+    def para(column, html, style="normal"):
+        key = (column, html)
+        if key not in paragraphs: paragraphs[key] = CellParagraph(html, DUERP_STYLES[style])
+        return paragraphs[key]
+
+    headers = [para(-1, title, "header") for title in DUERP_HEADERS]
+    unite_of = lambda l: l.unite_travail or "Général"  # Même libellé pour le groupe et la cellule
+
+    def row(l):
         statut_val = l.statut if l.statut else "À FAIRE"
         if statut_val == "EN COURS": statut_val = "À FAIRE"
-        
-        mesures_html = ""
-        if statut_val == "FAIT":
-            if l.mesures_realisees: mesures_html += f"<font color='#27AE60'><b>✔ ACTION TERMINÉE : {l.mesures_realisees}</b></font>"
-            else: mesures_html += f"<font color='#27AE60'><b>✔ ACTION TERMINÉE</b></font>"
-            if l.mesures_a_realiser: mesures_html += f"<br/><br/><font color='#888888' size='9'><i>(Mesure initiale prévue : {l.mesures_a_realiser})</i></font>"
-        else:
-            if l.mesures_a_realiser: mesures_html += f"<b>➔ Reste à faire :</b> {l.mesures_a_realiser}"
-            if l.mesures_realisees: mesures_html += f"<br/><br/><font color='#666666'><i>✔ Déjà réalisé : {l.mesures_realisees}</i></font>"
-            if not mesures_html: mesures_html = "<i>(Aucune mesure définie)</i>"
-
-        mesures = Paragraph(mesures_html, style_cell_normal)
         color_statut = "#27AE60" if statut_val == "FAIT" else "#C0392B"
-        statut = Paragraph(f"<font color='{color_statut}'><b>{statut_val}</b></font>", ParagraphStyle('Statut', parent=style_cell_normal, alignment=TA_CENTER))
-        data.append([tache, risque, gravite, mesures, statut])
-
-    t = Table(data, colWidths=[160, 140, 40, 360, 80], repeatRows=1)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#F0F0F0')),
-        ('LINEBELOW', (0, 0), (-1, 0), 1, colors.HexColor('#999999')),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('PADDING', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#CCCCCC')),
-        ('ALIGN', (2, 1), (2, -1), 'CENTER'),
-    ]))
-    
-    elements.append(t)
+        return [
+            para(0, f"<b>{unite_of(l)}</b><br/>{l.tache}"),
+            para(1, l.risque or ""),
+            para(2, str(l.gravite), "center"),
+            para(3, duerp_mesures_html(statut_val, l)),
+            para(4, f"<font color='{color_statut}'><b>{statut_val}</b></font>", "center"),
+        ]
+
+    # Regroupement par unité de travail (ordre de première apparition)
+    unites = {}
+    for l in lignes:
+        unites.setdefault(unite_of(l), []).append(l)
+
+    elements = [
+        Paragraph(f"DOCUMENT UNIQUE D'ÉVALUATION DES RISQUES (DUERP) - {duerp.annee}", DUERP_STYLES["titre"]),
+        Paragraph(f"<b>Entreprise :</b> {company.name} &nbsp;&nbsp;|&nbsp;&nbsp; <b>Mise à jour :</b> {duerp.date_mise_a_jour.strftime('%d/%m/%Y')}", DUERP_STYLES["sous_titre"]),
+        Spacer(1, 25),
+    ]
+    if not lignes:
+        elements.append(Table([headers], colWidths=DUERP_COL_WIDTHS, style=DUERP_TABLE_STYLE))
+    for unite, rows in unites.items():
+        # Titre gardé avec l'en-tête et les premières lignes (un keepWithNext
+        # lierait tout le premier tableau et renverrait l'unité page suivante)
+        elements.append(CondPageBreak(4*cm))
+        elements.append(Paragraph(f"{unite} ({len(rows)} risque{'s' if len(rows) > 1 else ''})", DUERP_STYLES["unite"]))
+        for i in range(0, len(rows), DUERP_CHUNK_ROWS):
+            data = [row(l) for l in rows[i:i + DUERP_CHUNK_ROWS]]
+            if i == 0:
+                elements.append(Table([headers] + data, colWidths=DUERP_COL_WIDTHS, repeatRows=1, style=DUERP_TABLE_STYLE))
+            else:
+                elements.append(DuerpChunk(headers, data))
+
     doc.build(elements)
+
+def generate_duerp_pdf(duerp, company, lignes):
+    """Variante historique : retourne un BytesIO."""
+    buffer = BytesIO()
+    write_duerp_pdf(buffer, duerp, company, lignes)
     buffer.seek(0)
     return buffer
 
@@ -541,19 +795,24 @@ def generate_duerp_pdf(duerp, company, lignes):
 # ==========================================
 
 def draw_permis_header(c, permis, chantier):
-    c.setFillColor(BRAND_RED)
-    c.rect(0, height - 3*cm, width, 3*cm, fill=1, stroke=0)
-    
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-BoldOblique", 18); c.drawString(1.5*cm, height - 1.8*cm, "Conforméo")
-    c.setFont("Helvetica", 10); c.drawString(1.5*cm, height - 2.3*cm, "Solutions QHSE Digitales")
+    # Bandeau rouge, marque, titre et cadre : form commun à tous les permis
+    def draw_static(c):
+        c.setFillColor(BRAND_RED)
+        c.rect(0, height - 3*cm, width, 3*cm, fill=1, stroke=0)
+        
+        c.setFillColor(colors.white)
+        c.setFont("Helvetica-BoldOblique", 18); c.drawString(1.5*cm, height - 1.8*cm, "Conforméo")
+        c.setFont("Helvetica", 10); c.drawString(1.5*cm, height - 2.3*cm, "Solutions QHSE Digitales")
+
+        c.setFont("Helvetica-Bold", 28); c.drawCentredString(width / 2.0, height - 1.9*cm, "PERMIS DE FEU")
+        c.setFont("Helvetica-Bold", 12); c.drawCentredString(width / 2.0, height - 2.5*cm, "Travaux par Points Chauds")
 
-    c.setFont("Helvetica-Bold", 28); c.drawCentredString(width / 2.0, height - 1.9*cm, "PERMIS DE FEU")
-    c.setFont("Helvetica-Bold", 12); c.drawCentredString(width / 2.0, height - 2.5*cm, "Travaux par Points Chauds")
+        c.setStrokeColor(colors.white); c.setLineWidth(2)
+        c.roundRect(width - 5.5*cm, height - 2.5*cm, 4*cm, 1.5*cm, 5, stroke=1, fill=0)
+        c.setFont("Helvetica-Bold", 10); c.drawRightString(width - 1.8*cm, height - 1.5*cm, "N° PERMIS")
 
-    c.setStrokeColor(colors.white); c.setLineWidth(2)
-    c.roundRect(width - 5.5*cm, height - 2.5*cm, 4*cm, 1.5*cm, 5, stroke=1, fill=0)
-    c.setFont("Helvetica-Bold", 10); c.drawRightString(width - 1.8*cm, height - 1.5*cm, "N° PERMIS")
+    use_form(c, form_name("PermisHeader"), draw_static)
+    c.setFillColor(colors.white)
     c.setFont("Helvetica-Bold", 16); c.drawRightString(width - 1.8*cm, height - 2.2*cm, str(permis.id).zfill(6))
     c.setStrokeColor(BRAND_RED)
 
@@ -664,4 +923,144 @@ def generate_permis_feu_pdf(buffer, permis, chantier):
     c.drawRightString(width - 1*cm, 0.5*cm, "Généré par Conforméo - Page 1/1")
 
     c.showPage()
-    c.save()
\ No newline at end of file
+    c.save()
+
+# ==========================================
+# 8. DOE (Dossier des Ouvrages Exécutés)
+# ==========================================
+# Le DOE recopie les PDF déjà rendus (journal, PPSPS, PdP, permis feu, PIC,
+# pièces jointes) derrière une page de garde et un sommaire cliquable.
+# Les pièces ne sont jamais redessinées ici : seules la garde et le sommaire le sont.
+
+DOE_IMAGE_BOX = (width - 4 * cm, height - 9 * cm)  # Zone image d'une page PIC / pièce jointe
+DOE_TOC_ROWS = 30  # Lignes de sommaire par page
+
+PIC_FIELDS = (
+    ("acces", "Accès"), ("clotures", "Clôtures"), ("base_vie", "Base vie"),
+    ("stockage", "Stockage"), ("dechets", "Déchets"), ("levage", "Levage"),
+    ("reseaux", "Réseaux"), ("circulations", "Circulations"), ("signalisation", "Signalisation"),
+)
+
+def draw_doe_image_page(c, chantier, titre, img, lines=(), missing="Image indisponible"):
+    """Page titrée avec une image ajustée à la page (PIC, photo/scan joint)."""
+    c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 16)
+    c.drawString(2*cm, height - 2.5*cm, titre[:70])
+
+    y = height - 3.5*cm
+    c.setFillColorRGB(0, 0, 0); c.setFont(FONT_TEXT, 9)
+    for line in lines:
+        c.drawString(2*cm, y, line[:110]); y -= 0.45*cm
+
+    if img:
+        box_w, box_h = DOE_IMAGE_BOX[0], min(DOE_IMAGE_BOX[1], y - 3*cm)
+        iw, ih = img.getSize()
+        ratio = min(box_w/iw, box_h/ih)
+        new_w, new_h = iw * ratio, ih * ratio
+        try:
+            c.drawImage(img, (width - new_w) / 2, y - 0.5*cm - new_h, width=new_w, height=new_h, mask='auto')
+        except: pass
+    else:
+        c.setFillColorRGB(*COLOR_SECONDARY); c.setFont("Helvetica-Oblique", 11)
+        c.drawCentredString(width/2, height/2, missing)
+
+    draw_footer(c, width, height, chantier, "DOE")
+    c.showPage()
+
+def generate_pic_pdf(buffer, pic, chantier, quality=DEFAULT_QUALITY):
+    """Plan d'installation de chantier : plan annoté (ou fond de plan) + consignes par zone."""
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setTitle(f"PIC - {chantier.nom}")
+    lines = [f"{label} : {getattr(pic, key)}" for key, label in PIC_FIELDS if getattr(pic, key, None)]
+    img = load_image(pic.final_url or pic.background_url, DOE_IMAGE_BOX, quality)
+    draw_doe_image_page(c, chantier, "PLAN D'INSTALLATION DE CHANTIER", img, lines)
+    c.save()
+
+def write_external_document(buffer, doc, chantier, quality=DEFAULT_QUALITY):
+    """Pièce jointe (DocExterne) : PDF recopié tel quel, image mise en page, sinon page de renvoi."""
+    raw = get_file_bytes(doc.url)
+    if raw and raw.lstrip()[:5] == b"%PDF-":
+        try:
+            if len(PdfReader(BytesIO(raw)).pages):
+                buffer.write(raw)
+                return
+        except Exception as e:
+            print(f"❌ PDF joint illisible ({doc.url}): {e}")
+
+    img = None
+    if raw:
+        try:
+            img = prepare_image(raw, DOE_IMAGE_BOX, quality, transpose=True)
+        except Exception:
+            pass  # Ni PDF ni image : page de renvoi vers le fichier
+
+    c = canvas.Canvas(buffer, pagesize=A4)
+    c.setTitle(doc.titre or "Document")
+    lines = [f"Catégorie : {doc.categorie}"] if doc.categorie else []
+    draw_doe_image_page(c, chantier, doc.titre or "Document", img, lines, missing=f"Fichier consultable en ligne : {doc.url}")
+    c.save()
+
+def draw_doe_toc(c, chantier, parts, starts):
+    """Sommaire (rubrique, titre, page). Retourne les liens [(page, rect, page cible)]."""
+    links = []
+    rows = []
+    for (section, titre, _), start in zip(parts, starts):
+        if not rows or rows[-1][0] != section: rows.append((section, None, start))
+        rows.append((section, titre, start))
+
+    for index in range(0, len(rows), DOE_TOC_ROWS):
+        page_index = c.getPageNumber() - 1
+        c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 18)
+        c.drawString(2*cm, height - 3*cm, "SOMMAIRE")
+        y = height - 4.5*cm
+        for section, titre, start in rows[index:index + DOE_TOC_ROWS]:
+            if titre is None:
+                y -= 0.2*cm
+                c.setFillColorRGB(*COLOR_PRIMARY); c.setFont(FONT_TITLE, 12)
+                c.drawString(2*cm, y, section)
+            else:
+                c.setFillColorRGB(0, 0, 0); c.setFont(FONT_TEXT, 10)
+                c.drawString(2.6*cm, y, titre[:80])
+                c.drawRightString(width - 2*cm, y, str(start))
+                links.append((page_index, (2.5*cm, y - 0.15*cm, width - 2*cm, y + 0.45*cm), start - 1))
+            y -= 0.7*cm
+        draw_footer(c, width, height, chantier, "DOE")
+        c.showPage()
+    return links
+
+def write_doe_pdf(buffer, chantier, company, parts, quality=DEFAULT_QUALITY):
+    """
+    `parts` : [(rubrique, titre, PdfBlob)] déjà rendus, dans l'ordre du dossier.
+    Garde + sommaire, puis chaque pièce recopiée, avec signets par rubrique.
+    """
+    handles = [blob.open() for _, _, blob in parts]
+    try:
+        readers = [PdfReader(h) for h in handles]
+        # Nombre de pages du sommaire : une ligne par pièce + une par rubrique
+        rows = len(parts) + len({section for section, _, _ in parts})
+        toc_pages = max(1, -(-rows // DOE_TOC_ROWS))
+        starts, page = [], 2 + toc_pages
+        for reader in readers:
+            starts.append(page); page += len(reader.pages)
+
+        head = BytesIO()
+        c = canvas.Canvas(head, pagesize=A4)
+        c.setTitle(f"DOE - {chantier.nom}")
+        draw_cover_page(c, chantier, "DOSSIER DES OUVRAGES EXÉCUTÉS", "D.O.E - Dossier de fin de chantier", company, quality=quality)
+        links = draw_doe_toc(c, chantier, parts, starts)
+        c.save()
+
+        writer = PdfWriter()
+        writer.append(PdfReader(head), import_outline=False)
+        writer.add_outline_item("Sommaire", 1)
+        sections = {}
+        for (section, titre, _), reader, start in zip(parts, readers, starts):
+            writer.append(reader, import_outline=False)
+            if section not in sections:
+                sections[section] = writer.add_outline_item(section, start - 1)
+            writer.add_outline_item(titre, start - 1, parent=sections[section])
+        for page_index, rect, target in links:
+            writer.add_annotation(page_index, Link(rect=rect, target_page_index=target))
+        writer.page_mode = "/UseOutlines"
+        writer.write(buffer)
+    finally:
+        for h in handles: h.close()
@@ -0,0 +1,158 @@
+import os
+import re
+import json
+import asyncio
+import hashlib
+import zipfile
+from datetime import datetime, time
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+from . import pdf_documents, pdf_executor
+from .pdf_spool import STREAM_CHUNK_SIZE
+
+# ==========================================
+# ARCHIVE ZIP DE L'ENTREPRISE (Avant audit)
+# ==========================================
+# Tous les PDF réglementaires (journaux, PPSPS, PdP, permis feu, DUERP) dans un
+# ZIP construit au fil de l'eau : chaque entrée est envoyée dès qu'elle est
+# écrite, l'archive complète n'existe jamais en mémoire. Les rendus tournent en
+# parallèle dans le pool (et réutilisent le cache PDF) ; l'ordre reste stable.
+
+PDF_ARCHIVE_CONCURRENCY = int(os.getenv("PDF_ARCHIVE_CONCURRENCY", str(max(pdf_executor.PDF_RENDER_PROCESSES, 1) * 2)))
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9]+", "_", text or "").strip("_")[:60] or "sans_nom"
+
+
+def list_archive_documents(db, company_id, date_from=None, date_to=None):
+    """
+    [(doc_type, entity_id, dossier)] de l'entreprise, dans l'ordre de l'archive.
+    Avec une période : documents datés dans la période, journaux des chantiers
+    ayant au moins un rapport dans la période.
+    """
+    start = datetime.combine(date_from, time.min) if date_from else None
+    end = datetime.combine(date_to, time.max) if date_to else None
+
+    def in_period(query, column):
+        if start: query = query.filter(column >= start)
+        if end: query = query.filter(column <= end)
+        return query
+
+    refs = []
+    chantiers = db.query(models.Chantier.id, models.Chantier.nom).filter(models.Chantier.company_id == company_id).order_by(models.Chantier.id).all()
+    for cid, nom in chantiers:
+        folder = f"{cid}_{_slug(nom)}"
+        rapports = in_period(db.query(models.Rapport.id).filter(models.Rapport.chantier_id == cid), models.Rapport.date_creation)
+        if rapports.first(): refs.append(("journal", cid, folder))
+        for model, doc_type, column in (
+            (models.PPSPS, "ppsps", models.PPSPS.date_creation),
+            (models.PlanPrevention, "pdp", models.PlanPrevention.date_creation),
+            (models.PermisFeu, "permis_feu", models.PermisFeu.date),
+        ):
+            query = in_period(db.query(model.id).filter(model.chantier_id == cid), column)
+            refs += [(doc_type, doc_id, folder) for (doc_id,) in query.order_by(model.id).all()]
+
+    duerps = in_period(db.query(models.DUERP.id).filter(models.DUERP.company_id == company_id), models.DUERP.date_mise_a_jour)
+    refs += [("duerp", doc_id, "DUERP") for (doc_id,) in duerps.order_by(models.DUERP.id).all()]
+    return refs
+
+
+class _ZipStream:
+    """Destination non "seekable" de zipfile : on récupère les octets au fur et à mesure."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_company_archive(company_id, date_from=None, date_to=None, session_factory=SessionLocal):
+    """Générateur asynchrone des octets du ZIP (à passer à une StreamingResponse)."""
+    db = session_factory(info={"route_class": "pdf"})
+    sink = _ZipStream()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+    manifest = {
+        "company_id": company_id, "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "date_from": date_from.isoformat() if date_from else None, "date_to": date_to.isoformat() if date_to else None,
+        "documents": [], "errors": [],
+    }
+    pending = []  # Fenêtre de rendus en cours, dans l'ordre de l'archive
+
+    try:
+        refs = await run_in_threadpool(list_archive_documents, db, company_id, date_from, date_to)
+
+        async def flush_oldest():
+            ref, doc, task = pending.pop(0)
+            doc_type, entity_id, folder = ref
+            try:
+                blob, temporary = await task
+                handle = blob.open()
+            except Exception as e:
+                print(f"⚠️ Archive : {doc_type} #{entity_id} : {e}")
+                manifest["errors"].append({"type": doc_type, "id": entity_id, "error": str(e)})
+                return
+
+            path = f"{folder}/{doc.filename}"
+            info = zipfile.ZipInfo(path, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            digest = hashlib.sha256()
+            try:
+                with archive.open(info, "w", force_zip64=blob.size > zipfile.ZIP64_LIMIT) as entry:
+                    while True:
+                        chunk = await run_in_threadpool(handle.read, STREAM_CHUNK_SIZE)
+                        if not chunk: break
+                        digest.update(chunk)
+                        entry.write(chunk)
+                        yield sink.drain()
+            finally:
+                handle.close()
+                if temporary: blob.discard()
+            yield sink.drain()
+            manifest["documents"].append({
+                "path": path, "type": doc_type, "id": entity_id, "size": blob.size,
+                "sha256": digest.hexdigest(), "version": doc.fingerprint,
+            })
+
+        for ref in refs:
+            # Lecture SQL séquentielle (une session n'est pas thread-safe), rendus en parallèle
+            doc = await run_in_threadpool(pdf_documents.DOCUMENT_BUILDERS[ref[0]], db, ref[1])
+            if doc is None: continue
+            pending.append((ref, doc, asyncio.ensure_future(pdf_documents.get_pdf_blob_async(doc))))
+            if len(pending) >= PDF_ARCHIVE_CONCURRENCY:
+                async for data in flush_oldest():
+                    if data: yield data
+            db.expunge_all()  # Mémoire bornée même pour des centaines de chantiers
+
+        while pending:
+            async for data in flush_oldest():
+                if data: yield data
+
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2, ensure_ascii=False))
+        archive.close()
+        yield sink.drain()
+    finally:
+        # Client parti en cours de route : on n'attend plus les rendus restants
+        for _, _, task in pending:
+            task.cancel()
+            if task.done() and not task.cancelled() and task.exception() is None:
+                blob, temporary = task.result()
+                if temporary: blob.discard()
+        db.close()
@@ -0,0 +1,214 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .. import models
+from .pdf_spool import PdfBlob
+
+# ==========================================
+# CACHE DES PDF RENDUS (Journal, PPSPS, PdP, Permis feu...)
+# ==========================================
+# Un document est identifié par (type, id, qualité) : un aperçu brouillon et un
+# export impression coexistent sans s'évincer. On ne garde que la dernière
+# version rendue, reconnue par son empreinte (contenu des lignes SQL + enfants).
+# L'empreinte sert aussi d'ETag HTTP. Les gros PDF restent sur disque (fichier
+# spoolé, cf. pdf_spool) : seuls les petits occupent la mémoire.
+
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "128")) * 1024 * 1024
+PDF_CACHE_DISK_MAX_BYTES = int(os.getenv("PDF_CACHE_DISK_MAX_MB", "1024")) * 1024 * 1024
+
+# À incrémenter quand la mise en page des générateurs change (invalide tout)
+RENDER_VERSION = "1"
+
+
+def row_signature(obj):
+    """Valeurs de toutes les colonnes d'une ligne ORM (None si pas de ligne)."""
+    if obj is None: return None
+    return tuple((attr.key, getattr(obj, attr.key)) for attr in inspect(obj).mapper.column_attrs)
+
+
+def compute_fingerprint(doc_type, *parts):
+    """
+    Empreinte de version d'un document.
+    La date du jour en fait partie car la page de garde affiche "Édité le ...".
+    """
+    h = hashlib.sha256()
+    h.update(repr((RENDER_VERSION, doc_type, date.today().isoformat())).encode("utf-8"))
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+class PdfCache:
+    def __init__(self, max_bytes, max_disk_bytes=PDF_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        # (doc_type, entity_id, qualité) -> {"fingerprint", "blob", "chantier_id", "company_id"}
+        self._entries = OrderedDict()
+        self._total = 0        # Octets en mémoire
+        self._disk_total = 0   # Octets des fichiers spoolés
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, doc_type, entity_id, fingerprint, quality=None):
+        """PdfBlob en cache pour cette version, sinon None."""
+        key = (doc_type, entity_id, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["fingerprint"] == fingerprint:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry["blob"]
+            self.stats["misses"] += 1
+            return None
+
+    def checkout(self, doc_type, entity_id, fingerprint, quality=None):
+        """
+        (PdfBlob, temporaire) pour cette version, sinon None. Un PDF sur disque est
+        épinglé sous verrou (PdfBlob.pin) : une éviction ou un nettoyage ne peut plus
+        le faire disparaître avant sa lecture ; la copie est à supprimer après usage.
+        """
+        key = (doc_type, entity_id, quality)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["fingerprint"] == fingerprint:
+                blob = entry["blob"]
+                try:
+                    pinned = blob.pin()
+                except FileNotFoundError:
+                    self._pop(key)  # Fichier supprimé hors du cache (nettoyage du spool)
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return pinned, pinned is not blob
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, doc_type, entity_id, fingerprint, blob, chantier_id=None, company_id=None, quality=None):
+        """Mémorise un PdfBlob. False s'il est trop gros : l'appelant reste responsable de son fichier."""
+        key = (doc_type, entity_id, quality)
+        if blob.size > (self.max_disk_bytes if blob.on_disk else self.max_bytes): return False
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = {"fingerprint": fingerprint, "blob": blob, "chantier_id": chantier_id, "company_id": company_id}
+            if blob.on_disk: self._disk_total += blob.size
+            else: self._total += blob.size
+            while (self._total > self.max_bytes or self._disk_total > self.max_disk_bytes) and self._entries:
+                self._pop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            return key in self._entries
+
+    def store(self, doc_type, entity_id, fingerprint, blob, chantier_id=None, company_id=None, quality=None):
+        """
+        put() d'un PDF tout juste rendu -> (PdfBlob, temporaire) lisible par l'appelant :
+        épinglé avant d'entrer dans le cache, qui peut l'évincer aussitôt.
+        """
+        pinned = blob.pin()
+        if self.put(doc_type, entity_id, fingerprint, blob, chantier_id, company_id, quality):
+            return pinned, pinned is not blob
+        if pinned is not blob: pinned.discard()
+        return blob, blob.on_disk
+
+    def get_or_render(self, doc_type, entity_id, fingerprint, render, chantier_id=None, company_id=None, quality=None):
+        """Retourne les octets en cache, sinon appelle `render()` (-> bytes) et mémorise le résultat."""
+        blob = self.get(doc_type, entity_id, fingerprint, quality)
+        if blob is not None:
+            try:
+                return blob.read()
+            except FileNotFoundError:
+                pass  # Fichier évincé entre-temps : on refait le rendu
+        data = render()
+        self.put(doc_type, entity_id, fingerprint, PdfBlob.from_bytes(data), chantier_id, company_id, quality)
+        return data
+
+    def _pop(self, key):
+        """À appeler sous verrou. Le fichier d'une entrée sur disque est supprimé
+        (une réponse en cours de lecture garde son descripteur ouvert)."""
+        entry = self._entries.pop(key, None)
+        if entry:
+            blob = entry["blob"]
+            if blob.on_disk:
+                self._disk_total -= blob.size
+                blob.discard()
+            else:
+                self._total -= blob.size
+        return entry
+
+    def _invalidate_where(self, predicate):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if predicate(k, e)]:
+                self._pop(key)
+                self.stats["invalidations"] += 1
+
+    def invalidate(self, doc_type, entity_id):
+        """Toutes les qualités du document."""
+        self._invalidate_where(lambda k, e: k[:2] == (doc_type, entity_id))
+
+    def invalidate_chantier(self, chantier_id):
+        self._invalidate_where(lambda k, e: e["chantier_id"] == chantier_id)
+
+    def invalidate_company(self, company_id):
+        self._invalidate_where(lambda k, e: e["company_id"] == company_id)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._pop(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats, "entries": len(self._entries), "size_bytes": self._total, "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_total, "max_disk_bytes": self.max_disk_bytes
+            }
+
+
+pdf_cache = PdfCache(PDF_CACHE_MAX_BYTES)
+
+
+# ==========================================
+# INVALIDATION AUTOMATIQUE (après chaque flush SQLAlchemy)
+# ==========================================
+# L'empreinte suffit à ne jamais servir un PDF périmé ; l'invalidation
+# libère simplement la mémoire dès qu'une ligne source est modifiée.
+
+# Ligne -> document qu'elle alimente (clé de cache), pour n'invalider que lui :
+# le DOE du chantier réutilise alors toutes les autres pièces telles quelles.
+CHANTIER_DOCUMENTS = {
+    models.PPSPS: "ppsps", models.PlanPrevention: "pdp", models.PermisFeu: "permis_feu",
+    models.PIC: "pic", models.DocExterne: "doc_externe",
+}
+
+def invalidate_chantier_document(doc_type, entity_id, chantier_id):
+    pdf_cache.invalidate(doc_type, entity_id)
+    pdf_cache.invalidate("doe", chantier_id)
+
+def invalidate_for(session, obj):
+    if isinstance(obj, models.Chantier):
+        pdf_cache.invalidate_chantier(obj.id)
+    elif type(obj) in CHANTIER_DOCUMENTS:
+        invalidate_chantier_document(CHANTIER_DOCUMENTS[type(obj)], obj.id, obj.chantier_id)
+    elif isinstance(obj, (models.Rapport, models.Inspection)):
+        invalidate_chantier_document("journal", obj.chantier_id, obj.chantier_id)
+    elif isinstance(obj, models.RapportImage):
+        # On ne déclenche pas de requête ici : le rapport doit être en session
+        rapport = session.identity_map.get(inspect(models.Rapport).identity_key_from_primary_key((obj.rapport_id,)))
+        if rapport is not None: invalidate_chantier_document("journal", rapport.chantier_id, rapport.chantier_id)
+    elif isinstance(obj, models.Company):
+        pdf_cache.invalidate_company(obj.id)
+    elif isinstance(obj, models.DUERP):
+        pdf_cache.invalidate("duerp", obj.id)
+    elif isinstance(obj, models.DUERPLigne):
+        pdf_cache.invalidate("duerp", obj.duerp_id)
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_after_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        try:
+            invalidate_for(session, obj)
+        except Exception as e:
+            print(f"⚠️ Invalidation cache PDF: {e}")
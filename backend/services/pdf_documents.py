@@ -0,0 +1,323 @@
+import os
+import time
+import threading
+from io import BytesIO
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, selectinload
+
+from .. import models
+from . import pdf as pdf_service
+from . import pdf_executor
+from .pdf_images import DEFAULT_QUALITY
+from .pdf_spool import PdfBlob, SpooledPdfFile
+from .pdf_cache import pdf_cache, compute_fingerprint, row_signature
+
+# ==========================================
+# SOURCES DES DOCUMENTS PDF (Données + empreinte + rendu)
+# ==========================================
+# Chaque fonction charge les lignes nécessaires, calcule l'empreinte de version
+# SANS rien dessiner, et décrit le rendu à faire seulement en cas de besoin.
+
+class PdfDocument(NamedTuple):
+    doc_type: str
+    entity_id: int
+    fingerprint: str
+    filename: str
+    spec: tuple  # (générateur, args, kwargs) en données simples : envoyable à un autre processus
+    chantier_id: Optional[int] = None
+    company_id: Optional[int] = None
+
+    @property
+    def etag(self):
+        return f'"{self.fingerprint}"'
+
+    @property
+    def quality(self):
+        return self.spec[2].get("quality", DEFAULT_QUALITY)
+
+    def render(self, progress=None):
+        """Rendu dans le processus courant."""
+        return render_spec(self.spec, progress)
+
+
+# ==========================================
+# DONNÉES SIMPLES (Pas d'objets ORM entre processus)
+# ==========================================
+# Les générateurs ne font que lire des attributs : on leur passe des Records
+# reconstruits à partir de dicts, sans session ni lazy-load possible.
+
+class Record(SimpleNamespace):
+    pass
+
+class PlainRow(dict):
+    """Ligne sérialisée (à distinguer des colonnes JSON, qui restent des dicts)."""
+
+def to_plain(obj, **relations):
+    """Ligne ORM -> PlainRow des colonnes (+ relations demandées, ex: images=True)."""
+    if obj is None: return None
+    data = PlainRow((attr.key, getattr(obj, attr.key)) for attr in inspect(obj).mapper.column_attrs)
+    for name, sub in relations.items():
+        sub = sub if isinstance(sub, dict) else {}
+        value = getattr(obj, name)
+        if isinstance(value, (list, tuple)):
+            data[name] = [to_plain(v, **sub) for v in value]
+        else:
+            data[name] = to_plain(value, **sub)
+    return data
+
+def to_record(value):
+    """PlainRow -> Record (accès par attribut), récursivement."""
+    if isinstance(value, PlainRow): return Record(**{k: to_record(v) for k, v in value.items()})
+    if isinstance(value, list): return [to_record(v) for v in value]
+    return value
+
+def write_spec(out, spec, progress=None, executor=None):
+    """Rendu d'une spec dans `out`. `executor` : pool où répartir les shards d'un journal."""
+    generator_name, args, kwargs = spec
+    if generator_name == "generate_journal_pdf":
+        kwargs = {**kwargs, "progress": progress}
+        if executor is not None:
+            kwargs.update(executor=executor, max_shards=pdf_executor.PDF_RENDER_PROCESSES)
+    getattr(pdf_service, generator_name)(out, *[to_record(a) for a in args], **kwargs)
+
+def render_spec(spec, progress=None, executor=None):
+    """Rendu en mémoire -> bytes (jobs asynchrones, préchauffage)."""
+    buffer = BytesIO()
+    write_spec(buffer, spec, progress, executor)
+    return buffer.getvalue()
+
+def spool_spec(spec, executor=None):
+    """Rendu dans un fichier spoolé -> PdfBlob (mémoire bornée, réponses HTTP)."""
+    out = SpooledPdfFile()
+    try:
+        write_spec(out, spec, executor=executor)
+    except BaseException:
+        out.abort()
+        raise
+    return out.finish()
+
+
+def load_chantier(db, cid):
+    """Chantier + entreprise (logo, en-têtes) en une requête."""
+    if cid is None: return None
+    return db.query(models.Chantier).options(joinedload(models.Chantier.company)).filter(models.Chantier.id == cid).first()
+
+
+def journal_document(db, cid, quality=DEFAULT_QUALITY):
+    chantier = load_chantier(db, cid)
+    if not chantier: return None
+
+    rapports = (
+        db.query(models.Rapport).options(selectinload(models.Rapport.images))
+        .filter(models.Rapport.chantier_id == cid).order_by(models.Rapport.date_creation.desc()).all()
+    )
+    fingerprint = compute_fingerprint(
+        "journal", quality,
+        row_signature(chantier), row_signature(chantier.company),
+        [(row_signature(r), [row_signature(i) for i in r.images]) for r in rapports]
+    )
+    return PdfDocument(
+        "journal", cid, fingerprint, f"Journal_{cid}.pdf",
+        ("generate_journal_pdf", (to_plain(chantier, company=True), [to_plain(r, images=True) for r in rapports]), {"quality": quality}),
+        chantier_id=cid, company_id=chantier.company_id
+    )
+
+
+def ppsps_document(db, doc_id, quality=DEFAULT_QUALITY):
+    doc = db.query(models.PPSPS).filter(models.PPSPS.id == doc_id).first()
+    if not doc: return None
+
+    chantier = load_chantier(db, doc.chantier_id)
+    fingerprint = compute_fingerprint(
+        "ppsps", quality, row_signature(doc), row_signature(chantier), row_signature(chantier.company if chantier else None)
+    )
+    return PdfDocument(
+        "ppsps", doc_id, fingerprint, f"PPSPS_{doc_id}.pdf",
+        ("generate_ppsps_pdf", (to_plain(doc), to_plain(chantier, company=True)), {"quality": quality}),
+        chantier_id=doc.chantier_id, company_id=chantier.company_id if chantier else None
+    )
+
+
+def pdp_document(db, pdp_id, quality=DEFAULT_QUALITY):
+    pdp = db.query(models.PlanPrevention).filter(models.PlanPrevention.id == pdp_id).first()
+    if not pdp: return None
+
+    chantier = load_chantier(db, pdp.chantier_id)
+    fingerprint = compute_fingerprint(
+        "pdp", quality, row_signature(pdp), row_signature(chantier), row_signature(chantier.company if chantier else None)
+    )
+    return PdfDocument(
+        "pdp", pdp_id, fingerprint, f"PDP_{pdp_id}.pdf",
+        ("generate_pdp_pdf", (to_plain(pdp), to_plain(chantier, company=True)), {"quality": quality}),
+        chantier_id=pdp.chantier_id, company_id=chantier.company_id if chantier else None
+    )
+
+
+def permis_feu_document(db, permis_id, quality=DEFAULT_QUALITY):
+    permis = db.query(models.PermisFeu).filter(models.PermisFeu.id == permis_id).first()
+    if not permis: return None
+
+    chantier = db.query(models.Chantier).filter(models.Chantier.id == permis.chantier_id).first()
+    fingerprint = compute_fingerprint("permis_feu", row_signature(permis), row_signature(chantier))
+    return PdfDocument(
+        "permis_feu", permis_id, fingerprint, f"Permis_Feu_{permis_id}.pdf",
+        ("generate_permis_feu_pdf", (to_plain(permis), to_plain(chantier)), {}),
+        chantier_id=permis.chantier_id, company_id=chantier.company_id if chantier else None
+    )
+
+
+def duerp_document(db, duerp_id, quality=DEFAULT_QUALITY):
+    duerp = db.query(models.DUERP).filter(models.DUERP.id == duerp_id).first()
+    if not duerp: return None
+
+    company = db.query(models.Company).filter(models.Company.id == duerp.company_id).first()
+    lignes = db.query(models.DUERPLigne).filter(models.DUERPLigne.duerp_id == duerp_id).order_by(models.DUERPLigne.id).all()
+    fingerprint = compute_fingerprint("duerp", row_signature(duerp), row_signature(company), [row_signature(l) for l in lignes])
+    return PdfDocument(
+        "duerp", duerp_id, fingerprint, f"DUERP_{duerp.annee or duerp_id}.pdf",
+        ("write_duerp_pdf", (to_plain(duerp), to_plain(company), [to_plain(l) for l in lignes]), {}),
+        company_id=duerp.company_id
+    )
+
+
+def pic_document(db, pic_id, quality=DEFAULT_QUALITY):
+    pic = db.query(models.PIC).filter(models.PIC.id == pic_id).first()
+    if not pic: return None
+
+    chantier = db.query(models.Chantier).filter(models.Chantier.id == pic.chantier_id).first()
+    fingerprint = compute_fingerprint("pic", quality, row_signature(pic), row_signature(chantier))
+    return PdfDocument(
+        "pic", pic_id, fingerprint, f"PIC_{pic_id}.pdf",
+        ("generate_pic_pdf", (to_plain(pic), to_plain(chantier)), {"quality": quality}),
+        chantier_id=pic.chantier_id, company_id=chantier.company_id if chantier else None
+    )
+
+
+def doc_externe_document(db, doc_id, quality=DEFAULT_QUALITY):
+    doc = db.query(models.DocExterne).filter(models.DocExterne.id == doc_id).first()
+    if not doc: return None
+
+    # Le fichier derrière l'URL n'est pas versionné : une nouvelle version = une nouvelle URL
+    chantier = db.query(models.Chantier).filter(models.Chantier.id == doc.chantier_id).first()
+    fingerprint = compute_fingerprint("doc_externe", quality, row_signature(doc), row_signature(chantier))
+    return PdfDocument(
+        "doc_externe", doc_id, fingerprint, f"Document_{doc_id}.pdf",
+        ("write_external_document", (to_plain(doc), to_plain(chantier)), {"quality": quality}),
+        chantier_id=doc.chantier_id, company_id=chantier.company_id if chantier else None
+    )
+
+
+# Type de document -> constructeur (utilisé par les jobs asynchrones)
+DOCUMENT_BUILDERS = {
+    "journal": journal_document,
+    "ppsps": ppsps_document,
+    "pdp": pdp_document,
+    "permis_feu": permis_feu_document,
+    "duerp": duerp_document,
+}
+
+
+# Type de document -> table de l'entité (company_id direct, sinon via son chantier)
+DOCUMENT_MODELS = {
+    "journal": models.Chantier,
+    "ppsps": models.PPSPS,
+    "pdp": models.PlanPrevention,
+    "permis_feu": models.PermisFeu,
+    "duerp": models.DUERP,
+}
+
+def document_company_id(db, doc_type, entity_id):
+    """Entreprise propriétaire d'un document (None si introuvable), sans charger son contenu."""
+    model = DOCUMENT_MODELS[doc_type]
+    if hasattr(model, "company_id"):
+        query = db.query(model.company_id)
+    else:
+        query = db.query(models.Chantier.company_id).join(model, model.chantier_id == models.Chantier.id)
+    row = query.filter(model.id == entity_id).first()
+    return row[0] if row else None
+
+
+def get_pdf_bytes(doc: PdfDocument, executor=None):
+    """
+    Octets du PDF : depuis le cache si la version n'a pas changé, sinon rendu
+    (processus courant, ou `executor` pour les threads de fond hors boucle asyncio).
+    """
+    render = doc.render
+    if executor is not None:
+        render = lambda: executor.submit(render_spec, doc.spec).result(timeout=pdf_executor.PDF_RENDER_TIMEOUT)
+    return pdf_cache.get_or_render(
+        doc.doc_type, doc.entity_id, doc.fingerprint, render,
+        chantier_id=doc.chantier_id, company_id=doc.company_id, quality=doc.quality
+    )
+
+async def get_pdf_blob_async(doc: PdfDocument):
+    """
+    (PdfBlob, temporaire) : depuis le cache, sinon rendu spoolé dans le pool de
+    processus (la boucle reste libre). `temporaire` : fichier propre à l'appelant
+    (copie épinglée ou PDF non gardé en cache), à supprimer après usage.
+    """
+    cached = pdf_cache.checkout(doc.doc_type, doc.entity_id, doc.fingerprint, doc.quality)
+    if cached is not None:
+        return cached
+
+    if doc.spec[0] == "generate_journal_pdf":
+        # Gros journaux : shards rendus en parallèle dans le pool puis recollés
+        blob = await pdf_executor.run_sharded(spool_spec, doc.spec, on_abandon=PdfBlob.discard)
+    else:
+        blob = await pdf_executor.run(spool_spec, doc.spec, on_abandon=PdfBlob.discard)
+    return pdf_cache.store(doc.doc_type, doc.entity_id, doc.fingerprint, blob, doc.chantier_id, doc.company_id, doc.quality)
+
+
+# ==========================================
+# PRÉCHAUFFAGE NOCTURNE (Chantiers actifs)
+# ==========================================
+# Optionnel : PDF_CACHE_WARMUP_HOUR=3 pour pré-rendre chaque nuit à 3h
+# les journaux, PPSPS et PdP des chantiers actifs (est_actif).
+
+PDF_CACHE_WARMUP_HOUR = os.getenv("PDF_CACHE_WARMUP_HOUR")
+
+def warm_active_chantiers(db):
+    """Rend (ou confirme en cache) les documents de tous les chantiers actifs."""
+    count = 0
+    chantier_ids = [cid for (cid,) in db.query(models.Chantier.id).filter(models.Chantier.est_actif == True).all()]
+    for cid in chantier_ids:
+        docs = [journal_document(db, cid)]
+        docs += [ppsps_document(db, pid) for (pid,) in db.query(models.PPSPS.id).filter(models.PPSPS.chantier_id == cid).all()]
+        docs += [pdp_document(db, pid) for (pid,) in db.query(models.PlanPrevention.id).filter(models.PlanPrevention.chantier_id == cid).all()]
+        for doc in docs:
+            if doc is None: continue
+            try:
+                get_pdf_bytes(doc); count += 1
+            except Exception as e:
+                print(f"⚠️ Préchauffage PDF {doc.doc_type} #{doc.entity_id}: {e}")
+        db.expunge_all()  # Libère la mémoire de la session entre deux chantiers
+    return count
+
+def _seconds_until(hour):
+    now = datetime.now()
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now: target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+def start_nightly_warmup(session_factory):
+    """Lance le thread de préchauffage si PDF_CACHE_WARMUP_HOUR est défini."""
+    if PDF_CACHE_WARMUP_HOUR is None: return None
+    hour = int(PDF_CACHE_WARMUP_HOUR)
+
+    def loop():
+        while True:
+            time.sleep(_seconds_until(hour))
+            db = session_factory()
+            try:
+                print(f"🌙 Préchauffage PDF : {warm_active_chantiers(db)} documents prêts")
+            except Exception as e:
+                print(f"❌ Préchauffage PDF : {e}")
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=loop, name="pdf-cache-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,93 @@
+import asyncio
+from typing import NamedTuple, Optional
+
+from .. import models
+from . import pdf_executor
+from .pdf_cache import pdf_cache, compute_fingerprint, row_signature
+from .pdf_documents import (
+    to_plain, spool_spec, get_pdf_blob_async, load_chantier,
+    journal_document, ppsps_document, pdp_document, permis_feu_document, pic_document, doc_externe_document
+)
+from .pdf_images import DEFAULT_QUALITY
+from .pdf_spool import PdfBlob
+
+# ==========================================
+# DOE : DOSSIER DES OUVRAGES EXÉCUTÉS (PDF unique)
+# ==========================================
+# Chaque pièce (journal, PPSPS, PdP, permis, PIC, pièces jointes) est un
+# document à part entière, avec sa propre entrée de cache et son empreinte.
+# Le DOE ne fait que recoller les PDF des pièces : après un nouveau rapport,
+# seul le journal est re-rendu, les autres pièces sont reprises telles quelles.
+
+class DoeDocument(NamedTuple):
+    entity_id: int  # id du chantier
+    fingerprint: str
+    filename: str
+    chantier: dict
+    company: Optional[dict]
+    parts: list  # [(rubrique, titre, PdfDocument)]
+    quality: str = DEFAULT_QUALITY
+    chantier_id: Optional[int] = None
+    company_id: Optional[int] = None
+    doc_type: str = "doe"
+
+    @property
+    def etag(self):
+        return f'"{self.fingerprint}"'
+
+
+def doe_document(db, cid, quality=DEFAULT_QUALITY):
+    chantier = load_chantier(db, cid)
+    if not chantier: return None
+
+    def ids(model, order_by):
+        return [i for (i,) in db.query(model.id).filter(model.chantier_id == cid).order_by(order_by, model.id).all()]
+
+    parts = []
+    journal = journal_document(db, cid, quality)
+    if journal.spec[1][1]:  # Au moins un rapport
+        parts.append(("Journal de bord", "Journal de bord du chantier", journal))
+    for pid in ids(models.PPSPS, models.PPSPS.date_creation):
+        parts.append(("Sécurité", f"PPSPS n°{pid}", ppsps_document(db, pid, quality)))
+    for pid in ids(models.PlanPrevention, models.PlanPrevention.date_creation):
+        parts.append(("Sécurité", f"Plan de prévention n°{pid}", pdp_document(db, pid, quality)))
+    for pid in ids(models.PermisFeu, models.PermisFeu.date):
+        parts.append(("Sécurité", f"Permis de feu n°{pid}", permis_feu_document(db, pid)))
+    for pid in ids(models.PIC, models.PIC.id):
+        parts.append(("Plan d'installation", "Plan d'installation de chantier (PIC)", pic_document(db, pid, quality)))
+    docs = db.query(models.DocExterne).filter(models.DocExterne.chantier_id == cid).order_by(models.DocExterne.categorie, models.DocExterne.date_ajout, models.DocExterne.id).all()
+    for doc in docs:
+        section = f"Documents - {doc.categorie}" if doc.categorie else "Documents"
+        parts.append((section, doc.titre or f"Document n°{doc.id}", doc_externe_document(db, doc.id, quality)))
+
+    # Empreinte du DOE = empreintes des pièces (et de leur ordre)
+    fingerprint = compute_fingerprint(
+        "doe", quality, row_signature(chantier), row_signature(chantier.company),
+        [(section, titre, doc.doc_type, doc.entity_id, doc.fingerprint) for section, titre, doc in parts]
+    )
+    return DoeDocument(
+        cid, fingerprint, f"DOE_{cid}.pdf", to_plain(chantier), to_plain(chantier.company), parts,
+        quality=quality, chantier_id=cid, company_id=chantier.company_id
+    )
+
+
+async def get_doe_blob_async(doe: DoeDocument):
+    """(PdfBlob, temporaire) du DOE : pièces depuis le cache (ou rendues en parallèle), puis assemblage."""
+    cached = pdf_cache.checkout("doe", doe.entity_id, doe.fingerprint, doe.quality)
+    if cached is not None:
+        return cached
+
+    results = await asyncio.gather(*(get_pdf_blob_async(doc) for _, _, doc in doe.parts), return_exceptions=True)
+    temporaries = [r[0] for r in results if not isinstance(r, BaseException) and r[1]]
+    try:
+        for (_, titre, _), result in zip(doe.parts, results):
+            if isinstance(result, BaseException):
+                print(f"❌ DOE chantier #{doe.entity_id} : pièce '{titre}' : {result}")
+                raise result
+        parts = [(section, titre, result[0]) for (section, titre, _), result in zip(doe.parts, results)]
+        spec = ("write_doe_pdf", (doe.chantier, doe.company, parts), {"quality": doe.quality})
+        blob = await pdf_executor.run(spool_spec, spec, on_abandon=PdfBlob.discard)
+    finally:
+        for part in temporaries: part.discard()
+
+    return pdf_cache.store("doe", doe.entity_id, doe.fingerprint, blob, doe.chantier_id, doe.company_id, doe.quality)
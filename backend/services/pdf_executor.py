@@ -0,0 +1,156 @@
+import os
+import sys
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# ==========================================
+# POOL DE PROCESSUS POUR LE RENDU PDF (Hors de la boucle asyncio)
+# ==========================================
+# reportlab est du pur Python qui tient le GIL : rendu dans le processus de
+# l'API, un gros journal gèle toutes les autres requêtes. Ici, les routes
+# attendent (await) un processus du pool, avec une limite de temps.
+# Les tâches ne reçoivent que des données simples (dicts), jamais d'objets ORM.
+
+PDF_RENDER_PROCESSES = int(os.getenv("PDF_RENDER_PROCESSES", str(min(4, os.cpu_count() or 1))))  # 0 = thread de l'API
+PDF_RENDER_MAX_TASKS_PER_CHILD = int(os.getenv("PDF_RENDER_MAX_TASKS_PER_CHILD", "50"))  # recyclage (fuites mémoire)
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "120"))  # secondes
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def _init_render_process():
+    # Préchauffage : reportlab, polices et Pillow chargés une fois par processus
+    from . import pdf  # noqa: F401
+
+def _warmup():
+    return os.getpid()
+
+
+_executor = None
+_lock = threading.Lock()
+_submitted = 0  # tâches confiées au pool courant (recyclage manuel, Python < 3.11)
+
+# max_tasks_per_child n'existe qu'à partir de Python 3.11 (les images tournent en 3.10)
+NATIVE_RECYCLING = sys.version_info >= (3, 11)
+
+def _new_executor():
+    global _submitted
+    _submitted = 0
+    options = {}
+    if PDF_RENDER_MAX_TASKS_PER_CHILD > 0 and NATIVE_RECYCLING:
+        options["max_tasks_per_child"] = PDF_RENDER_MAX_TASKS_PER_CHILD
+    return ProcessPoolExecutor(
+        max_workers=PDF_RENDER_PROCESSES, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_process, **options
+    )
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None and PDF_RENDER_PROCESSES > 0:
+            _executor = _new_executor()
+        return _executor
+
+def _acquire_executor():
+    """
+    Pool pour une nouvelle tâche. Sans recyclage natif, le pool entier est
+    remplacé après MAX_TASKS_PER_CHILD tâches par processus : l'ancien n'est
+    pas arrêté (un rendu en shards peut encore y soumettre), il se termine
+    seul une fois ses tâches finies et sa dernière référence lâchée.
+    """
+    global _executor, _submitted
+    executor = get_executor()
+    if executor is None or NATIVE_RECYCLING or PDF_RENDER_MAX_TASKS_PER_CHILD <= 0:
+        return executor
+    with _lock:
+        if _executor is executor and _submitted >= PDF_RENDER_MAX_TASKS_PER_CHILD * PDF_RENDER_PROCESSES:
+            print("♻️ Pool de rendu PDF recyclé")
+            _executor = _new_executor()
+        _submitted += 1
+        return _executor
+
+def _reset_executor(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            print("⚠️ Pool de rendu PDF cassé : redémarrage")
+            broken.shutdown(wait=False, cancel_futures=True)
+            _executor = _new_executor()
+        return _executor
+
+
+def start_render_pool():
+    """Démarre et préchauffe les processus (au lancement de l'API, pas à la 1ère requête)."""
+    executor = get_executor()
+    if executor is None: return None
+    for future in [executor.submit(_warmup) for _ in range(PDF_RENDER_PROCESSES)]:
+        future.result()
+    print(f"🖨️ Pool de rendu PDF prêt ({PDF_RENDER_PROCESSES} processus)")
+    return executor
+
+def stop_render_pool():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+# Threads qui orchestrent les rendus en shards (ils attendent le pool, sans calculer)
+_orchestrators = ThreadPoolExecutor(max_workers=max(PDF_RENDER_PROCESSES, 1) * 2, thread_name_prefix="pdf-shards")
+
+
+def _abandon(future, on_abandon):
+    # La tâche en attente est annulée ; un rendu déjà commencé finit dans son processus...
+    future.cancel()
+    if on_abandon is not None:
+        # ... et son résultat, que personne n'attend plus, est libéré (fichier spoolé)
+        future.add_done_callback(lambda f: on_abandon(f.result()) if not f.cancelled() and f.exception() is None else None)
+
+async def _wait(future, executor, timeout, on_abandon):
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except asyncio.TimeoutError:
+        _abandon(future, on_abandon)
+        raise RenderTimeout(f"Rendu PDF interrompu après {timeout:.0f}s")
+    except asyncio.CancelledError:
+        # Requête annulée (client parti)
+        _abandon(future, on_abandon)
+        raise
+    except BrokenProcessPool:
+        if executor is not None: _reset_executor(executor)
+        raise
+
+
+async def run(fn, *args, timeout=PDF_RENDER_TIMEOUT, on_abandon=None):
+    """
+    Exécute fn(*args) dans le pool (fn et args doivent être picklables).
+    Lève RenderTimeout au-delà de `timeout` secondes ; `on_abandon(résultat)`
+    est alors appelé si le rendu finit quand même.
+    """
+    executor = _acquire_executor()
+    if executor is None:
+        # Pool désactivé : au moins hors de la boucle, dans un thread
+        return await _wait(_orchestrators.submit(fn, *args), None, timeout, on_abandon)
+
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        future = _reset_executor(executor).submit(fn, *args)
+    return await _wait(future, executor, timeout, on_abandon)
+
+
+async def run_sharded(fn, *args, timeout=PDF_RENDER_TIMEOUT, on_abandon=None):
+    """
+    fn(*args, executor=pool) dans un thread de l'API : pour les rendus qui
+    répartissent eux-mêmes leurs morceaux dans le pool (journaux en shards).
+    """
+    executor = _acquire_executor()
+    if executor is None:
+        return await run(fn, *args, timeout=timeout, on_abandon=on_abandon)
+    return await _wait(_orchestrators.submit(fn, *args, executor=executor), executor, timeout, on_abandon)
@@ -0,0 +1,169 @@
+import os
+from io import BytesIO
+from typing import Literal
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+
+from .image_cache import fetch_image_bytes
+
+# ==========================================
+# PRÉPARATION DES IMAGES POUR LE PDF
+# ==========================================
+# Une photo de 4000px affichée dans un cadre de 8x6 cm n'a pas besoin d'être
+# décodée en entier : on décode directement à la bonne résolution (mode
+# "draft" JPEG), on laisse passer tels quels les JPEG déjà adaptés, et on
+# réutilise le même objet image pour une même source (un seul XObject PDF).
+
+# Nombre max de téléchargements simultanés (borne le pool de threads)
+IMAGE_PREFETCH_WORKERS = int(os.getenv("PDF_IMAGE_WORKERS", "8"))
+
+QUALITY_PROFILES = {
+    "draft":    {"dpi": 72,  "jpeg_quality": 55},
+    "standard": {"dpi": 150, "jpeg_quality": 80},
+    "print":    {"dpi": 300, "jpeg_quality": 92},
+}
+DEFAULT_QUALITY = "standard"
+QualityProfile = Literal["draft", "standard", "print"]
+
+# Tolérance avant ré-encodage : un JPEG jusqu'à 1.5x la résolution utile passe tel quel
+PASSTHROUGH_TOLERANCE = 1.5
+
+# Cadres d'affichage standards (en points)
+PHOTO_BOX = (8 * cm, 6 * cm)
+LOGO_BOX = (12 * cm, 8 * cm)
+SIGNATURE_BOX = (5 * cm, 3 * cm)
+
+EXIF_ORIENTATION = 0x0112
+
+
+def get_profile(quality):
+    return QUALITY_PROFILES.get(quality or DEFAULT_QUALITY, QUALITY_PROFILES[DEFAULT_QUALITY])
+
+
+class PreparedImage(ImageReader):
+    """
+    ImageReader prêt à dessiner.
+    Pour un JPEG, reportlab embarque directement les octets (jpeg_fh) : on évite
+    donc le décodage complet qu'il ferait juste pour calculer l'empreinte de l'image.
+    """
+    def __init__(self, source, jpeg_bytes=None):
+        super().__init__(source)
+        self._jpeg_bytes = jpeg_bytes
+
+    def getRGBData(self):
+        if self._jpeg_bytes is not None:
+            self._dataA = None
+            return self._jpeg_bytes
+        return super().getRGBData()
+
+
+def get_image_bytes(path_or_url):
+    """Octets bruts d'une image distante (via le cache disque) ou locale."""
+    if not path_or_url: return None
+    if path_or_url.startswith("http"):
+        # Optimisation Cloudinary
+        optimized_url = path_or_url
+        if "cloudinary.com" in path_or_url and "/upload/" in path_or_url:
+            optimized_url = path_or_url.replace("/upload/", "/upload/w_1000,q_auto,f_jpg/")
+        # Passe par le cache disque (LRU + revalidation ETag)
+        return fetch_image_bytes(optimized_url, timeout=5)
+    return read_local_file(path_or_url)
+
+
+def get_file_bytes(path_or_url, timeout=15):
+    """Comme get_image_bytes, sans transformation Cloudinary (PDF joints, fichiers d'origine)."""
+    if not path_or_url: return None
+    if path_or_url.startswith("http"):
+        return fetch_image_bytes(path_or_url, timeout=timeout)
+    return read_local_file(path_or_url)
+
+
+def read_local_file(path):
+    # Gestion fichier local
+    clean_path = path.strip("/")
+    possible_paths = [
+        clean_path,
+        os.path.join("uploads", os.path.basename(clean_path)),
+        os.path.join(os.getcwd(), clean_path)
+    ]
+    for p in possible_paths:
+        if os.path.exists(p):
+            with open(p, "rb") as f:
+                return f.read()
+    return None
+
+
+def prepare_image(raw, box, quality=DEFAULT_QUALITY, transpose=False):
+    """
+    Transforme des octets d'image en PreparedImage dimensionnée pour `box` (points).
+    - JPEG déjà à la bonne taille et bien orienté : passthrough sans ré-encodage
+    - JPEG trop grand : décodage réduit (draft) puis ré-encodage JPEG
+    - Image avec transparence (logo, signature PNG) : réduite, transparence conservée
+    """
+    profile = get_profile(quality)
+    target = (max(1, int(box[0] / 72 * profile["dpi"])), max(1, int(box[1] / 72 * profile["dpi"])))
+
+    img = Image.open(BytesIO(raw))
+    is_jpeg = img.format == "JPEG"
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1) if transpose else 1
+    scale = min(target[0] / img.width, target[1] / img.height)
+
+    if is_jpeg and img.mode in ("RGB", "L") and orientation == 1 and scale * PASSTHROUGH_TOLERANCE >= 1:
+        return PreparedImage(BytesIO(raw), jpeg_bytes=raw)
+
+    if is_jpeg:
+        # Le décodeur JPEG sait réduire par 1/2, 1/4, 1/8 : bien plus rapide qu'un resize
+        img.draft("RGB" if img.mode not in ("RGB", "L") else img.mode, target)
+    if transpose:
+        img = ImageOps.exif_transpose(img)
+    img.thumbnail(target, Image.LANCZOS)
+
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if has_alpha:
+        img.load()
+        return PreparedImage(img)
+
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    out = BytesIO()
+    img.save(out, format="JPEG", quality=profile["jpeg_quality"], optimize=True)
+    data = out.getvalue()
+    return PreparedImage(BytesIO(data), jpeg_bytes=data)
+
+
+def load_image(path_or_url, box, quality=DEFAULT_QUALITY, transpose=False):
+    """Télécharge ET prépare une image. Retourne None en cas d'échec (image ignorée)."""
+    try:
+        raw = get_image_bytes(path_or_url)
+        if not raw: return None
+        return prepare_image(raw, box, quality, transpose)
+    except Exception as e:
+        print(f"❌ Erreur image: {e}")
+        return None
+
+
+def prefetch_images(requests_, quality=DEFAULT_QUALITY, max_workers=None):
+    """
+    Télécharge et prépare en parallèle toutes les images d'un document.
+    - requests_ : liste de (source, cadre, redresser_exif) ; doublons et sources vides ignorés
+    Retourne un dict {source: PreparedImage}. Une image en échec n'est pas dans le dict
+    (elle sera simplement ignorée au dessin, comme avant).
+    """
+    wanted = {}
+    for src, box, transpose in requests_:
+        if not src: continue
+        if src in wanted:
+            # Même source dans plusieurs cadres : on prépare pour le plus grand
+            prev_box, prev_t = wanted[src]
+            box = (max(box[0], prev_box[0]), max(box[1], prev_box[1]))
+            transpose = transpose or prev_t
+        wanted[src] = (box, transpose)
+    if not wanted: return {}
+
+    sources = list(wanted)
+    workers = max(1, min(max_workers or IMAGE_PREFETCH_WORKERS, len(sources)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda src: load_image(src, wanted[src][0], quality, wanted[src][1]), sources)
+        return {src: img for src, img in zip(sources, results) if img is not None}
@@ -0,0 +1,267 @@
+import os
+import time
+import uuid
+import socket
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .. import models
+from ..database import SessionLocal, engine
+from .pdf_images import DEFAULT_QUALITY
+from .pdf_documents import DOCUMENT_BUILDERS
+
+# ==========================================
+# FILE DE JOBS PDF (Table pdf_jobs + pool de processus)
+# ==========================================
+# POST -> job PENDING en base. Un "dispatcher" (thread) réserve les jobs avec
+# SELECT ... FOR UPDATE SKIP LOCKED (plusieurs instances peuvent tourner sans
+# se marcher dessus) et les confie à un pool de processus qui fait le rendu.
+
+PDF_JOB_PROCESSES = int(os.getenv("PDF_JOB_PROCESSES", "2"))
+PDF_JOB_EMBEDDED = os.getenv("PDF_JOB_EMBEDDED", "1") == "1"   # Dispatcher lancé avec l'API
+PDF_JOB_MAX_ATTEMPTS = int(os.getenv("PDF_JOB_MAX_ATTEMPTS", "3"))
+PDF_JOB_RESULT_TTL = int(os.getenv("PDF_JOB_RESULT_TTL", "3600"))     # secondes
+PDF_JOB_STALE_SECONDS = int(os.getenv("PDF_JOB_STALE_SECONDS", "300"))  # job RUNNING sans nouvelles
+POLL_INTERVAL = 1.0
+RETRY_BASE_DELAY = 10  # secondes (x2 à chaque tentative)
+
+STATUS_PENDING, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED = "PENDING", "RUNNING", "DONE", "FAILED"
+
+
+# --- API (côté requêtes HTTP) ---
+
+def submit_job(db, doc_type, entity_id, quality=DEFAULT_QUALITY, company_id=None):
+    if doc_type not in DOCUMENT_BUILDERS:
+        raise ValueError(f"Type de document inconnu : {doc_type}")
+    job = models.PdfJob(
+        id=str(uuid.uuid4()), doc_type=doc_type, entity_id=entity_id, quality=quality,
+        status=STATUS_PENDING, max_attempts=PDF_JOB_MAX_ATTEMPTS, company_id=company_id,
+        created_at=datetime.utcnow(), run_after=datetime.utcnow()
+    )
+    db.add(job); db.commit(); db.refresh(job)
+    return job
+
+
+# --- Réservation / cycle de vie (côté worker) ---
+
+def claim_next_job(db, worker_id):
+    """Réserve le prochain job prêt, ou None. Verrou ligne non bloquant entre workers."""
+    now = datetime.utcnow()
+    job = (
+        db.query(models.PdfJob)
+        .filter(models.PdfJob.status == STATUS_PENDING, models.PdfJob.run_after <= now)
+        .order_by(models.PdfJob.created_at)
+        .with_for_update(skip_locked=True)
+        .limit(1)
+        .first()
+    )
+    if not job:
+        db.rollback()
+        return None
+    job.status = STATUS_RUNNING
+    job.attempts = (job.attempts or 0) + 1
+    job.locked_by = worker_id
+    job.started_at = job.heartbeat_at = now
+    job.progress = 0
+    db.commit()
+    return job.id
+
+def requeue_stale_jobs(db):
+    """Jobs RUNNING dont le worker a disparu (crash, redéploiement) : on les relance."""
+    limit = datetime.utcnow() - timedelta(seconds=PDF_JOB_STALE_SECONDS)
+    count = (
+        db.query(models.PdfJob)
+        .filter(models.PdfJob.status == STATUS_RUNNING, models.PdfJob.heartbeat_at < limit)
+        .update({"status": STATUS_PENDING, "locked_by": None}, synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+def purge_expired_jobs(db):
+    """Supprime les jobs terminés dont le résultat a expiré."""
+    count = (
+        db.query(models.PdfJob)
+        .filter(models.PdfJob.status.in_([STATUS_DONE, STATUS_FAILED]), models.PdfJob.expires_at < datetime.utcnow())
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return count
+
+def record_failure(db, job_id, error, permanent=False):
+    """Échec d'une tentative : retry avec backoff exponentiel, ou FAILED définitif."""
+    job = db.query(models.PdfJob).filter(models.PdfJob.id == job_id).first()
+    if not job: return
+    job.error = str(error)[:1000]
+    job.locked_by = None
+    if not permanent and job.attempts < job.max_attempts:
+        job.status = STATUS_PENDING
+        job.run_after = datetime.utcnow() + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (job.attempts - 1))
+    else:
+        job.status = STATUS_FAILED
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(seconds=PDF_JOB_RESULT_TTL)
+    db.commit()
+
+
+# --- Exécution (dans un processus du pool) ---
+
+def _init_worker_process():
+    # Les connexions héritées du parent ne doivent pas être partagées
+    engine.dispose(close=False)
+
+def run_job(job_id):
+    """Rendu complet d'un job. Exécuté dans un processus séparé (pas de GIL partagé avec l'API)."""
+    db = SessionLocal()
+    try:
+        job = db.query(models.PdfJob).filter(models.PdfJob.id == job_id).first()
+        if not job: return
+
+        last_report = [0.0]
+        def progress(done, total):
+            # Progression + heartbeat, au plus une écriture par seconde
+            now = time.monotonic()
+            if now - last_report[0] < 1 and done < total: return
+            last_report[0] = now
+            job.progress = min(95, 5 + int(90 * done / max(total, 1)))
+            job.heartbeat_at = datetime.utcnow()
+            db.commit()
+
+        doc = DOCUMENT_BUILDERS[job.doc_type](db, job.entity_id, job.quality or DEFAULT_QUALITY)
+        if doc is None:
+            raise LookupError(f"{job.doc_type} #{job.entity_id} introuvable")
+        progress(0, 1)
+        data = doc.render(progress)
+
+        job.result = data
+        job.result_size = len(data)
+        job.filename = doc.filename
+        job.status = STATUS_DONE
+        job.progress = 100
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        job.expires_at = job.finished_at + timedelta(seconds=PDF_JOB_RESULT_TTL)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Job PDF {job_id} : {e}")
+        # Document introuvable : inutile de réessayer
+        record_failure(db, job_id, e, permanent=isinstance(e, LookupError))
+    finally:
+        db.close()
+
+
+# --- Dispatcher ---
+
+class PdfJobDispatcher:
+    def __init__(self, processes=PDF_JOB_PROCESSES):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.processes = processes
+        self.executor = self._new_executor()
+        self._slots = threading.Semaphore(processes)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _new_executor(self):
+        # "spawn" : processus neufs, sans connexions ni threads hérités de l'API
+        return ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker_process
+        )
+
+    def _submit(self, job_id):
+        try:
+            future = self.executor.submit(run_job, job_id)
+        except BrokenProcessPool:
+            # Un processus est mort (OOM...) : on repart sur un pool neuf
+            print("⚠️ Pool de rendu PDF cassé : redémarrage")
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+            future = self.executor.submit(run_job, job_id)
+        future.add_done_callback(lambda f, jid=job_id: self._on_done(jid, f))
+
+    def _on_done(self, job_id, future):
+        self._slots.release()
+        if future.cancelled(): return
+        error = future.exception()
+        if error is not None:
+            # Le processus a planté (OOM, segfault...) : run_job n'a rien pu enregistrer
+            db = SessionLocal()
+            try: record_failure(db, job_id, error)
+            finally: db.close()
+
+    def _maintenance(self):
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            purge_expired_jobs(db)
+        except Exception as e:
+            print(f"⚠️ Maintenance jobs PDF : {e}")
+        finally:
+            db.close()
+
+    def run(self):
+        last_maintenance = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_maintenance > 60:
+                self._maintenance()
+                last_maintenance = time.monotonic()
+
+            if not self._slots.acquire(timeout=POLL_INTERVAL): continue
+            db = SessionLocal()
+            try:
+                job_id = claim_next_job(db, self.worker_id)
+            except Exception as e:
+                print(f"⚠️ Réservation job PDF : {e}")
+                job_id = None
+            finally:
+                db.close()
+
+            if job_id is None:
+                self._slots.release()
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            try:
+                self._submit(job_id)
+            except Exception as e:
+                self._slots.release()
+                db = SessionLocal()
+                try: record_failure(db, job_id, e)
+                finally: db.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="pdf-job-dispatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread: self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+dispatcher = None
+
+def start_embedded_dispatcher():
+    """Démarre le dispatcher dans le processus de l'API (si PDF_JOB_EMBEDDED=1)."""
+    global dispatcher
+    if PDF_JOB_EMBEDDED and dispatcher is None and PDF_JOB_PROCESSES > 0:
+        dispatcher = PdfJobDispatcher().start()
+    return dispatcher
+
+def stop_embedded_dispatcher():
+    global dispatcher
+    if dispatcher is not None:
+        dispatcher.stop()
+        dispatcher = None
+
+
+if __name__ == "__main__":
+    # Worker autonome : python -m backend.services.pdf_jobs
+    print(f"🖨️ Worker PDF démarré ({PDF_JOB_PROCESSES} processus)")
+    worker = PdfJobDispatcher()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import uuid
+import tempfile
+from io import BytesIO
+from typing import NamedTuple, Optional
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+# ==========================================
+# SORTIE PDF "SPOOLÉE" (Mémoire bornée)
+# ==========================================
+# Le rendu écrit dans un fichier spoolé : en mémoire tant que le PDF est petit,
+# puis dans un fichier temporaire NOMMÉ au-delà du seuil (le chemin peut passer
+# d'un processus de rendu à l'API). La réponse HTTP lit ce fichier par morceaux
+# et gère les requêtes Range (visionneuse mobile page par page).
+
+PDF_SPOOL_MEMORY_BYTES = int(os.getenv("PDF_SPOOL_MEMORY_MB", "4")) * 1024 * 1024
+PDF_SPOOL_DIR = os.getenv("PDF_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "conformeo_pdf_spool"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class PdfBlob(NamedTuple):
+    """PDF rendu : octets en mémoire OU chemin d'un fichier temporaire (picklable)."""
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(len(data), data=data)
+
+    @property
+    def on_disk(self):
+        return self.path is not None
+
+    def open(self):
+        return BytesIO(self.data) if self.data is not None else open(self.path, "rb")
+
+    def read(self):
+        if self.data is not None: return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def pin(self):
+        """
+        Copie privée d'un PDF sur disque (lien physique, sans recopie) : reste lisible
+        même si l'original est supprimé. FileNotFoundError s'il a déjà disparu.
+        """
+        if self.path is None: return self
+        path = os.path.join(os.path.dirname(self.path), f"{uuid.uuid4().hex}.pdf")
+        os.link(self.path, path)
+        return PdfBlob(self.size, path=path)
+
+    def discard(self):
+        if self.path:
+            try: os.remove(self.path)
+            except FileNotFoundError: pass
+
+
+class SpooledPdfFile:
+    """Cible d'écriture des générateurs (comme un BytesIO) qui déborde sur disque."""
+
+    def __init__(self, max_memory=PDF_SPOOL_MEMORY_BYTES):
+        self.max_memory = max_memory
+        self._memory = BytesIO()
+        self._file = None
+        self.path = None
+
+    def write(self, data):
+        if self._file is None and self._memory.tell() + len(data) > self.max_memory:
+            self._rollover()
+        return (self._file or self._memory).write(data)
+
+    def tell(self):
+        return (self._file or self._memory).tell()
+
+    def flush(self):
+        if self._file: self._file.flush()
+
+    def _rollover(self):
+        os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".pdf", dir=PDF_SPOOL_DIR)
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._memory.getbuffer())
+        self._memory = None
+
+    def finish(self):
+        """Ferme la cible et retourne le PdfBlob correspondant."""
+        if self._file is None:
+            data = self._memory.getvalue()
+            self._memory = None
+            return PdfBlob.from_bytes(data)
+        size = self._file.tell()
+        self._file.close()
+        return PdfBlob(size, path=self.path)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            PdfBlob(0, path=self.path).discard()
+
+
+def cleanup_spool_dir(max_age=24 * 3600):
+    """Supprime les fichiers orphelins (crash pendant un envoi...) plus vieux que `max_age` secondes."""
+    if not os.path.isdir(PDF_SPOOL_DIR): return 0
+    count, limit = 0, time.time() - max_age
+    for name in os.listdir(PDF_SPOOL_DIR):
+        path = os.path.join(PDF_SPOOL_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path); count += 1
+        except OSError:
+            pass
+    return count
+
+
+# ==========================================
+# RÉPONSE HTTP (Morceaux + Range)
+# ==========================================
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_range(header, size):
+    """
+    (début, fin incluse) pour un en-tête Range à une seule plage, None si absent
+    ou non géré (plages multiples : on renvoie tout). ValueError si insatisfiable.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match: return None
+    start, end = match.groups()
+    if not start and not end: return None
+    if not start:
+        # "bytes=-500" : les 500 derniers octets
+        length = int(end)
+        if length == 0: raise ValueError("Plage vide")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or end < start: raise ValueError("Plage hors du fichier")
+    return start, end
+
+
+def blob_response(request, blob: PdfBlob, filename, headers=None, temporary=False):
+    """
+    Envoie un PdfBlob par morceaux (206 si Range). `temporary` : fichier à supprimer
+    après l'envoi (PDF non gardé en cache).
+    """
+    headers = {**(headers or {}), "Accept-Ranges": "bytes", "Content-Disposition": f"inline; filename={filename}"}
+    cleanup = BackgroundTask(blob.discard) if temporary else None
+
+    # If-Range : la plage n'a de sens que pour la même version du document
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != headers.get("ETag"): range_header = None
+
+    try:
+        byte_range = parse_range(range_header, blob.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{blob.size}"}, background=cleanup)
+
+    start, end = byte_range or (0, blob.size - 1)
+    status_code = 206 if byte_range else 200
+    if byte_range: headers["Content-Range"] = f"bytes {start}-{end}/{blob.size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    handle = blob.open()
+    if temporary and blob.on_disk:
+        # POSIX : le fichier disparaît du disque dès la fermeture du descripteur,
+        # même si le client coupe la connexion en plein envoi
+        try:
+            os.remove(blob.path); cleanup = None
+        except OSError:
+            pass
+
+    async def chunks():
+        try:
+            await run_in_threadpool(handle.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(handle.read, min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk: break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            handle.close()
+
+    return StreamingResponse(chunks(), status_code=status_code, media_type="application/pdf", headers=headers, background=cleanup)
@@ -0,0 +1,36 @@
+import hashlib
+from reportlab.pdfbase import pdfmetrics
+
+# ==========================================
+# GABARITS PDF (Forms reportlab réutilisables)
+# ==========================================
+# Les parties fixes (bandeaux, filets, libellés, logo) sont dessinées une seule
+# fois par document dans un form XObject (beginForm/endForm), puis simplement
+# référencées (doForm) à chaque page. Le texte variable est dessiné par-dessus.
+
+# Polices utilisées par les générateurs (Type 1 standard : pas de fichier à embarquer)
+PDF_FONTS = ("Helvetica", "Helvetica-Bold", "Helvetica-Oblique", "Helvetica-BoldOblique")
+
+
+def register_fonts():
+    """Charge les métriques des polices une fois par processus (et non à la 1ère page)."""
+    for name in PDF_FONTS:
+        pdfmetrics.getFont(name)
+
+
+def form_name(kind, *parts):
+    """Nom de form stable pour un gabarit et son habillage (entreprise, titre...)."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+    return f"{kind}{digest}"
+
+
+def use_form(c, name, draw):
+    """Dessine `draw(c)` dans le form `name` s'il n'existe pas encore dans ce document, puis l'affiche."""
+    if not c.hasForm(name):
+        c.beginForm(name)
+        draw(c)
+        c.endForm()
+    c.doForm(name)
+
+
+register_fonts()
@@ -0,0 +1,51 @@
+import typing
+from functools import lru_cache
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only, selectinload, joinedload
+
+from ..models.base import RAISE_ON_LAZY
+
+# ==========================================
+# PROFILS DE CHARGEMENT PAR SCHÉMA DE RÉPONSE
+# ==========================================
+# Une route de liste sérialise un schéma Pydantic : on en déduit les colonnes à
+# lire (load_only) et les relations à charger d'avance (selectinload pour une
+# collection, joinedload pour une relation simple), récursivement.
+# Coût constant : 1 requête + 1 par collection, quel que soit le nombre de lignes.
+#     db.query(models.Rapport).options(*schema_options(models.Rapport, schemas.RapportOut))
+
+def nested_schema(annotation):
+    """Schéma Pydantic contenu dans une annotation (List[X], Optional[X], X), sinon None."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        found = nested_schema(arg)
+        if found is not None: return found
+    return None
+
+
+@lru_cache(maxsize=None)
+def schema_options(model, schema):
+    """Options de chargement de `model` pour sérialiser `schema` (calculées une fois par couple)."""
+    mapper = inspect(model)
+    fields = schema.model_fields
+    # Mode test : une colonne non prévue par le schéma lève aussi une erreur au lieu d'une requête
+    columns = [getattr(model, name) for name in fields if name in mapper.column_attrs]
+    options = [load_only(*columns, raiseload=RAISE_ON_LAZY)] if columns else []
+
+    for name, field in fields.items():
+        if name not in mapper.relationships: continue
+        relation = mapper.relationships[name]
+        attr = getattr(model, name)
+        loader = selectinload(attr) if relation.uselist else joinedload(attr)
+        sub_schema = nested_schema(field.annotation)
+        if sub_schema is not None:
+            loader = loader.options(*schema_options(relation.mapper.class_, sub_schema))
+        options.append(loader)
+    return tuple(options)
+
+
+def query_for(db, model, schema):
+    """db.query(model) avec le profil de chargement du schéma de réponse."""
+    return db.query(model).options(*schema_options(model, schema))
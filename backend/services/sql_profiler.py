@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# ==========================================
+# COMPTEUR SQL PAR REQUÊTE HTTP (+ détection N+1)
+# ==========================================
+# Chaque requête SQL exécutée pendant une requête HTTP est comptée (nombre,
+# temps passé en base, "forme" de la requête sans ses paramètres). Une même
+# forme répétée beaucoup de fois = chargement paresseux dans une boucle (N+1).
+# Résultat : en-têtes X-SQL-* sur la réponse + ligne de log JSON.
+
+SQL_PROFILING = os.getenv("SQL_PROFILING", "1") == "1"
+SQL_NPLUSONE_THRESHOLD = int(os.getenv("SQL_NPLUSONE_THRESHOLD", "5"))   # répétitions d'une même forme
+SQL_LOG_MIN_QUERIES = int(os.getenv("SQL_LOG_MIN_QUERIES", "20"))         # log aussi les requêtes "chères"
+SQL_LOG_ALL = os.getenv("SQL_LOG_ALL", "0") == "1"
+
+_current = ContextVar("sql_request_stats", default=None)
+
+IN_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))+\s*\)")
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+SPACES_RE = re.compile(r"\s+")
+
+def statement_shape(statement):
+    """Requête sans valeurs : listes IN de taille variable et littéraux remplacés."""
+    shape = IN_LIST_RE.sub("(?...)", statement)
+    shape = LITERAL_RE.sub("?", shape)
+    return SPACES_RE.sub(" ", shape).strip()
+
+
+class RequestSqlStats:
+    def __init__(self):
+        self.count = 0
+        self.time_s = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.time_s += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold=SQL_NPLUSONE_THRESHOLD):
+        """Formes exécutées au moins `threshold` fois : [(forme, nombre)], la plus répétée d'abord."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def as_dict(self, threshold=SQL_NPLUSONE_THRESHOLD):
+        return {
+            "sql_count": self.count, "sql_time_ms": round(self.time_s * 1000, 2),
+            "sql_repeated": [{"count": n, "statement": shape[:300]} for shape, n in self.repeated(threshold)],
+        }
+
+
+def current_stats():
+    return _current.get()
+
+
+# --- Événements SQLAlchemy ---
+
+def install(engine):
+    """Compte les requêtes de `engine` dans les statistiques de la requête HTTP en cours."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        starts = conn.info.get("sql_profiler_start")
+        if stats is not None and starts:
+            stats.record(statement, time.perf_counter() - starts.pop())
+
+    return engine
+
+
+# --- Middleware ASGI ---
+
+class SqlProfilerMiddleware:
+    """Ouvre un compteur par requête HTTP, ajoute les en-têtes X-SQL-* et logue les requêtes suspectes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_PROFILING:
+            return await self.app(scope, receive, send)
+
+        stats = RequestSqlStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = [None]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                # Réponses en streaming : seules les requêtes faites avant le 1er octet sont comptées ici
+                headers = MutableHeaders(scope=message)
+                headers["X-SQL-Count"] = str(stats.count)
+                headers["X-SQL-Time-Ms"] = f"{stats.time_s * 1000:.2f}"
+                repeated = stats.repeated()
+                if repeated: headers["X-SQL-Repeated"] = str(repeated[0][1])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            repeated = stats.repeated()
+            if SQL_LOG_ALL or repeated or stats.count >= SQL_LOG_MIN_QUERIES:
+                print(json.dumps({
+                    "event": "sql_profile", "method": scope.get("method"), "path": scope.get("path"),
+                    "status": status[0], "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "n_plus_one": bool(repeated), **stats.as_dict(),
+                }, ensure_ascii=False))
+
+
+# ==========================================
+# BUDGETS DE REQUÊTES (Tests)
+# ==========================================
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def assert_query_budget(response, budget):
+    """
+    Échoue si la réponse (TestClient) a coûté plus de `budget` requêtes SQL.
+        assert_query_budget(client.get("/chantiers/1/rapports"), 3)
+    """
+    count = int(response.headers.get("x-sql-count", "0"))
+    if count > budget:
+        raise QueryBudgetExceeded(
+            f"{response.request.method} {response.request.url.path} : {count} requêtes SQL (budget {budget})"
+            + (f", dont {response.headers['x-sql-repeated']} répétitions d'une même forme (N+1 ?)" if "x-sql-repeated" in response.headers else "")
+        )
+    return count
+
+@contextmanager
+def query_budget(budget):
+    """Même contrôle hors HTTP (fonction de service appelée directement dans un test)."""
+    stats = RequestSqlStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+    if stats.count > budget:
+        detail = "; ".join(f"{n}x {shape[:120]}" for shape, n in stats.repeated())
+        raise QueryBudgetExceeded(f"{stats.count} requêtes SQL (budget {budget}){' : ' + detail if detail else ''}")
@@ -0,0 +1,269 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from .dashboard_stats import column_values
+from .pagination import Keyset, encode_cursor, decode_cursor
+
+# ==========================================
+# JOURNAL DE SYNCHRONISATION MOBILE (GET /sync)
+# ==========================================
+# Chaque écriture sur une ligne synchronisée reçoit un numéro de séquence
+# croissant propre à l'entreprise (company_sync.last_seq, incrémenté sous verrou
+# de ligne : deux transactions d'une même entreprise obtiennent leurs numéros
+# dans l'ordre de leurs commits). sync_changes garde la dernière opération de
+# chaque ligne (upsert ou tombstone de suppression) : un appareil demande
+# "tout ce qui a changé après le numéro N" et ne reçoit chaque ligne qu'une fois.
+
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+SYNC_PAGE_MAX = int(os.getenv("SYNC_PAGE_MAX", "2000"))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", "90"))  # Au-delà : resynchro complète de l'appareil
+
+OP_UPSERT, OP_DELETE = "upsert", "delete"
+
+# Modèle -> (entité côté client, colonne qui rattache la ligne à l'entreprise)
+SYNC_ENTITIES = {
+    models.Chantier: ("chantiers", "company_id"),
+    models.Materiel: ("materiels", "company_id"),
+    models.Rapport: ("rapports", "chantier_id"),
+    models.Inspection: ("inspections", "chantier_id"),
+    models.Task: ("tasks", "chantier_id"),
+    models.DocExterne: ("docs", "chantier_id"),
+    models.PPSPS: ("ppsps", "chantier_id"),
+    models.PlanPrevention: ("plans_prevention", "chantier_id"),
+    models.PermisFeu: ("permis_feu", "chantier_id"),
+    models.PIC: ("pic", "chantier_id"),
+}
+ENTITY_MODELS = {entity: model for model, (entity, _) in SYNC_ENTITIES.items()}
+
+# Jeton : (entreprise, dernier numéro reçu, purge connue au début de la synchro)
+TOKEN_KEYS = Keyset((models.SyncChange.company_id, models.SyncChange.seq, models.CompanySync.pruned_seq))
+
+
+# --- Séquence et upserts (PostgreSQL / SQLite : INSERT ... ON CONFLICT) ---
+
+def dialect_insert(conn, table):
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(conn.dialect.name)
+    if dialect is None: raise NotImplementedError(f"Synchro non supportée sur {conn.dialect.name}")
+    return dialect.insert(table)
+
+def allocate_seqs(conn, company_id, count):
+    """Réserve `count` numéros consécutifs ; retourne le premier. Verrouille la ligne jusqu'au commit."""
+    table = models.CompanySync.__table__
+    stmt = dialect_insert(conn, table).values(company_id=company_id, last_seq=count, pruned_seq=0)
+    stmt = stmt.on_conflict_do_update(index_elements=["company_id"], set_={"last_seq": table.c.last_seq + count})
+    last = conn.execute(stmt.returning(table.c.last_seq)).scalar_one()
+    return last - count + 1
+
+def write_changes(conn, company_id, changes, now=None):
+    """changes : [(entité, id, op)] -> une ligne sync_changes chacune (remplace la précédente)."""
+    if not changes: return
+    now = now or datetime.utcnow()
+    first = allocate_seqs(conn, company_id, len(changes))
+    table = models.SyncChange.__table__
+    rows = [
+        {"company_id": company_id, "entity": entity, "entity_id": entity_id, "op": op, "seq": first + i, "changed_at": now}
+        for i, (entity, entity_id, op) in enumerate(changes)
+    ]
+    stmt = dialect_insert(conn, table).values(rows)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=["company_id", "entity", "entity_id"],
+        set_={"op": stmt.excluded.op, "seq": stmt.excluded.seq, "changed_at": stmt.excluded.changed_at},
+    ))
+
+
+# ==========================================
+# ENREGISTREMENT (après chaque flush SQLAlchemy)
+# ==========================================
+
+# Priorité quand une même ligne apparaît plusieurs fois dans un flush
+SUPPRIMEE, MODIFIEE, DEPLACEE = 3, 2, 1  # DEPLACEE : tombstone chez l'ancienne entreprise
+
+def company_resolver(session):
+    """Entreprise d'un chantier / d'un rapport : session d'abord, puis une requête groupée."""
+    conn = session.connection()
+
+    def from_session(model, key, attr):
+        obj = session.identity_map.get(inspect(model).identity_key_from_primary_key((key,)))
+        return obj.__dict__.get(attr) if obj is not None else None
+
+    def resolve(owners):
+        """{("company"|"chantier"|"rapport", id)} -> {owner: company_id}"""
+        resolved = {o: o[1] for o in owners if o[0] == "company"}
+        rapports = {o[1] for o in owners if o[0] == "rapport"}
+        rapport_chantier = {r: from_session(models.Rapport, r, "chantier_id") for r in rapports}
+        missing = [r for r, c in rapport_chantier.items() if c is None]
+        if missing:
+            rapport_chantier.update(conn.execute(select(models.Rapport.id, models.Rapport.chantier_id).where(models.Rapport.id.in_(missing))).all())
+
+        chantiers = {o[1] for o in owners if o[0] == "chantier"} | {c for c in rapport_chantier.values() if c}
+        chantier_company = {c: from_session(models.Chantier, c, "company_id") for c in chantiers}
+        missing = [c for c, co in chantier_company.items() if co is None]
+        if missing:
+            chantier_company.update(conn.execute(select(models.Chantier.id, models.Chantier.company_id).where(models.Chantier.id.in_(missing))).all())
+
+        for owner in owners:
+            if owner[0] == "chantier": resolved[owner] = chantier_company.get(owner[1])
+            elif owner[0] == "rapport": resolved[owner] = chantier_company.get(rapport_chantier.get(owner[1]))
+        return resolved
+
+    return resolve
+
+def collect_changes(session):
+    """[(owner, entité, id, priorité)] des lignes synchronisées touchées par ce flush."""
+    pending = []
+    for obj, is_new, is_deleted in (
+        [(o, True, False) for o in session.new] + [(o, False, False) for o in session.dirty]
+        + [(o, False, True) for o in session.deleted]
+    ):
+        model = type(obj)
+        if not (is_new or is_deleted or session.is_modified(obj, include_collections=False)): continue
+
+        if model is models.RapportImage:
+            # Les photos voyagent avec leur rapport
+            rapport_id = column_values(obj, ("rapport_id",), before=is_deleted)["rapport_id"]
+            if rapport_id: pending.append((("rapport", rapport_id), "rapports", rapport_id, MODIFIEE))
+            continue
+        if model not in SYNC_ENTITIES: continue
+
+        entity, owner_column = SYNC_ENTITIES[model]
+        kind = "company" if owner_column == "company_id" else "chantier"
+        before = None if is_new else column_values(obj, (owner_column,), before=True)[owner_column]
+        after = None if is_deleted else column_values(obj, (owner_column,), before=False)[owner_column]
+        if is_deleted:
+            if before: pending.append(((kind, before), entity, obj.id, SUPPRIMEE))
+            continue
+        if after: pending.append(((kind, after), entity, obj.id, MODIFIEE))
+        if before and before != after: pending.append(((kind, before), entity, obj.id, DEPLACEE))
+    return pending
+
+@event.listens_for(Session, "after_flush")
+def _record_sync_changes(session, flush_context):
+    pending = collect_changes(session)
+    if not pending: return
+    companies = company_resolver(session)({owner for owner, *_ in pending})
+
+    by_company = {}
+    for owner, entity, entity_id, priority in pending:
+        company_id = companies.get(owner)
+        if not company_id: continue
+        slot = by_company.setdefault(company_id, {})
+        slot[(entity, entity_id)] = max(priority, slot.get((entity, entity_id), 0))
+
+    conn = session.connection()
+    for company_id, changes in sorted(by_company.items()):  # Ordre fixe des verrous entre transactions
+        write_changes(conn, company_id, [
+            (entity, entity_id, OP_UPSERT if priority == MODIFIEE else OP_DELETE)
+            for (entity, entity_id), priority in sorted(changes.items())
+        ])
+
+
+# ==========================================
+# LECTURE (GET /sync)
+# ==========================================
+
+def backfill_company(db, company_id):
+    """1ère synchro d'une entreprise : inscrit les lignes créées avant le journal."""
+    state = db.query(models.CompanySync).filter(models.CompanySync.company_id == company_id).first()
+    if state is not None and state.backfilled_at is not None: return
+
+    conn = db.connection()
+    allocate_seqs(conn, company_id, 0)  # Crée + verrouille la ligne company_sync
+    state = db.query(models.CompanySync).filter(models.CompanySync.company_id == company_id).populate_existing().one()
+    if state.backfilled_at is not None:
+        db.commit()
+        return
+
+    known = set(db.query(models.SyncChange.entity, models.SyncChange.entity_id).filter(models.SyncChange.company_id == company_id).all())
+    changes = []
+    for model, (entity, owner_column) in SYNC_ENTITIES.items():
+        query = db.query(model.id)
+        if owner_column == "company_id": query = query.filter(model.company_id == company_id)
+        else: query = query.join(models.Chantier, model.chantier_id == models.Chantier.id).filter(models.Chantier.company_id == company_id)
+        changes += [(entity, i, OP_UPSERT) for (i,) in query.order_by(model.id).all() if (entity, i) not in known]
+    write_changes(conn, company_id, changes)
+    db.query(models.CompanySync).filter(models.CompanySync.company_id == company_id).update({"backfilled_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    print(f"🔄 Synchro entreprise {company_id} initialisée ({len(changes)} lignes)")
+
+def read_changes(db, company_id, token=None, limit=None):
+    """
+    Modifications après `token` (None = depuis le début).
+    Retourne (lignes sync_changes, jeton suivant, reste-t-il des pages, reset).
+    reset = True : jeton trop ancien ou d'une autre entreprise -> l'appareil repart de zéro.
+    """
+    backfill_company(db, company_id)
+    state = db.query(models.CompanySync).filter(models.CompanySync.company_id == company_id).one()
+
+    pruned = state.pruned_seq or 0
+    since, reset = 0, token is None
+    if token:
+        token_company, since, known_pruned = decode_cursor(token, TOKEN_KEYS)
+        # Tombstones purgés depuis le début de cette synchro, avant d'avoir été reçus : vue incomplète
+        missed = pruned > known_pruned and since < pruned
+        if token_company != company_id or missed or since > (state.last_seq or 0):
+            since, reset = 0, True
+
+    size = min(limit or SYNC_PAGE_SIZE, SYNC_PAGE_MAX)
+    rows = (
+        db.query(models.SyncChange)
+        .filter(models.SyncChange.company_id == company_id, models.SyncChange.seq > since)
+        .order_by(models.SyncChange.seq).limit(size + 1).all()
+    )
+    rows, has_more = rows[:size], len(rows) > size
+    last_seq = rows[-1].seq if rows else since
+    return rows, encode_cursor([company_id, last_seq, pruned]), has_more, reset
+
+
+# ==========================================
+# PURGE DES TOMBSTONES
+# ==========================================
+
+def prune_tombstones(db, days=SYNC_TOMBSTONE_DAYS):
+    """Supprime les tombstones anciens ; les jetons antérieurs deviennent invalides (reset)."""
+    limit = datetime.utcnow() - timedelta(days=days)
+    old = (models.SyncChange.op == OP_DELETE) & (models.SyncChange.changed_at < limit)
+    pruned = db.query(models.SyncChange.company_id, func.max(models.SyncChange.seq)).filter(old).group_by(models.SyncChange.company_id).all()
+    for company_id, max_seq in pruned:
+        db.query(models.CompanySync).filter(
+            models.CompanySync.company_id == company_id, models.CompanySync.pruned_seq < max_seq
+        ).update({"pruned_seq": max_seq}, synchronize_session=False)
+    count = db.query(models.SyncChange).filter(old).delete(synchronize_session=False)
+    db.commit()
+    return count
+
+_stop = threading.Event()
+_thread = None
+
+def start_pruner(session_factory=SessionLocal, interval=24 * 3600):
+    """Purge au démarrage puis toutes les `interval` secondes (un seul thread par processus)."""
+    global _thread
+    if _thread is not None: return None
+
+    def loop():
+        while not _stop.is_set():
+            db = session_factory(info={"route_class": "background"})
+            try:
+                count = prune_tombstones(db)
+                if count: print(f"🧹 Synchro : {count} tombstones purgés")
+            except Exception as e:
+                print(f"❌ Purge tombstones synchro : {e}")
+            finally:
+                db.close()
+            _stop.wait(interval)
+
+    _stop.clear()
+    _thread = threading.Thread(target=loop, name="sync-tombstone-prune", daemon=True)
+    _thread.start()
+    return _thread
+
+def stop_pruner():
+    global _thread
+    _stop.set()
+    if _thread: _thread.join(timeout=5)
+    _thread = None
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+# ==========================================
+# CONFIGURATION DES TESTS
+# ==========================================
+# Base SQLite jetable et services d'arrière-plan coupés : les tests pilotent
+# eux-mêmes l'expéditeur email. Relations en raise_on_sql : un chargement
+# paresseux oublié (N+1) fait échouer le test. À lancer depuis la racine du dépôt :
+#   python -m pytest backend/tests
+
+_tmp = tempfile.mkdtemp(prefix="conformeo-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp, 'test.db')}")
+os.environ.update(
+    PDF_RENDER_PROCESSES="0", EMAIL_OUTBOX_EMBEDDED="0", PDF_JOB_EMBEDDED="0",
+    GEOCODE_WORKER_EMBEDDED="0", BREVO_API_KEY="test-key", SQL_RAISE_ON_LAZY="1",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,231 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, models
+from backend.database import SessionLocal
+from backend.dependencies import create_access_token
+from backend.services import email, email_outbox
+
+
+# ==========================================
+# FAUX SERVEUR BREVO (http.server sur un port éphémère)
+# ==========================================
+
+class FakeBrevo:
+    """Enregistre les envois reçus et répond selon un script (statut, en-têtes)."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests.append({"body": body, "api_key": self.headers.get("api-key")})
+                    status, headers = fake.responses.pop(0) if fake.responses else (201, {})
+                payload = json.dumps({"messageId": f"<msg-{len(fake.requests)}>"} if status < 300 else {"message": "erreur"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items(): self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v3/smtp/email"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def script(self, *responses):
+        self.responses.extend(responses)
+
+
+@pytest.fixture
+def brevo(monkeypatch):
+    fake = FakeBrevo()
+    fake._thread.start()
+    monkeypatch.setattr(email, "BREVO_API_URL", fake.url)
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    # File vide à chaque test : l'expéditeur réserve tout ce qui est prêt
+    session.query(models.OutboxEmail).delete()
+    session.query(models.EmailAttachment).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def chantier(db):
+    company = models.Company(name="Outbox BTP")
+    db.add(company); db.commit()
+    user = models.User(email=f"chef-{company.id}@outbox.fr", company_id=company.id)
+    c = models.Chantier(nom="Villa Test", company_id=company.id)
+    db.add_all([user, c]); db.commit()
+    return c, user
+
+
+def reload(db, ids):
+    db.expire_all()
+    emails = db.query(models.OutboxEmail).filter(models.OutboxEmail.id.in_(ids)).all()
+    return sorted(emails, key=lambda e: e.to_email)
+
+def make_ready(db, ids):
+    """Fait comme si le délai de backoff était écoulé."""
+    db.query(models.OutboxEmail).filter(models.OutboxEmail.id.in_(ids)) \
+        .update({"run_after": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+    db.commit()
+
+
+# ==========================================
+# TESTS
+# ==========================================
+
+def test_send_email_route_enqueues_and_returns_202(db, chantier, brevo):
+    c, user = chantier
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": user.email})}
+    with TestClient(main.app) as client:
+        r = client.post(f"/chantiers/{c.id}/send-email", params={"email_dest": "a@x.fr; b@x.fr, a@x.fr"}, headers=headers)
+
+    assert r.status_code == 202
+    assert sorted(e["to_email"] for e in r.json()["emails"]) == ["a@x.fr", "b@x.fr"]
+    assert all(e["status"] == email_outbox.STATUS_PENDING for e in r.json()["emails"])
+    assert brevo.requests == []  # Rien n'est envoyé pendant la requête HTTP
+
+
+def test_multi_recipient_send_renders_attachment_once(db, chantier, brevo, monkeypatch):
+    c, _ = chantier
+    renders = []
+    real_get_pdf_bytes = email_outbox.get_pdf_bytes
+    def counting_get_pdf_bytes(doc, **kwargs):
+        renders.append(doc.filename)
+        return real_get_pdf_bytes(doc, **kwargs)
+    monkeypatch.setattr(email_outbox, "get_pdf_bytes", counting_get_pdf_bytes)
+
+    emails = email_outbox.enqueue_emails(
+        db, ["a@x.fr", "b@x.fr", "c@x.fr"], "Suivi", "<p>Journal</p>", attachment=("journal", c.id, "Journal.pdf")
+    )
+    assert email_outbox.EmailSender().run_once() == 3
+
+    assert len(renders) == 1
+    assert len(brevo.requests) == 3
+    attachments = [r["body"]["attachment"][0] for r in brevo.requests]
+    assert len({a["content"] for a in attachments}) == 1
+    assert attachments[0]["name"] == "Journal.pdf"
+    assert sorted(r["body"]["to"][0]["email"] for r in brevo.requests) == ["a@x.fr", "b@x.fr", "c@x.fr"]
+
+    sent = reload(db, [e.id for e in emails])
+    assert [e.status for e in sent] == [email_outbox.STATUS_SENT] * 3
+    assert all(e.provider_message_id and e.http_status == 201 for e in sent)
+    row = db.query(models.EmailAttachment).one()
+    assert row.content is not None and row.rendering_by is None
+
+
+def test_429_and_5xx_are_retried_with_backoff(db, brevo):
+    brevo.script((429, {"Retry-After": "120"}), (503, {}))
+    [queued] = email_outbox.enqueue_emails(db, ["a@x.fr"], "Relance", "<p>x</p>")
+    sender = email_outbox.EmailSender()
+
+    # 429 : le Retry-After du fournisseur l'emporte sur le backoff (30 s)
+    before = datetime.utcnow()
+    sender.run_once()
+    [e] = reload(db, [queued.id])
+    assert (e.status, e.attempts, e.http_status) == (email_outbox.STATUS_PENDING, 1, 429)
+    assert e.run_after >= before + timedelta(seconds=119)
+    assert sender.run_once() == 0  # Pas avant la fin du délai
+
+    # 503 : backoff exponentiel (2e tentative -> 2 x EMAIL_RETRY_BASE_DELAY)
+    make_ready(db, [queued.id])
+    before = datetime.utcnow()
+    sender.run_once()
+    [e] = reload(db, [queued.id])
+    assert (e.status, e.attempts, e.http_status) == (email_outbox.STATUS_PENDING, 2, 503)
+    delay = email_outbox.retry_delay(2)
+    assert delay == 2 * email_outbox.EMAIL_RETRY_BASE_DELAY
+    assert before + timedelta(seconds=delay - 1) <= e.run_after <= datetime.utcnow() + timedelta(seconds=delay + 1)
+
+    # Puis succès
+    make_ready(db, [queued.id])
+    sender.run_once()
+    [e] = reload(db, [queued.id])
+    assert (e.status, e.attempts, e.error) == (email_outbox.STATUS_SENT, 3, None)
+    assert len(brevo.requests) == 3
+
+
+def test_permanent_failures_are_not_retried(db, brevo):
+    brevo.script((400, {}))
+    [rejected] = email_outbox.enqueue_emails(db, ["bad@x.fr"], "Rejet", "<p>x</p>")
+    email_outbox.EmailSender().run_once()
+    [e] = reload(db, [rejected.id])
+    assert (e.status, e.attempts, e.http_status) == (email_outbox.STATUS_FAILED, 1, 400)
+    assert "Brevo 400" in e.error
+
+
+def test_retryable_errors_fail_after_max_attempts(db, brevo):
+    [queued] = email_outbox.enqueue_emails(db, ["a@x.fr"], "Panne", "<p>x</p>")
+    brevo.script(*[(500, {})] * queued.max_attempts)
+    sender = email_outbox.EmailSender()
+    for _ in range(queued.max_attempts):
+        make_ready(db, [queued.id])
+        sender.run_once()
+    [e] = reload(db, [queued.id])
+    assert (e.status, e.attempts, e.http_status) == (email_outbox.STATUS_FAILED, queued.max_attempts, 500)
+    assert len(brevo.requests) == queued.max_attempts
+
+
+def test_missing_attachment_document_fails_permanently(db, brevo):
+    [queued] = email_outbox.enqueue_emails(db, ["a@x.fr"], "Journal", "<p>x</p>", attachment=("journal", 999999, "J.pdf"))
+    email_outbox.EmailSender().run_once()
+    [e] = reload(db, [queued.id])
+    assert e.status == email_outbox.STATUS_FAILED and "introuvable" in e.error
+    assert brevo.requests == []
+    assert db.query(models.EmailAttachment).one().rendering_by is None
+
+
+def test_message_requeued_elsewhere_is_not_delivered_twice(db, brevo):
+    emails = email_outbox.enqueue_emails(db, ["a@x.fr", "b@x.fr"], "Bail", "<p>x</p>")
+    sender = email_outbox.EmailSender()
+    ids = email_outbox.claim_emails(db, sender.worker_id)
+    assert sorted(ids) == sorted(e.id for e in emails)
+
+    # Le 1er message est livré : son bail (locked_at) est rafraîchi juste avant
+    old = datetime.utcnow() - timedelta(seconds=email_outbox.EMAIL_STALE_SECONDS + 10)
+    db.query(models.OutboxEmail).update({"locked_at": old}, synchronize_session=False); db.commit()
+    assert email_outbox.touch_email(db, ids[0], sender.worker_id)
+    assert email_outbox.requeue_stale_emails(db) == 1
+
+    # Le 2nd a été remis en file puis repris par un autre expéditeur : on ne le livre pas
+    email_outbox.claim_emails(db, "autre-instance")
+    assert not email_outbox.touch_email(db, ids[1], sender.worker_id)
+
+
+def test_abandoned_attachment_render_is_taken_over(db, chantier, brevo):
+    c, _ = chantier
+    [queued] = email_outbox.enqueue_emails(db, ["a@x.fr"], "Journal", "<p>x</p>", attachment=("journal", c.id, "J.pdf"))
+    # Un expéditeur disparu en plein rendu : son marqueur a expiré
+    db.query(models.EmailAttachment).update({
+        "rendering_by": "instance-morte",
+        "rendering_at": datetime.utcnow() - timedelta(seconds=email_outbox.pdf_executor.PDF_RENDER_TIMEOUT * 2 + 1),
+    }, synchronize_session=False)
+    db.commit()
+
+    email_outbox.EmailSender().run_once()
+    [e] = reload(db, [queued.id])
+    assert e.status == email_outbox.STATUS_SENT
+    assert brevo.requests[0]["body"]["attachment"][0]["name"] == "J.pdf"
@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, models
+from backend.database import SessionLocal
+from backend.dependencies import create_access_token
+from backend.models.base import RAISE_ON_LAZY
+from backend.services.sql_profiler import assert_query_budget
+
+
+# ==========================================
+# BUDGETS SQL DES LISTES
+# ==========================================
+# Le nombre de requêtes d'une liste ne doit pas dépendre du nombre de lignes :
+# même budget pour une entreprise à 2 lignes et une à 20. Un chargement
+# paresseux oublié lève (SQL_RAISE_ON_LAZY=1, cf. conftest) ou fait exploser
+# le compteur X-SQL-Count.
+
+# Chemin -> budget (requêtes SQL) ; rapports : liste + photos en selectinload
+BUDGETS = {
+    "/chantiers?all=true": 2,
+    "/chantiers/{chantier_id}/rapports?all=true": 2,
+    "/chantiers/{chantier_id}/plans-prevention?all=true": 1,
+    "/chantiers/{chantier_id}/ppsps?all=true": 1,
+    "/materiels?all=true": 1,
+    "/dashboard/stats": 10,
+}
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def seed(db, n):
+    """Entreprise avec n lignes de chaque sorte (rapports à 2 photos)."""
+    company = models.Company(name=f"Budget {n}")
+    db.add(company); db.commit()
+    user = models.User(email=f"budget-{company.id}@conformeo.fr", company_id=company.id)
+    chantier = models.Chantier(nom=f"Chantier {n}", company_id=company.id, adresse="1 rue du Test", latitude=45.0, longitude=5.0)
+    db.add_all([user, chantier]); db.commit()
+    for i in range(n):
+        rapport = models.Rapport(titre=f"Rapport {i}", description="RAS", chantier_id=chantier.id, niveau_urgence="Critique" if i % 2 else "Faible")
+        db.add(rapport); db.flush()
+        db.add_all([models.RapportImage(url=f"https://img/{rapport.id}-{j}.jpg", rapport_id=rapport.id) for j in range(2)])
+        db.add(models.PlanPrevention(chantier_id=chantier.id))
+        db.add(models.PPSPS(chantier_id=chantier.id, nb_compagnons=i + 1))
+        db.add(models.Materiel(nom=f"Matériel {i}", company_id=company.id, chantier_id=chantier.id))
+        db.add(models.Chantier(nom=f"Chantier {n}-{i}", company_id=company.id))
+    db.commit()
+    return user, chantier
+
+
+def sql_counts(user, chantier):
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": user.email})}
+    counts = {}
+    with TestClient(main.app) as client:
+        for path, budget in BUDGETS.items():
+            r = client.get(path.format(chantier_id=chantier.id), headers=headers)
+            assert r.status_code == 200, f"{path} : {r.status_code} {r.text[:200]}"
+            counts[path] = assert_query_budget(r, budget)
+    return counts
+
+
+# ==========================================
+# TESTS
+# ==========================================
+
+def test_lazy_loads_raise_in_tests():
+    assert RAISE_ON_LAZY
+
+
+def test_list_queries_do_not_grow_with_rows(db):
+    small = sql_counts(*seed(db, 2))
+    large = sql_counts(*seed(db, 20))
+    assert large == small
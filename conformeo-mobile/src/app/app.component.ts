@@ -1,6 +1,7 @@
 import { Component } from '@angular/core';
 import { CommonModule } from '@angular/common';
-import { HttpClient } from '@angular/common/http';
+import { HttpClient, HttpErrorResponse } from '@angular/common/http';
+import { firstValueFrom } from 'rxjs';
 import { addIcons } from 'ionicons';
 import { Router, NavigationEnd, RouterLink } from '@angular/router';
 import { 
@@ -18,9 +19,25 @@ import {
   checkboxOutline, imageOutline, squareOutline, createOutline, trashOutline, add, close
 } from 'ionicons/icons';
 
-import { OfflineService } from './services/offline';
+import { OfflineService, StoredAction } from './services/offline';
 import { ApiService } from './services/api';
 
+// Lot POST /batch envoyé mais sans réponse reçue : gardé pour être renvoyé à l'identique
+interface PendingBatch { key: string; operations: any[]; actionIds: string[]; }
+interface FailedAction { action: StoredAction; status: number; error: any; }
+
+// Taille maximale d'un lot (BATCH_MAX_OPERATIONS côté serveur, réponse 413 au-delà)
+const BATCH_MAX_OPERATIONS = 200;
+
+// Réseau perdu (0), session expirée, doublon en cours, limite de débit : le lot est retenté
+const RETRYABLE_STATUSES = [0, 401, 403, 408, 409, 429];
+
+// Idempotency-Key de taille fixe (SHA-256 des ids d'actions), quelle que soit la taille du lot
+async function batchKey(actionIds: string[]): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', new TextEncoder().encode([...actionIds].sort().join('.')));
+  return 'batch-' + Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
 @Component({
   selector: 'app-root',
   templateUrl: 'app.component.html',
@@ -35,6 +52,9 @@ import { ApiService } from './services/api';
   ],
 })
 export class AppComponent {
+
+  private batchSize = BATCH_MAX_OPERATIONS;  // Réduit si le serveur répond 413
+  private syncing = false;                   // Un seul passage à la fois (le réseau peut osciller)
   
   public appPages = [
     { title: 'Tableau de Bord', url: '/dashboard', icon: 'grid-outline' },
@@ -97,6 +117,16 @@ export class AppComponent {
 
   // --- ROBOT DE SYNCHRONISATION ---
   async processQueue() {
+    if (this.syncing) return;
+    this.syncing = true;
+    try {
+      await this.syncQueue();
+    } finally {
+      this.syncing = false;
+    }
+  }
+
+  private async syncQueue() {
     const queue = await this.offline.getQueue();
     
     if (queue.length === 0) return;
@@ -116,69 +146,144 @@ export class AppComponent {
     });
     toastStart.present();
 
+    // 1. Photos envoyées d'abord ; leurs URLs sont gardées sur l'action
+    await this.uploadQueuedPhotos(queue);
+
+    // 2. Lots d'au plus batchSize opérations, envoyés l'un après l'autre. Un lot dont la
+    //    réponse a été perdue est renvoyé à l'identique (même clé, même corps) : le serveur
+    //    rejoue alors sa réponse au lieu de recréer les lignes
+    const attempted = new Set<string>();  // Actions déjà tentées pendant ce passage
+    const failed: FailedAction[] = [];
+    while (true) {
+      const current = await this.offline.getQueue();
+      const batch: PendingBatch | null = await this.offline.get('pending_batch') || await this.buildBatch(current, attempted);
+      if (!batch) break;
+      await this.offline.set('pending_batch', batch);
+      batch.actionIds.forEach(id => attempted.add(id));
+
+      const outcome = await this.sendBatch(batch, current, failed);
+      if (outcome === 'retry_later') break;
+      if (outcome === 'too_large') {
+        // 413 : rien n'a été créé, on redécoupe plus petit
+        batch.actionIds.forEach(id => attempted.delete(id));
+        this.batchSize = Math.max(1, Math.floor(batch.operations.length / 2));
+      }
+    }
+    await this.reportSync(failed);
+  }
+
+  private async sendBatch(batch: PendingBatch, queue: StoredAction[], failed: FailedAction[]): Promise<'done' | 'retry_later' | 'too_large'> {
+    const byId = new Map(queue.map(a => [a.id, a] as [string, StoredAction]));
+    let res: any;
+    try {
+      res = await firstValueFrom(this.api.runBatch(batch.operations, batch.key));
+    } catch (e) {
+      const err = e as HttpErrorResponse;
+      // Réseau perdu, session expirée, doublon encore en cours ou erreur serveur :
+      // le même lot sera renvoyé au prochain passage
+      if (RETRYABLE_STATUSES.includes(err.status) || err.status >= 500) { console.error(err); return 'retry_later'; }
+      await this.offline.set('pending_batch', null);
+      if (err.status === 413 && batch.operations.length > 1) return 'too_large';
+      // Lot refusé en entier (4xx) : rien n'a été créé, inutile de le renvoyer tel quel
+      failed.push(...batch.actionIds.filter(id => byId.has(id))
+        .map(id => ({ action: byId.get(id)!, status: err.status, error: err.error?.detail ?? err.message })));
+      await this.offline.removeActions(batch.actionIds);
+      return 'done';
+    }
+
+    await this.offline.saveResolvedRefs(res.ids || {});
+    // Erreur serveur (5xx) : retentée au prochain passage, ainsi que ce qui dépend d'un
+    // chantier encore en file (424). Refus (4xx) : retiré de la file mais conservé (failed_actions).
+    const retry: string[] = [];
+    const stillQueued = (id: string) => retry.includes(id) || (byId.has(id) && !batch.actionIds.includes(id));
+    for (const r of res.results) {
+      const id = batch.actionIds[r.index];
+      const action = byId.get(id);
+      if (r.status < 300 || !action) continue;
+      if (r.status >= 500 || (r.status === 424 && stillQueued(action.data?.chantier_ref))) retry.push(id);
+      else failed.push({ action, status: r.status, error: r.error });
+    }
+    await this.offline.removeActions(batch.actionIds.filter(id => !retry.includes(id)));
+    await this.offline.set('pending_batch', null);
+    return 'done';
+  }
+
+  private async uploadQueuedPhotos(queue: StoredAction[]) {
     for (const action of queue) {
-      
+      if (action.type !== 'POST_RAPPORT_PHOTO' && action.type !== 'POST_RAPPORT_MULTI') continue;
+      if (action.data.image_urls) continue;  // Déjà envoyées lors d'un passage précédent
+      const paths: string[] = action.type === 'POST_RAPPORT_PHOTO' ? [action.data.localPhotoPath] : action.data.localPaths;
+      try {
+        const blobs = await Promise.all(paths.map((path: string) => {
+           const fileName = path.substring(path.lastIndexOf('/') + 1);
+           // @ts-ignore
+           return this.api.readLocalPhoto(fileName);
+        }));
+        const cloudUrls = await Promise.all(blobs.map((blob: Blob) =>
+          new Promise<string>((resolve, reject) => {
+            this.api.uploadPhoto(blob).subscribe({
+              next: (res) => resolve(res.url),
+              error: (err) => reject(err)
+            });
+          })
+        ));
+        action.data.image_urls = cloudUrls;
+        await this.offline.updateAction(action);
+      } catch (e) { console.error(e); }  // Photo non envoyée : l'action attend le prochain passage
+    }
+  }
+
+  private async buildBatch(queue: StoredAction[], attempted: Set<string>): Promise<PendingBatch | null> {
+    const operations: any[] = [];
+    const actionIds: string[] = [];
+    const resolved = await this.offline.getResolvedRefs();
+    const queued = new Set(queue.map(a => a.id));
+    for (const action of queue) {
+      if (operations.length >= this.batchSize) break;
+      if (attempted.has(action.id)) continue;
+      // Un rapport peut viser un chantier créé hors-ligne (data.chantier_ref = id de son action) :
+      // dans le même lot via refs, ou directement si un lot précédent l'a déjà créé
+      const ref = action.data?.chantier_ref;
+      if (ref && !(ref in resolved) && queued.has(ref) && !actionIds.includes(ref)) continue;  // Chantier pas encore envoyé
+      const refs = ref && !(ref in resolved) ? { chantier_id: ref } : {};
+      const chantierId = ref && ref in resolved ? { chantier_id: resolved[ref] } : {};
+
       if (action.type === 'POST_CHANTIER') {
-        this.api.createChantier(action.data).subscribe({ error: (e) => console.error(e) });
+        operations.push({ type: 'create_chantier', ref: action.id, data: action.data });
       }
 
       else if (action.type === 'POST_MATERIEL') {
-        this.api.createMateriel(action.data).subscribe({ error: (e) => console.error(e) });
+        operations.push({ type: 'create_materiel', ref: action.id, data: { ...action.data, ...chantierId }, refs });
       }
 
-      else if (action.type === 'POST_RAPPORT_PHOTO') {
-        const data = action.data; 
-        try {
-          const rawPath = data.localPhotoPath;
-          const fileName = rawPath.substring(rawPath.lastIndexOf('/') + 1);
-          // @ts-ignore
-          const blob = await this.api.readLocalPhoto(fileName);
-
-          this.api.uploadPhoto(blob).subscribe({
-            next: (res) => {
-               this.api.createRapport(data.rapport, res.url).subscribe();
-            }
-          });
-        } catch (e) {}
+      else if (action.type === 'POST_RAPPORT_PHOTO' || action.type === 'POST_RAPPORT_MULTI') {
+        if (!action.data.image_urls) continue;  // Photos pas encore envoyées
+        operations.push({ type: 'create_rapport', ref: action.id, data: { ...action.data.rapport, ...chantierId, image_urls: action.data.image_urls }, refs });
       }
+      actionIds.push(action.id);
+    }
+    if (operations.length === 0) return null;
+    return { key: await batchKey(actionIds), operations, actionIds };
+  }
 
-      else if (action.type === 'POST_RAPPORT_MULTI') {
-        const data = action.data;
-        try {
-          const blobPromises = data.localPaths.map((path: string) => {
-             const fileName = path.substring(path.lastIndexOf('/') + 1);
-             // @ts-ignore
-             return this.api.readLocalPhoto(fileName);
-          });
-          const blobs = await Promise.all(blobPromises);
-
-          const uploadPromises = blobs.map((blob: Blob) => 
-            new Promise<string>((resolve, reject) => {
-              this.api.uploadPhoto(blob).subscribe({
-                next: (res) => resolve(res.url),
-                error: (err) => reject(err)
-              });
-            })
-          );
-          const cloudUrls = await Promise.all(uploadPromises);
-
-          data.rapport.image_urls = cloudUrls;
-
-          this.api.createRapport(data.rapport).subscribe({
-             next: () => {
-                this.toastCtrl.create({
-                  message: `✅ Synchro terminée`,
-                  duration: 2000,
-                  color: 'success',
-                  position: 'top',
-                  icon: 'checkmark-circle'
-                }).then(t => t.present());
-             }
-          });
-
-        } catch (e) { console.error(e); }
-      }
+  private async reportSync(failed: FailedAction[]) {
+    if (failed.length > 0) {
+      await this.offline.addFailedActions(failed);
+      this.toastCtrl.create({
+        message: `⚠️ ${failed.length} élément(s) refusé(s) par le serveur : ${failed.map(f => typeof f.error === 'string' ? f.error : f.status).join(', ')}`,
+        duration: 5000,
+        color: 'danger',
+        position: 'top',
+        icon: 'warning'
+      }).then(t => t.present());
+    } else if ((await this.offline.getQueue()).length === 0) {
+      this.toastCtrl.create({
+        message: `✅ Synchro terminée`,
+        duration: 2000,
+        color: 'success',
+        position: 'top',
+        icon: 'checkmark-circle'
+      }).then(t => t.present());
     }
-    await this.offline.clearQueue();
   }
 }
\ No newline at end of file
@@ -351,7 +351,7 @@ export class ApiService {
 
   getChantiers(): Observable<Chantier[]> {
     if (this.offline.isOnline.value) {
-      return this.http.get<Chantier[]>(`${this.apiUrl}/chantiers`, this.getOptions()).pipe(
+      return this.http.get<Chantier[]>(`${this.apiUrl}/chantiers?all=true`, this.getOptions()).pipe(
         tap(data => this.offline.set('chantiers_cache', data))
       );
     } else {
@@ -372,8 +372,12 @@ export class ApiService {
 
   createChantier(chantier: Chantier): Observable<Chantier> {
     if (!this.offline.isOnline.value) {
-      this.offline.addToQueue('POST_CHANTIER', chantier);
-      return of({ ...chantier, id: 9999, est_actif: true });
+      // Id local négatif : les rapports créés hors-ligne sur ce chantier pointent vers l'action en file
+      const localId = -Date.now();
+      return from(this.offline.addToQueue('POST_CHANTIER', chantier).then(async action => {
+        await this.offline.rememberLocalChantier(localId, action.id);
+        return { ...chantier, id: localId, est_actif: true } as Chantier;
+      }));
     }
     return this.http.post<Chantier>(`${this.apiUrl}/chantiers`, chantier, this.getOptions());
   }
@@ -393,7 +397,7 @@ export class ApiService {
   // --- GESTION DOE ---
   
   getChantierDocs(chantierId: number) {
-    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${chantierId}/docs`, this.getOptions());
+    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${chantierId}/docs?all=true`, this.getOptions());
   }
 
   uploadChantierDoc(chantierId: number, file: File, categorie: string, titre: string) {
@@ -431,7 +435,7 @@ export class ApiService {
 
   getRapports(chantierId: number): Observable<Rapport[]> {
     if (this.offline.isOnline.value) {
-      return this.http.get<Rapport[]>(`${this.apiUrl}/chantiers/${chantierId}/rapports`, this.getOptions()).pipe(
+      return this.http.get<Rapport[]>(`${this.apiUrl}/chantiers/${chantierId}/rapports?all=true`, this.getOptions()).pipe(
         tap(data => this.offline.set(`rapports_${chantierId}`, data))
       );
     } else {
@@ -469,7 +473,8 @@ export class ApiService {
       }
       await this.offline.addToQueue('POST_RAPPORT_MULTI', {
         rapport: rapport,
-        localPaths: localPaths
+        localPaths: localPaths,
+        chantier_ref: await this.offline.chantierRef(rapport.chantier_id)  // Chantier lui-même créé hors-ligne
       });
       return true;
     } else {
@@ -496,7 +501,7 @@ export class ApiService {
 
   getMateriels(): Observable<Materiel[]> {
     if (this.offline.isOnline.value) {
-      return this.http.get<Materiel[]>(`${this.apiUrl}/materiels`, this.getOptions()).pipe(
+      return this.http.get<Materiel[]>(`${this.apiUrl}/materiels?all=true`, this.getOptions()).pipe(
         tap(data => this.offline.set('materiels_cache', data))
       );
     } else {
@@ -504,6 +509,16 @@ export class ApiService {
     }
   }
 
+  // 📦 Rejoue la file hors-ligne en une seule requête (résultat par opération)
+  // Même clé au renvoi (réponse perdue) : le serveur rejoue son résultat au lieu de recréer les lignes
+  runBatch(operations: any[], idempotencyKey?: string, atomic = false): Observable<any> {
+    const options = this.getOptions();
+    if (idempotencyKey && options.headers) {
+      options.headers = options.headers.set('Idempotency-Key', idempotencyKey);
+    }
+    return this.http.post<any>(`${this.apiUrl}/batch`, { operations, atomic }, options);
+  }
+
   createMateriel(mat: Materiel): Observable<Materiel> {
     return this.http.post<Materiel>(`${this.apiUrl}/materiels`, mat, this.getOptions());
   }
@@ -540,7 +555,7 @@ export class ApiService {
   }
 
   getPPSPSList(id: number): Observable<any[]> {
-    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${id}/ppsps`, this.getOptions());
+    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${id}/ppsps?all=true`, this.getOptions());
   }
   
   createInspection(doc: any): Observable<any> {
@@ -548,7 +563,7 @@ export class ApiService {
   }
 
   getInspections(id: number): Observable<any[]> {
-    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${id}/inspections`, this.getOptions());
+    return this.http.get<any[]>(`${this.apiUrl}/chantiers/${id}/inspections?all=true`, this.getOptions());
   }
   
   // PIC
@@ -619,7 +634,7 @@ export class ApiService {
   }
 
   getPdp(chantierId: number) {
-    return this.http.get<PlanPrevention[]>(`${this.apiUrl}/chantiers/${chantierId}/plans-prevention`, this.getOptions());
+    return this.http.get<PlanPrevention[]>(`${this.apiUrl}/chantiers/${chantierId}/plans-prevention?all=true`, this.getOptions());
   }
 
   getPdpPdfUrl(pdpId: number) {
@@ -685,9 +700,9 @@ export class ApiService {
   
   getTasks(chantierId: number | null = null): Observable<any[]> {
     if (chantierId) {
-        return this.http.get<any[]>(`${this.apiUrl}/chantiers/${chantierId}/tasks`, this.getOptions());
+        return this.http.get<any[]>(`${this.apiUrl}/chantiers/${chantierId}/tasks?all=true`, this.getOptions());
     }
-    return this.http.get<any[]>(`${this.apiUrl}/tasks`, this.getOptions());
+    return this.http.get<any[]>(`${this.apiUrl}/tasks?all=true`, this.getOptions());
   }
 
   // --- GESTION DES TÂCHES ---
@@ -740,7 +755,7 @@ export class ApiService {
   // 2. Liste des permis d'un chantier
   getPermisFeuList(chantierId: number) {
     return this.http.get<any[]>(
-      `${this.apiUrl}/chantiers/${chantierId}/permis-feu`, 
+      `${this.apiUrl}/chantiers/${chantierId}/permis-feu?all=true`, 
       this.getOptions()
     ); 
   }
@@ -62,6 +62,48 @@ export class OfflineService {
     await this.set('action_queue', []);
   }
 
+  // Relit la file avant d'écrire : une action ajoutée pendant la synchro n'est pas perdue
+  async updateAction(action: StoredAction) {
+    const queue = await this.getQueue();
+    await this.set('action_queue', queue.map(a => a.id === action.id ? action : a));
+  }
+
+  async removeActions(ids: string[]) {
+    const queue = await this.getQueue();
+    await this.set('action_queue', queue.filter(a => !ids.includes(a.id)));
+  }
+
+  // --- CHANTIERS CRÉÉS HORS-LIGNE ---
+  // Le chantier reçoit un id local négatif ; les rapports créés dessus référencent
+  // l'action POST_CHANTIER en file (chantier_ref), résolue par le serveur (POST /batch)
+
+  async rememberLocalChantier(localId: number, actionId: string) {
+    const locals = await this.get('local_chantiers') || {};
+    locals[localId] = actionId;
+    await this.set('local_chantiers', locals);
+  }
+
+  async chantierRef(chantierId?: number): Promise<string | undefined> {
+    if (!chantierId || chantierId > 0) return undefined;
+    const locals = await this.get('local_chantiers') || {};
+    return locals[chantierId];
+  }
+
+  // Références déjà créées par un lot précédent : id de l'action -> id serveur
+  async getResolvedRefs(): Promise<Record<string, number>> {
+    return await this.get('resolved_refs') || {};
+  }
+
+  async saveResolvedRefs(ids: Record<string, number>) {
+    await this.set('resolved_refs', { ...(await this.getResolvedRefs()), ...ids });
+  }
+
+  // Actions refusées par le serveur (4xx) : gardées pour être consultées / corrigées
+  async addFailedActions(failed: { action: StoredAction, status: number, error: any }[]) {
+    const list = await this.get('failed_actions') || [];
+    await this.set('failed_actions', [...list, ...failed]);
+  }
+
   public async set(key: string, value: any) {
     await this._storage?.set(key, value);
   }